@@ -1,30 +1,42 @@
 import asyncio
-import logging
 import random
-from typing import Union
+from typing import Union, Iterable, List, Optional, Tuple, AsyncIterator, Dict
 
 from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
 from aiocoapthon.protocol.coap_protocol import CoAPProtocol
-from aiocoapthon.utilities import utils, defines
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.utilities import defines, events
 from aiocoapthon.utilities.helper import Helper
+from aiocoapthon.utilities.tokens import TokenAllocator
+from aiocoapthon.utilities.tracing import Tracer
 
 __author__ = 'Giacomo Tanganelli'
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 
 class CoAPClient(CoAPProtocol):
-    def __init__(self, host, port, starting_mid=1, loop=None):
-        super().__init__(remote_address=(host, port), starting_mid=starting_mid, loop=loop)
+    def __init__(self, host, port, starting_mid=1, loop=None, max_in_flight=defines.MAX_IN_FLIGHT,
+                 token_length=defines.TOKEN_LENGTH, tracer: Tracer = None, transport: Transport = None):
+        super().__init__(remote_address=(host, port), starting_mid=starting_mid, loop=loop, tracer=tracer,
+                         transport=transport)
         self._address = (host, port)
         self.queue = asyncio.Queue()
         self.helper = Helper(self.send_request, self.receive_response)
 
+        self._receiver = None
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._tokens = TokenAllocator(token_length)
+        # token -> queue of the responses to a multicast request
+        self._collectors = {}
+
     async def send_request(self, request: Union[Request, Message]):
         if isinstance(request, Request):
             request = await self._observeLayer.send_request(request)
             request = await self._blockLayer.send_request(request)
+            request = await self._oscoreLayer.send_request(request)
             transaction = await self._messageLayer.send_request(request)
             if transaction.request.type == defines.Type.CON:
                 future_time = random.uniform(defines.ACK_TIMEOUT,
@@ -35,6 +47,9 @@ class CoAPClient(CoAPProtocol):
             await self._send_datagram(transaction.request)
             return transaction
         elif isinstance(request, Message):
+            if request.type == defines.Type.RST and request.token:
+                # a Reset cancels the observation of the token
+                self._tokens.release(request.token)
             message = await self._observeLayer.send_empty(request)
             message.destination = self._address
             transaction, message = await self._messageLayer.send_empty(message=message)
@@ -42,8 +57,43 @@ class CoAPClient(CoAPProtocol):
             return transaction
         return None
 
+    def start_receiver(self):
+        """
+        Start the persistent receive loop. Once started, every incoming datagram is handled as soon as it
+        arrives and responses are dispatched to the waiting transactions by token.
+        """
+        if self._receiver is None:
+            self._receiver = self._loop.create_task(self._receive_loop())
+
+    async def _receive_loop(self):
+        while not self._stop.is_set():
+            try:
+                await self.receive_message()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                # the waiters of the pending requests depend on this loop, it must not end on a single error
+                logger.exception("receive_failed", error=e)
+
+    def stop(self):
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        super().stop()
+
+    async def handle_message(self, transaction, message):
+        await super().handle_message(transaction, message)
+        if isinstance(message, Response):
+            if message.code.is_error() and self._tokens.is_observe(message.token):
+                # an error notification ends the observation
+                self._tokens.release(message.token)
+            queue = self._collectors.get(message.token, None)
+            if queue is not None:
+                queue.put_nowait(message)
+
     async def receive_response(self, transaction, timeout: int = 0):
-        self._loop.create_task(self.receive_message())
+        if self._receiver is None:
+            self._loop.create_task(self.receive_message())
         while transaction.response is None:
             try:
                 async with transaction.response_wait:
@@ -55,6 +105,158 @@ class CoAPClient(CoAPProtocol):
 
         return transaction.response
 
+    async def _bounded_request(self, path: str, method: defines.Code, payload, msgtype: defines.Type,
+                               timeout, **kwargs) -> Tuple[str, Optional[Response]]:
+        async with self._window:
+            request = self.helper.mk_request(self._address, method, path, msgtype)
+            request.token = self._tokens.allocate()
+            if payload is not None:
+                request.payload = payload
+
+            for k, v in kwargs.items():
+                if hasattr(request, k):
+                    setattr(request, k, v)
+            try:
+                if method in (defines.Code.PUT, defines.Code.POST, defines.Code.FETCH, defines.Code.PATCH,
+                              defines.Code.IPATCH):
+                    response = await self.helper.put(request, None, timeout)
+                else:
+                    response = await self.helper.get(request, None, timeout)
+            finally:
+                self._tokens.release(request.token)
+        return path, response
+
+    async def gather(self, paths: Iterable[str], method: defines.Code = defines.Code.GET, payload=None,
+                     timeout=None, msgtype: defines.Type = defines.Type.CON,
+                     **kwargs) -> List[Optional[Response]]:
+        """
+        Perform the same request on many paths concurrently, keeping at most max_in_flight exchanges outstanding.
+
+        :param paths: the paths
+        :param method: the CoAP method
+        :param payload: the request payload, for PUT and POST
+        :param timeout: the timeout of each request
+        :param msgtype: the message type of the requests
+        :return: the responses, in the same order of the paths (None for the requests that timed out)
+        """
+        self.start_receiver()
+        results = await asyncio.gather(*[self._bounded_request(path, method, payload, msgtype, timeout, **kwargs)
+                                         for path in paths])
+        return [response for _, response in results]
+
+    async def gather_from(self, destinations: Iterable[Tuple[str, int]], path: str,
+                          method: defines.Code = defines.Code.GET, payload=None, timeout=None,
+                          msgtype: defines.Type = defines.Type.CON, **kwargs) -> List[Optional[Response]]:
+        """
+        Perform the same request on many endpoints concurrently, keeping at most max_in_flight exchanges outstanding.
+
+        :param destinations: the (host, port) of the endpoints
+        :param path: the path
+        :param method: the CoAP method
+        :param payload: the request payload, for PUT and POST
+        :param timeout: the timeout of each request
+        :param msgtype: the message type of the requests
+        :return: the responses, in the same order of the destinations (None for the requests that timed out)
+        """
+        self.start_receiver()
+        results = await asyncio.gather(*[self._bounded_request(path, method, payload, msgtype, timeout,
+                                                               destination=destination, **kwargs)
+                                         for destination in destinations])
+        return [response for _, response in results]
+
+    async def map(self, paths: Iterable[str], method: defines.Code = defines.Code.GET, payload=None,
+                  timeout=None, msgtype: defines.Type = defines.Type.CON,
+                  **kwargs) -> AsyncIterator[Tuple[str, Optional[Response]]]:
+        """
+        Perform the same request on many paths concurrently and yield the responses as soon as they arrive.
+        At most max_in_flight exchanges are outstanding at the same time.
+
+        :param paths: the paths
+        :param method: the CoAP method
+        :param payload: the request payload, for PUT and POST
+        :param timeout: the timeout of each request
+        :param msgtype: the message type of the requests
+        :return: an asynchronous iterator of (path, response)
+        """
+        self.start_receiver()
+        tasks = [self._loop.create_task(self._bounded_request(path, method, payload, msgtype, timeout, **kwargs))
+                 for path in paths]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def multicast(self, path: str, method: defines.Code = defines.Code.GET, payload=None,
+                        window: float = defines.MULTICAST_WINDOW, address: Tuple[str, int] = None,
+                        **kwargs) -> AsyncIterator[Response]:
+        """
+        Send a request to a multicast group and yield the responses of the members as they arrive, until the
+        collection window closes. The request is NON, as required by RFC 7252, Section 8.1. Only the first response
+        of each member is yielded.
+
+        :param path: the path
+        :param method: the CoAP method
+        :param payload: the request payload
+        :param window: how long the responses are collected, in seconds. Servers wait up to their leisure before
+            answering, so it should not be shorter than that.
+        :param address: the (group, port) to send the request to, the address of the client if None
+        :return: an asynchronous iterator of responses
+        """
+        self.start_receiver()
+        request = self.helper.mk_request(address or self._address, method, path, defines.Type.NON)
+        request.token = self._tokens.allocate()
+        if payload is not None:
+            request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        queue = asyncio.Queue()
+        self._collectors[request.token] = queue
+        members = set()
+        try:
+            await self.send_request(request)
+            deadline = self._loop.time() + window
+            while True:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    response = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return
+                host, port = response.source
+                if (str(host), port) in members:
+                    logger.debug("multicast_duplicate", peer=response.source, token=request.token)
+                    continue
+                members.add((str(host), port))
+                yield response
+        finally:
+            del self._collectors[request.token]
+            self._tokens.release(request.token)
+
+    async def multicast_gather(self, path: str, method: defines.Code = defines.Code.GET, payload=None,
+                               window: float = defines.MULTICAST_WINDOW, address: Tuple[str, int] = None,
+                               **kwargs) -> Dict[Tuple[str, int], Response]:
+        """
+        Send a request to a multicast group and collect the responses of the members within the collection window.
+
+        :param path: the path
+        :param method: the CoAP method
+        :param payload: the request payload
+        :param window: how long the responses are collected, in seconds
+        :param address: the (group, port) to send the request to, the address of the client if None
+        :return: a dict (host, port) of the member -> response
+        """
+        ret = {}
+        async for response in self.multicast(path, method, payload, window, address, **kwargs):
+            host, port = response.source
+            ret[(str(host), port)] = response
+        return ret
+
     async def get(self, path, callback=None, timeout=None, **kwargs):  # pragma: no cover
         """
         Perform a GET on a certain path.
@@ -65,13 +267,16 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.GET, path)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.get(request, callback, timeout)
+        try:
+            return await self.helper.get(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def get_non(self, path, callback=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -83,13 +288,16 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.GET, path, defines.Type.NON)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.get(request, callback, timeout)
+        try:
+            return await self.helper.get(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def discover(self, callback=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -101,13 +309,16 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.GET, "/.well-known/core")
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.get(request, callback, timeout)
+        try:
+            return await self.helper.get(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def put(self, path, payload, callback=None, timeout=None, no_response=False, **kwargs):  # pragma: no cover
         """
@@ -121,7 +332,7 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.PUT, path)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
         request.payload = payload
         if no_response:
             request.no_response = True
@@ -130,7 +341,10 @@ class CoAPClient(CoAPProtocol):
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.put(request, callback, timeout)
+        try:
+            return await self.helper.put(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def put_non(self, path, payload, callback=None, timeout=None, no_response=False, **kwargs):  # pragma: no cover
         """
@@ -144,7 +358,7 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.PUT, path, defines.Type.NON)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
         request.payload = payload
 
         if no_response:
@@ -154,7 +368,10 @@ class CoAPClient(CoAPProtocol):
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.put(request, callback, timeout)
+        try:
+            return await self.helper.put(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def post(self, path, payload, callback=None, timeout=None, no_response=False, **kwargs):  # pragma: no cover
         """
@@ -168,7 +385,7 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.POST, path)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
         request.payload = payload
 
         if no_response:
@@ -178,7 +395,10 @@ class CoAPClient(CoAPProtocol):
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.post(request, callback, timeout)
+        try:
+            return await self.helper.post(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def post_non(self, path, payload, callback=None, timeout=None, no_response=False, **kwargs):  # pragma: no cover
         """
@@ -192,7 +412,7 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.POST, path, defines.Type.NON)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
         request.payload = payload
 
         if no_response:
@@ -202,7 +422,10 @@ class CoAPClient(CoAPProtocol):
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.post(request, callback, timeout)
+        try:
+            return await self.helper.post(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def delete(self, path, callback=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -214,13 +437,16 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.DELETE, path)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.delete(request, callback, timeout)
+        try:
+            return await self.helper.delete(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
 
     async def delete_non(self, path, callback=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -232,13 +458,189 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.DELETE, path, defines.Type.NON)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate()
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.delete(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def fetch(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform a FETCH on a certain path, the payload selects the part of the resource to return.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.FETCH, path)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.fetch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def fetch_non(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform a FETCH on a certain path, the payload selects the part of the resource to return.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.FETCH, path, defines.Type.NON)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.fetch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def patch(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform a PATCH on a certain path, the payload describes the changes.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.PATCH, path)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.patch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def patch_non(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform a PATCH on a certain path, the payload describes the changes.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.PATCH, path, defines.Type.NON)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.patch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def ipatch(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform an iPATCH, an idempotent PATCH, on a certain path.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.IPATCH, path)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.patch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def ipatch_non(self, path, payload, callback=None, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Perform an iPATCH, an idempotent PATCH, on a certain path.
+
+        :param path: the path
+        :param payload: the request payload
+        :param callback: the callback function to invoke upon response
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.IPATCH, path, defines.Type.NON)
+        request.token = self._tokens.allocate()
+        request.payload = payload
+
+        for k, v in kwargs.items():
+            if hasattr(request, k):
+                setattr(request, k, v)
+
+        try:
+            return await self.helper.patch(request, callback, timeout)
+        finally:
+            self._tokens.release(request.token)
+
+    async def _observe(self, request, callback, queue, stop, timeout):
+        live = False
+        try:
+            response = await self.helper.observe(request, callback, queue, stop, timeout)
+            # without a callback or a queue the observation outlives the call: its token stays reserved until the
+            # observation is cancelled, with cancel_observe() or a Reset, or the server ends it with an error
+            live = callback is None and queue is None and response is not None and response.observe is not None \
+                and not response.code.is_error()
+            return response
+        finally:
+            if not live:
+                self._tokens.release(request.token)
+
+    async def cancel_observe(self, path, token: bytes, timeout=None, **kwargs):  # pragma: no cover
+        """
+        Deregister an observation with a GET carrying Observe 1, then release its token.
+
+        :param path: the observed path
+        :param token: the token of the observation, the one of its notifications
+        :param timeout: the timeout of the request
+        :return: the response
+        """
+        request = self.helper.mk_request(self._address, defines.Code.GET, path)
+        request.token = token
+        request.observe = 1
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.delete(request, callback, timeout)
+        try:
+            return await self.helper.get(request, None, timeout)
+        finally:
+            self._tokens.release(token)
 
     async def observe(self, path, callback=None, queue=None, stop=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -252,14 +654,14 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.GET, path)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate(observe=True)
         request.observe = 0
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.observe(request, callback, queue, stop, timeout)
+        return await self._observe(request, callback, queue, stop, timeout)
 
     async def observe_non(self, path, callback=None, queue=None, stop=None, timeout=None, **kwargs):  # pragma: no cover
         """
@@ -273,11 +675,11 @@ class CoAPClient(CoAPProtocol):
         :return: the response
         """
         request = self.helper.mk_request(self._address, defines.Code.GET, path, defines.Type.NON)
-        request.token = utils.generate_random_hex(2)
+        request.token = self._tokens.allocate(observe=True)
         request.observe = 0
 
         for k, v in kwargs.items():
             if hasattr(request, k):
                 setattr(request, k, v)
 
-        return await self.helper.observe(request, callback, queue, stop, timeout)
+        return await self._observe(request, callback, queue, stop, timeout)
@@ -0,0 +1,164 @@
+import asyncio
+from typing import Dict, Iterable, Tuple, Optional, AsyncIterator
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.messages.response import Response
+from aiocoapthon.utilities import defines, events
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+Member = Tuple[str, int]
+
+
+def _member(response: Response) -> Member:
+    host, port = response.source
+    return str(host), port
+
+
+class GroupView(object):
+    """
+    Latest response of each member of a group for one resource.
+    """
+
+    def __init__(self, path: str, timer=None):
+        """
+        Initialize the view.
+
+        :param path: the path of the resource
+        :param timer: the clock used to timestamp the updates
+        """
+        self.path = path
+        self._timer = timer
+        self._values = {}
+        self._updated = {}
+
+    def update(self, member: Member, response: Response):
+        """
+        Store the latest response of a member.
+
+        :param member: the (host, port) of the member
+        :param response: the response
+        """
+        self._values[member] = response
+        if self._timer is not None:
+            self._updated[member] = self._timer()
+
+    def updated(self, member: Member) -> Optional[float]:
+        """
+        Return when the value of a member was last updated.
+
+        :param member: the (host, port) of the member
+        :return: the time of the update, None if unknown
+        """
+        return self._updated.get(member, None)
+
+    def values(self) -> Dict[Member, Response]:
+        """
+        Return a copy of the view.
+
+        :return: a dict member -> latest response
+        """
+        return dict(self._values)
+
+    def __getitem__(self, member: Member) -> Response:
+        return self._values[member]
+
+    def __contains__(self, member: Member) -> bool:
+        return member in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class Group(object):
+    """
+    The devices answering on a multicast group, read and observed through a single client.
+
+    A read sends one multicast GET and follows up with unicast GETs only for the known members that did not answer
+    within the collection window. Observations are unicast, one per member, and feed the view of their path.
+    """
+
+    def __init__(self, client: CoAPClient, address: Member = None, members: Iterable[Member] = (),
+                 window: float = defines.MULTICAST_WINDOW, timeout: float = defines.MAX_TRANSMIT_SPAN):
+        """
+        Initialize the group.
+
+        :param client: the client used for every exchange
+        :param address: the (group, port) of the multicast group, the address of the client if None
+        :param members: the members already known, e.g. from a previous discovery
+        :param window: how long the responses to a multicast request are collected
+        :param timeout: the timeout of the unicast requests to the members
+        """
+        self._client = client
+        self._address = address
+        self._window = window
+        self._timeout = timeout
+        self.members = set((str(host), port) for host, port in members)
+        self._views = {}
+
+    def view(self, path: str) -> GroupView:
+        """
+        Return the view of a resource, creating it if needed. There is one view per path.
+
+        :param path: the path of the resource
+        :return: the view
+        """
+        view = self._views.get(path, None)
+        if view is None:
+            view = GroupView(path, timer=asyncio.get_event_loop().time)
+            self._views[path] = view
+        return view
+
+    async def read(self, path: str) -> Dict[Member, Response]:
+        """
+        Read a resource on every member: a multicast GET, then unicast GETs to the known members that did not answer.
+        The members that answer the multicast request join the known members.
+
+        :param path: the path of the resource
+        :return: a dict member -> response, without the members that never answered
+        """
+        view = self.view(path)
+        ret = await self._client.multicast_gather(path, window=self._window, address=self._address)
+        self.members.update(ret.keys())
+        stragglers = sorted(self.members - ret.keys())
+        if stragglers:
+            logger.debug("group_stragglers", path=path, count=len(stragglers))
+            responses = await self._client.gather_from(stragglers, path, timeout=self._timeout)
+            for member, response in zip(stragglers, responses):
+                if response is not None:
+                    ret[member] = response
+        for member, response in ret.items():
+            view.update(member, response)
+        return ret
+
+    async def observe(self, path: str) -> AsyncIterator[Tuple[Member, Response]]:
+        """
+        Observe a resource on every member and yield the updates as they arrive. The members are discovered with
+        read() if none is known. Leaving the iteration cancels the observations.
+
+        :param path: the path of the resource
+        :return: an asynchronous iterator of (member, response)
+        """
+        if not self.members:
+            await self.read(path)
+        view = self.view(path)
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        tasks = [loop.create_task(self._client.observe(path, queue=queue, stop=stop, timeout=self._timeout,
+                                                       destination=member))
+                 for member in sorted(self.members)]
+        try:
+            while True:
+                response = await queue.get()
+                if response is None:
+                    continue
+                member = _member(response)
+                view.update(member, response)
+                yield member, response
+        finally:
+            stop.set()
+            for task in tasks:
+                task.cancel()
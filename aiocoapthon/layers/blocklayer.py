@@ -1,20 +1,23 @@
+from typing import Callable, Tuple
+
 import cachetools
-import logging
 
-from aiocoapthon.utilities import errors, utils
+from aiocoapthon.utilities import errors, utils, events
 from aiocoapthon.utilities import defines
 from aiocoapthon.utilities.transaction import Transaction
 from aiocoapthon.messages.request import Request
 from aiocoapthon.messages.response import Response
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 __author__ = 'Giacomo Tanganelli'
 
 
 class BlockItem(object):
+    __slots__ = ("byte", "num", "m", "size", "payload", "content_type", "bert", "last")
+
     def __init__(self, byte: int, num: int, m: int, size: int, payload: utils.CoAPPayload = None,
-                 content_type: defines.ContentType = None):
+                 content_type: defines.ContentType = None, bert: bool = False):
         """
         Data structure to store Block parameters
 
@@ -24,6 +27,7 @@ class BlockItem(object):
         :param size: the size field of the block option
         :param payload: the overall payload received in all blocks
         :param content_type: the content-type of the payload
+        :param bert: True, if blocks are BERT blocks of size bytes, and num counts units of BERT_UNIT bytes
         """
         self.byte = byte
         self.num = num
@@ -31,19 +35,39 @@ class BlockItem(object):
         self.size = size
         self.payload = payload
         self.content_type = content_type
+        self.bert = bert
+        self.last = num
 
 
 class BlockLayer(object):
     """
     Handle the Blockwise options. Hides all the exchange to both servers and clients.
+
+    On transports that support BERT (RFC 8323, Section 6) outgoing transfers use blocks of several units of
+    BERT_UNIT bytes, as many as the peer accepts.
     """
 
-    def __init__(self):
+    def __init__(self, bert: Callable[[Tuple], int] = None):
+        """
+        Initialize the layer.
+
+        :param bert: returns the size of the BERT blocks exchanged with a peer, 0 if the peer does not support BERT
+        """
+        self._bert = bert or (lambda peer: 0)
         self._block1_sent = cachetools.LFUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
         self._block2_sent = cachetools.LFUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
         self._block1_receive = cachetools.LFUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
         self._block2_receive = cachetools.LFUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
 
+    def transfers_in_progress(self) -> int:
+        """
+        Return the number of blockwise transfers in progress.
+
+        :return: the number of transfers
+        """
+        return len(self._block1_sent) + len(self._block2_sent) + len(self._block1_receive) + \
+            len(self._block2_receive)
+
     async def receive_request(self, transaction: Transaction) -> Transaction:
         """
         Handles the Blocks option in a incoming request.
@@ -64,9 +88,17 @@ class BlockLayer(object):
 
             num, m, size = transaction.request.block2
             if key_token in self._block2_receive:
-                self._block2_receive[key_token].num = num
-                self._block2_receive[key_token].size = size
-                self._block2_receive[key_token].m = m
+                item = self._block2_receive[key_token]
+                item.num = num
+                item.m = m
+                if not item.bert or size != defines.BERT:
+                    item.bert = False
+                    item.size = size
+            elif size == defines.BERT:
+                # early negotiation of BERT, falling back to blocks of one unit
+                bert = self._bert(transaction.request.source)
+                self._block2_receive[key_token] = BlockItem(defines.BERT_UNIT * num, num, m,
+                                                            bert or defines.BERT_UNIT, bert=bert > 0)
             else:
                 # early negotiation
                 byte = size * num
@@ -74,11 +106,13 @@ class BlockLayer(object):
 
         elif transaction.request.block1 is not None or len(transaction.request.payload) > defines.MAX_PAYLOAD:
             # POST or PUT
-            if len(transaction.request.payload) > defines.MAX_PAYLOAD:
+            bert = transaction.request.block1 is not None and transaction.request.block1[2] == defines.BERT
+            if len(transaction.request.payload) > defines.MAX_PAYLOAD and not bert:
                 num, m, size = 0, 1, defines.MAX_PAYLOAD
                 transaction.request.payload = transaction.request.payload[0:size]
             else:
                 num, m, size = transaction.request.block1
+            length = len(transaction.request.payload)
             if key_token in self._block1_receive:
                 content_type = transaction.request.content_type
                 if num != self._block1_receive[key_token].num \
@@ -98,8 +132,13 @@ class BlockLayer(object):
                                                transaction=transaction)
                 content_type = transaction.request.content_type
                 self._block1_receive[key_token] = BlockItem(size, num, m, size, transaction.request.payload,
-                                                            content_type)
-            num += 1
+                                                            content_type, bert=bert)
+            self._block1_receive[key_token].last = num
+            if bert:
+                # NUM counts the units carried by the BERT block
+                num += max(1, length // defines.BERT_UNIT)
+            else:
+                num += 1
             byte = size
             self._block1_receive[key_token].byte = byte
             self._block1_receive[key_token].num = num
@@ -148,10 +187,12 @@ class BlockLayer(object):
             else:
                 byte = 0
                 num = 0
-                size = defines.MAX_PAYLOAD
+                bert = self._bert(transaction.request.source)
+                size = bert or defines.MAX_PAYLOAD
                 m = 1
 
-                self._block2_receive[key_token] = BlockItem(byte, num, m, size)
+                self._block2_receive[key_token] = BlockItem(byte, num, m, size, bert=bert > 0)
+            item = self._block2_receive[key_token]
 
             if num != 0:
                 del transaction.response.observe
@@ -160,17 +201,23 @@ class BlockLayer(object):
                 m = 1
 
             transaction.response.payload = transaction.response.payload[byte:byte + size]
-            transaction.response.block2 = (num, m, size)
+            if item.bert:
+                transaction.response.bert_block(defines.OptionRegistry.BLOCK2, num, m)
+            else:
+                transaction.response.block2 = (num, m, size)
 
-            self._block2_receive[key_token].byte += size
-            self._block2_receive[key_token].num += 1
+            item.byte += size
+            item.num += size // defines.BERT_UNIT if item.bert else 1
             if m == 0:
                 del self._block2_receive[key_token]
         elif key_token in self._block1_receive:
-            num = self._block1_receive[key_token].num
+            num = self._block1_receive[key_token].last
             size = self._block1_receive[key_token].size
             m = self._block1_receive[key_token].m
-            transaction.response.block1 = (num - 1, m, size)
+            if size == defines.BERT:
+                transaction.response.bert_block(defines.OptionRegistry.BLOCK1, num, m)
+            else:
+                transaction.response.block1 = (num, m, size)
             if m == 1:
                 transaction.response.code = defines.Code.CONTINUE
             else:
@@ -194,11 +241,18 @@ class BlockLayer(object):
             key_token = utils.str_append_hash(host, port, request.token)
             if request.block1:
                 num, m, size = request.block1
+                if size == defines.BERT:
+                    # the payload is already one BERT block
+                    size = len(request.payload)
             else:
                 num = 0
-                m = 1
-                size = defines.MAX_PAYLOAD
-                request.block1 = num, m, size
+                bert = self._bert(request.destination)
+                size = bert or defines.MAX_PAYLOAD
+                m = 1 if len(request.payload) > size else 0
+                if bert:
+                    request.bert_block(defines.OptionRegistry.BLOCK1, num, m)
+                else:
+                    request.block1 = num, m, size
             self._block1_sent[key_token] = BlockItem(size, num, m, size, request.payload, request.content_type)
             request.payload = request.payload[0:size]
 
@@ -214,6 +268,19 @@ class BlockLayer(object):
             return request
         return request
 
+    @staticmethod
+    def _units(size: int, payload: utils.CoAPPayload) -> int:
+        """
+        Return how much the num of a block advances the next num.
+
+        :param size: the size field of the block option
+        :param payload: the payload of the block
+        :return: the number of units of a BERT block, 1 otherwise
+        """
+        if size == defines.BERT:
+            return max(1, len(payload) // defines.BERT_UNIT)
+        return 1
+
     async def receive_response(self, transaction: Transaction):
         """
         Handles the Blocks option in a incoming response.
@@ -241,7 +308,7 @@ class BlockLayer(object):
                     raise errors.CoAPException(msg=f"Block num acknowledged error, expected {item.num} "
                                                    f"received {n_num}")
             if n_size < item.size:
-                logger.debug("Scale down size, was " + str(item.size) + " become " + str(n_size))
+                logger.debug("block_size_reduced", size=item.size, new_size=n_size)
                 item.size = n_size
 
         elif transaction.response.block2 is not None:
@@ -266,14 +333,14 @@ class BlockLayer(object):
                                                        mid=transaction.response.mid)
                         else:
                             raise errors.CoAPException(msg=f"Content-type Error")
-                    item.byte += size
-                    item.num = num + 1
+                    item.byte += len(transaction.response.payload)
+                    item.num = num + self._units(size, transaction.response.payload)
                     item.size = size
                     item.m = m
                     item.payload += transaction.response.payload
                 else:
-                    item = BlockItem(size, num + 1, m, size, transaction.response.payload,
-                                     transaction.response.content_type)
+                    item = BlockItem(size, num + self._units(size, transaction.response.payload), m, size,
+                                     transaction.response.payload, transaction.response.content_type)
                     self._block2_sent[key_token] = item
 
             else:
@@ -1,52 +1,230 @@
+import collections
 import time
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Dict, Callable
 
 import cachetools as cachetools
-import logging
 import random
 
-from aiocoapthon.utilities import errors, utils
+from aiocoapthon.utilities import errors, utils, pool, events
 from aiocoapthon.utilities import defines
 from aiocoapthon.utilities.transaction import Transaction
 from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.response import Response
 from aiocoapthon.messages.request import Request
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 __author__ = 'Giacomo Tanganelli'
 
 
+class MidSpace(object):
+    """
+    Message ID sequence of a single peer. MIDs are not reused until EXCHANGE_LIFETIME has elapsed.
+    """
+
+    def __init__(self, starting_mid: int, lifetime: float = defines.EXCHANGE_LIFETIME):
+        """
+        Initialize the sequence.
+
+        :param starting_mid: the first mid of the sequence
+        :param lifetime: how long a used mid is kept out of the sequence
+        """
+        self._current_mid = starting_mid % defines.MID_SPACE_SIZE
+        self._lifetime = lifetime
+        self._used = collections.OrderedDict()
+
+    def _expire(self, now: float):
+        while self._used:
+            mid, timestamp = next(iter(self._used.items()))
+            if now - timestamp < self._lifetime:
+                break
+            del self._used[mid]
+
+    def fetch(self, now: float, reserved: "MidSpace" = None) -> int:
+        """
+        Gets the next MID that has not been used within the lifetime.
+
+        :param now: the current time
+        :param reserved: a sequence whose MIDs in use must be skipped as well
+        :return: the mid to use
+        :raise CoAPException: if every MID has been used within the lifetime
+        """
+        self._expire(now)
+        used = self._used
+        if reserved is not None:
+            reserved._expire(now)
+            skipped = reserved._used
+        else:
+            skipped = {}
+        start = self._current_mid
+        while self._current_mid in used or self._current_mid in skipped:
+            self._current_mid = (self._current_mid + 1) % defines.MID_SPACE_SIZE
+            if self._current_mid == start:  # pragma: no cover
+                raise errors.CoAPException("MID space exhausted")
+        current_mid = self._current_mid
+        self._used[current_mid] = now
+        self._current_mid = (self._current_mid + 1) % defines.MID_SPACE_SIZE
+        return current_mid
+
+    def usage(self, now: float) -> float:
+        """
+        Return how close the sequence is to exhaustion.
+
+        :param now: the current time
+        :return: the fraction of MIDs that cannot be used, between 0 and 1
+        """
+        self._expire(now)
+        return len(self._used) / defines.MID_SPACE_SIZE
+
+
+class TransactionCache(cachetools.TTLCache):
+    """
+    TTL cache of transactions. The caches sharing the same counter track how many entries refer to each
+    transaction, and on_expire is called when the last entry of a transaction is removed because it expired.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, references: collections.Counter,
+                 on_expire: Callable[[Transaction], None], timer: Callable[[], float] = time.monotonic):
+        """
+        Initialize the cache.
+
+        :param maxsize: the maximum number of entries
+        :param ttl: the lifetime of the entries
+        :param references: the counter shared by the caches indexing the same transactions
+        :param on_expire: the function called with a transaction whose entries all expired
+        :param timer: the clock used to expire the entries
+        """
+        super().__init__(maxsize=maxsize, ttl=ttl, timer=timer)
+        self._references = references
+        self._on_expire = on_expire
+
+    def _drop(self, transaction: Transaction, expired: bool):
+        key = id(transaction)
+        self._references[key] -= 1
+        if self._references[key] <= 0:
+            del self._references[key]
+            if expired:
+                self._on_expire(transaction)
+
+    def __setitem__(self, key, value):
+        old = cachetools.Cache.get(self, key, None)
+        self._references[id(value)] += 1
+        super().__setitem__(key, value)
+        if old is not None:
+            self._drop(old, False)
+
+    def __delitem__(self, key):
+        value = cachetools.Cache.__getitem__(self, key)
+        try:
+            super().__delitem__(key)
+        finally:
+            self._drop(value, False)
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, transaction in expired:
+            self._drop(transaction, True)
+        return expired
+
+
 class MessageLayer(object):
     """
     Handles matching between messages (Message ID) and request/response (Token)
     """
 
-    def __init__(self, starting_mid: int = None):
+    def __init__(self, starting_mid: int = None, timer: Callable[[], float] = time.monotonic,
+                 max_peers: int = defines.MID_SPACE_MAX_PEERS):
         """
         Set the layer internal structure.
 
-        :param starting_mid: the first mid used to send messages.
+        :param starting_mid: the first mid used to send messages to each peer.
+        :param timer: the clock used to expire the exchanges and the MIDs
+        :param max_peers: the number of peers whose MID sequence is kept
         """
-        self._transactions = cachetools.TTLCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE,
-                                                 ttl=defines.EXCHANGE_LIFETIME)
-        self._transactions_token = cachetools.TTLCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE,
-                                                       ttl=defines.EXCHANGE_LIFETIME)
-        if starting_mid is not None:
-            self._current_mid = starting_mid
-        else:
-            self._current_mid = random.randint(1, 65534)
+        self._timer = timer
+        self._references = collections.Counter()
+        self._transactions = TransactionCache(defines.TRANSACTION_LIST_MAX_SIZE, defines.EXCHANGE_LIFETIME,
+                                              self._references, self._recycle, timer)
+        self._transactions_token = TransactionCache(defines.TRANSACTION_LIST_MAX_SIZE, defines.EXCHANGE_LIFETIME,
+                                                    self._references, self._recycle, timer)
+        # requests sent to a multicast group, by token: every member answers from its own address
+        self._transactions_multicast = TransactionCache(defines.TRANSACTION_LIST_MAX_SIZE, defines.EXCHANGE_LIFETIME,
+                                                        self._references, self._recycle, timer)
+        # a sequence is dropped once it has been idle for EXCHANGE_LIFETIME, when none of its MIDs is in use anymore
+        self._mid_spaces = cachetools.TTLCache(maxsize=max_peers, ttl=defines.EXCHANGE_LIFETIME, timer=timer)
+        self._starting_mid = starting_mid
+        # the members of a group see multicast and unicast requests coming from the same endpoint, so multicast
+        # requests share one sequence, starting half the MID space away, whose MIDs the unicast sequences skip
+        self._multicast_space = None
+
+    @staticmethod
+    def _recycle(transaction: Transaction):
+        """
+        Give back to the pools a received exchange whose lifetime is over. Observe registrations are kept, since the
+        observe layer still refers to them.
+
+        :param transaction: the expired transaction
+        """
+        if transaction.recyclable and transaction.request.observe is None:
+            pool.release_transaction(transaction)
 
-    def fetch_mid(self) -> int:
+    def fetch_mid(self, peer: Optional[Tuple] = None) -> int:
         """
-        Gets the next valid MID.
+        Gets the next valid MID for a peer.
 
+        :param peer: the (host, port) of the peer
         :return: the mid to use
         """
-        current_mid = self._current_mid
-        self._current_mid += 1
-        self._current_mid %= 65535
-        return current_mid
+        if peer is not None:
+            host, port = peer
+            peer = str(host).lower(), port
+            if utils.is_multicast(peer):
+                if self._multicast_space is None:
+                    self._multicast_space = MidSpace(self._first_mid() + defines.MID_SPACE_SIZE // 2)
+                return self._multicast_space.fetch(self._timer())
+        space = self._mid_spaces.get(peer, None)
+        if space is None:
+            self._mid_spaces.expire()
+            if len(self._mid_spaces) >= self._mid_spaces.maxsize:
+                # the least recently used sequence is evicted while its MIDs may still be in use: the peer it belongs
+                # to may come back, and start over from a random MID rather than from the first one
+                space = MidSpace(random.randint(0, defines.MID_SPACE_SIZE - 1))
+            else:
+                space = MidSpace(self._first_mid())
+        mid = space.fetch(self._timer(), self._multicast_space)
+        # restart the idle time of the sequence
+        self._mid_spaces[peer] = space
+        return mid
+
+    def _first_mid(self) -> int:
+        if self._starting_mid is not None:
+            return self._starting_mid
+        return random.randint(1, 65534)
+
+    def live_transactions(self) -> int:
+        """
+        Return the number of transactions still indexed.
+
+        :return: the number of live transactions
+        """
+        return len(self._references)
+
+    def mid_usage(self) -> Dict[str, float]:
+        """
+        Return, for each peer, the fraction of the MID space that cannot be used because it is still within
+        EXCHANGE_LIFETIME. A value close to 1 means that the peer is close to MID exhaustion.
+
+        :return: a dict peer -> usage
+        """
+        now = self._timer()
+        ret = {}
+        for peer, space in list(self._mid_spaces.items()):
+            if peer is None:
+                key = "*"
+            else:
+                key = "{0}:{1}".format(*peer)
+            ret[key] = space.usage(now)
+        return ret
 
     async def receive_request(self, request: Request) -> Transaction:
         """
@@ -57,7 +235,7 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the edited transaction
         """
-        logger.debug("receive_request - {0}".format(request))
+        logger.debug("receive_request", message=request)
         try:
             host, port = request.source
         except TypeError or AttributeError:  # pragma: no cover
@@ -66,16 +244,20 @@ class MessageLayer(object):
         key_token = utils.str_append_hash(host, port, request.token)
 
         transaction = self._transactions.get(key_mid, None)
+        if transaction is not None and transaction.request.mid != request.mid:
+            # the key belongs to a separate response we sent to the peer with the same MID, not to a request
+            transaction = None
         if transaction is not None:
             from_token = self._transactions_token.get(key_token, None)
             if from_token is None:
-                logger.warning("Duplicated message with different Token")
+                logger.warning("duplicate_mid_token_mismatch", mid=request.mid)
                 raise errors.ProtocolError(msg="Tokens does not match",
                                            mid=transaction.request.mid)
             transaction.request.duplicated = True
         else:
             request.timestamp = time.time()
             transaction = Transaction(request=request, timestamp=request.timestamp)
+            transaction.recyclable = pool.enabled()
             self._transactions[key_mid] = transaction
             self._transactions_token[key_token] = transaction
         return transaction
@@ -89,7 +271,7 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the transaction to which the response belongs to
         """
-        logger.debug("receive_response - {0}".format(response))
+        logger.debug("receive_response", message=response)
         try:
             host, port = response.source
         except TypeError or AttributeError:  # pragma: no cover
@@ -99,19 +281,22 @@ class MessageLayer(object):
         key_mid_multicast = utils.str_append_hash(defines.ALL_COAP_NODES, port, response.mid)
         key_token = utils.str_append_hash(host, port, response.token)
         key_token_multicast = utils.str_append_hash(defines.ALL_COAP_NODES, port, response.token)
-        if key_mid in list(self._transactions.keys()):
+        # only piggybacked responses carry one of our MIDs, separate responses are numbered by the peer
+        if response.type == defines.Type.ACK and key_mid in self._transactions:
             transaction = self._transactions[key_mid]
             if response.token != transaction.request.token:
-                logger.warning(f"Tokens does not match -  response message {host}:{port}")
+                logger.warning("token_mismatch", host=host, port=port)
                 raise errors.CoAPException(msg=f"Tokens does not match -  response message {host}:{port}")
         elif key_token in self._transactions_token:
             transaction = self._transactions_token[key_token]
+        elif response.token in self._transactions_multicast:
+            transaction = self._transactions_multicast[response.token]
         elif key_mid_multicast in list(self._transactions.keys()):
             transaction = self._transactions[key_mid_multicast]
         elif key_token_multicast in self._transactions_token:
             transaction = self._transactions_token[key_token_multicast]
             if response.token != transaction.request.token:
-                logger.warning(f"Tokens does not match -  response message {host}:{port}")
+                logger.warning("token_mismatch", host=host, port=port)
                 raise errors.CoAPException(msg=f"Tokens does not match -  response message {host}:{port}")
         else:
             raise errors.CoAPException("Un-Matched incoming response message " + str(host) + ":" + str(port))
@@ -134,7 +319,7 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the transaction to which the message belongs to
         """
-        logger.debug("receive_empty - {0}".format(message))
+        logger.debug("receive_empty", message=message)
         try:
             host, port = message.source
         except TypeError or AttributeError:  # pragma: no cover
@@ -154,8 +339,7 @@ class MessageLayer(object):
         in_memory.append((transaction, key_token_multicast))
         valid = list(filter(lambda x: x[0] is not None, in_memory))
         if len(valid) == 0:  # pragma: no cover
-            logger.warning("Un-Matched incoming empty message fom {0}:{1} with MID {2}".format(host, port,
-                                                                                               message.mid))
+            logger.warning("unmatched_empty", host=host, port=port, mid=message.mid)
             raise errors.PongException("Un-Matched incoming empty message fom {0}:{1} with MID {2}"
                                        .format(host, port, message.mid), message=message)
         else:
@@ -173,10 +357,10 @@ class MessageLayer(object):
                 transaction.response.rejected = True
         elif message.type == defines.Type.CON:  # pragma: no cover
             # implicit ACK (might have been lost)
-            logger.debug("Implicit ACK on received CON for waiting transaction")
+            logger.debug("implicit_ack", mid=transaction.request.mid)
             transaction.request.acknowledged = True
         else:  # pragma: no cover
-            logger.warning("Unhandled message type...")
+            logger.warning("unhandled_type", type=message.type)
             raise errors.CoAPException("Unhandled message type...")
 
         transaction.retransmit_stop = True
@@ -217,14 +401,16 @@ class MessageLayer(object):
             raise errors.CoAPException("Request type is not set")
 
         if transaction.request.mid is None:
-            transaction.request.mid = self.fetch_mid()
+            transaction.request.mid = self.fetch_mid(request.destination)
 
         key_mid = utils.str_append_hash(host, port, request.mid)
         self._transactions[key_mid] = transaction
 
         key_token = utils.str_append_hash(host, port, request.token)
         self._transactions_token[key_token] = transaction
-        logger.debug("send_request - {0}".format(request))
+        if utils.is_multicast(request.destination) and request.token is not None:
+            self._transactions_multicast[request.token] = transaction
+        logger.debug("send_request", message=request)
         return transaction
 
     async def send_response(self, transaction: Transaction) -> Transaction:
@@ -252,13 +438,13 @@ class MessageLayer(object):
         transaction.response.timestamp = time.time()
 
         if transaction.response.mid is None:
-            transaction.response.mid = self.fetch_mid()
+            transaction.response.mid = self.fetch_mid(transaction.response.destination)
         try:
             host, port = transaction.response.destination
         except TypeError or AttributeError:  # pragma: no cover
             raise errors.CoAPException("Response destination cannot be computed")
 
-        logger.debug("send_response - {0}".format(transaction.response))
+        logger.debug("send_response", message=transaction.response)
 
         key_mid = utils.str_append_hash(host, port, transaction.response.mid)
         key_token = utils.str_append_hash(host, port, transaction.response.token)
@@ -347,5 +533,5 @@ class MessageLayer(object):
             transaction = Transaction(request=message, timestamp=message.timestamp)
             self._transactions[key_mid] = transaction
             self._transactions_token[key_token] = transaction
-        logger.debug("send_empty -  {0}".format(message))
+        logger.debug("send_empty", message=message)
         return transaction, message
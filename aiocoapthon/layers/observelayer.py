@@ -1,19 +1,25 @@
+import collections
+import itertools
 import time
 
 import cachetools
-import logging
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict, Callable
 
+from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
 from aiocoapthon.resources.resource import Resource
-from aiocoapthon.utilities import errors, utils, defines
+from aiocoapthon.utilities import errors, utils, defines, events
+from aiocoapthon.utilities.persistence import RelationRecord
 from aiocoapthon.utilities.transaction import Transaction
 
 __author__ = 'Giacomo Tanganelli'
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 
 class ObserveItem(object):
+    __slots__ = ("timestamp", "non_counter", "allowed", "transaction", "content_type", "pmin", "pmax")
+
     def __init__(self, timestamp: time.time, non_counter: int, allowed: bool,
                  transaction: Optional[Transaction], content_type: Optional[Union[defines.ContentType, int]]):
         """
@@ -39,6 +45,104 @@ class ObserveLayer(object):
     """
     def __init__(self):
         self._relations = cachetools.LFUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
+        # relations restored from a snapshot and not rebuilt yet: key -> record, and path -> keys
+        self._pending = {}
+        self._pending_paths = {}
+        self._resolve = None
+
+    @property
+    def pending(self) -> int:
+        """
+        Return the number of restored relations which were not rebuilt yet.
+
+        :return: the number of relations
+        """
+        return len(self._pending)
+
+    def snapshot(self) -> List[RelationRecord]:
+        """
+        Return the relations of the observers of our resources, including the restored ones not rebuilt yet.
+
+        :return: the records of the relations
+        """
+        ret = list(self._pending.values())
+        for item in list(self._relations.values()):
+            transaction = item.transaction
+            if transaction is None or transaction.resource is None or not item.allowed:
+                continue
+            request = transaction.request
+            response = transaction.response
+            host, port = request.source
+            content_type = int(item.content_type) if item.content_type is not None else None
+            ret.append(RelationRecord(str(host), port, request.token, transaction.resource.path, request.uri_query,
+                                      int(request.code), request.payload.raw, int(request.type), content_type,
+                                      response.observe if response is not None else None,
+                                      response.timestamp if response is not None and response.timestamp is not None
+                                      else item.timestamp))
+        return ret
+
+    def restore(self, records: List[RelationRecord], resolve: Callable[[str], Optional[Resource]]):
+        """
+        Restore the relations of a snapshot. They are rebuilt lazily: when their resource notifies, or a batch at a
+        time when the notifications on Max-Age are due, so that a large snapshot does not delay the start.
+
+        :param records: the records of the relations
+        :param resolve: the function returning the resource at a path, None if there is none
+        """
+        self._resolve = resolve
+        for record in records:
+            key_token = utils.str_append_hash(record.host, record.port, record.token)
+            self._pending[key_token] = record
+            self._pending_paths.setdefault(record.path, set()).add(key_token)
+
+    def _discard_pending(self, key_token: str) -> Optional[RelationRecord]:
+        record = self._pending.pop(key_token, None)
+        if record is not None:
+            keys = self._pending_paths[record.path]
+            keys.discard(key_token)
+            if not keys:
+                del self._pending_paths[record.path]
+        return record
+
+    def _rebuild(self, key_token: str):
+        record = self._discard_pending(key_token)
+        resource = self._resolve(record.path)
+        if resource is None or not resource.observable:
+            logger.debug("observe_restore_dropped", path=record.path, token=record.token)
+            return
+        request = Request()
+        request.type = record.msgtype
+        request.code = record.code
+        request.token = record.token
+        request.source = (record.host, record.port)
+        request.uri_path = record.path
+        if record.query:
+            request.uri_query = record.query
+        request.payload = record.payload
+        request.acknowledged = True
+        response = Response()
+        response.type = record.msgtype
+        response.code = defines.Code.CONTENT
+        response.token = record.token
+        response.destination = request.source
+        response.timestamp = record.timestamp
+        response.acknowledged = True
+        if record.sequence is not None:
+            response.observe = record.sequence
+        transaction = Transaction(request=request, response=response, resource=resource, timestamp=record.timestamp)
+        self._relations[key_token] = ObserveItem(record.timestamp, 0, True, transaction, record.content_type)
+
+    def relations_per_resource(self) -> Dict[str, int]:
+        """
+        Return the number of observe relations of each resource. Relations of a client are counted under "".
+
+        :return: a dict resource path -> number of relations
+        """
+        counts = collections.Counter({path: len(keys) for path, keys in self._pending_paths.items()})
+        for item in list(self._relations.values()):
+            resource = item.transaction.resource if item.transaction is not None else None
+            counts[resource.path if resource is not None else ""] += 1
+        return dict(counts)
 
     async def send_request(self, request):
         """
@@ -116,6 +220,9 @@ class ObserveLayer(object):
                 raise errors.CoAPException("Request Source cannot be computed")
 
             key_token = utils.str_append_hash(host, port, transaction.request.token)
+            if self._pending:
+                # the observer registered again
+                self._discard_pending(key_token)
 
             if transaction.request.observe == 0:
                 non_counter = 0
@@ -126,11 +233,11 @@ class ObserveLayer(object):
                     allowed = False
                 self._relations[key_token] = ObserveItem(time.time(), non_counter, allowed, transaction, -1)
             elif transaction.request.observe == 1:
-                logger.info("Remove Subscriber")
+                logger.info("observe_deregister", token=transaction.request.token)
                 try:
                     del self._relations[key_token]
                 except KeyError:  # pragma: no cover
-                    logger.exception("Subscriber was not registered")
+                    logger.exception("observe_not_registered")
 
         return transaction
 
@@ -152,11 +259,11 @@ class ObserveLayer(object):
                 raise errors.CoAPException("Request Source cannot be computed")
 
             key_token = utils.str_append_hash(host, port, transaction.request.token)
-            logger.info("Remove Subscriber")
+            logger.info("observe_reset", host=host, port=port, token=transaction.request.token)
             try:
                 del self._relations[key_token]
             except KeyError:  # pragma: no cover
-                logger.exception("Subscriber was not registered")
+                logger.exception("observe_not_registered")
             transaction.completed = True
         return transaction
 
@@ -207,6 +314,8 @@ class ObserveLayer(object):
         """
         ret = []
         resource_list = [resource]
+        for key in list(self._pending_paths.get(resource.path, ())):
+            self._rebuild(key)
         for key in list(self._relations.keys()):
             if self._relations[key].transaction.resource in resource_list:
                 if self._relations[key].non_counter > defines.MAX_NON_NOTIFICATIONS \
@@ -229,6 +338,8 @@ class ObserveLayer(object):
         :rtype: list
         :return: the list of transactions to be notified
         """
+        for key in list(itertools.islice(self._pending, defines.OBSERVE_RESTORE_BATCH)):
+            self._rebuild(key)
         ret = []
         for key in list(self._relations.keys()):
             if self._relations[key].transaction.retransmit_stop is True or \
@@ -252,13 +363,15 @@ class ObserveLayer(object):
 
         :param message: the message
         """
-        logger.debug("Remove Subcriber")
+        logger.debug("observe_remove", token=message.token)
         try:
             host, port = message.destination
         except AttributeError:  # pragma: no cover
             raise errors.CoAPException("Message destination cannot be computed")
         key_token = utils.str_append_hash(host, port, message.token)
+        if self._discard_pending(key_token) is not None:
+            return
         try:
             del self._relations[key_token]
         except KeyError:  # pragma: no cover
-            logger.exception("Subscriber was not registered")
+            logger.exception("observe_not_registered")
@@ -0,0 +1,285 @@
+from typing import Optional, Tuple, List
+
+import cachetools
+
+from aiocoapthon.messages.options import Option
+from aiocoapthon.messages.request import Request
+from aiocoapthon.utilities import defines, errors, events, utils
+from aiocoapthon.utilities.oscore import SecurityContext, decode_option, encode_option
+from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities.transaction import Transaction
+
+logger = events.get_logger(__name__)
+
+__author__ = 'Giacomo Tanganelli'
+
+# options left in the clear (class U), which proxies may need to read, all the others are encrypted (class E)
+_OUTER = frozenset((defines.OptionRegistry.URI_HOST, defines.OptionRegistry.URI_PORT,
+                    defines.OptionRegistry.OBSERVE, defines.OptionRegistry.PROXY_URI,
+                    defines.OptionRegistry.PROXY_SCHEME, defines.OptionRegistry.NO_RESPONSE))
+
+
+class SecurityBinding(object):
+    """
+    The parameters of a protected request, which its responses are bound to.
+    """
+    __slots__ = ("context", "kid", "piv", "nonce", "observe", "answered")
+
+    def __init__(self, context: SecurityContext, kid: bytes, piv: bytes, nonce: bytes, observe: bool = False):
+        """
+        Data structure to store the security parameters of a request.
+
+        :param context: the security context
+        :param kid: the Sender ID of the client
+        :param piv: the Partial IV of the request
+        :param nonce: the AEAD nonce of the request
+        :param observe: True, if the request registers an observation, whose notifications are bound to it
+        """
+        self.context = context
+        self.kid = kid
+        self.piv = piv
+        self.nonce = nonce
+        self.observe = observe
+        self.answered = False
+
+
+def _oscore_option(message) -> Optional[bytes]:
+    for option in message.options:
+        if option.number == defines.OptionRegistry.OSCORE:
+            return option.raw_value
+    return None
+
+
+def _split(options: List[Option]) -> Tuple[List[Option], List[Option]]:
+    outer = [option for option in options if option.number in _OUTER]
+    inner = [option for option in options if option.number not in _OUTER
+             and option.number != defines.OptionRegistry.OSCORE]
+    return outer, inner
+
+
+class OSCORELayer(object):
+    """
+    Object Security for Constrained RESTful Environments (RFC 8613). Sits between the MessageLayer and the upper
+    layers: outgoing requests and responses are encrypted in a POST / 2.04 Changed, and incoming ones are decrypted
+    before block-wise, observe and resource handling see them.
+
+    Requests are protected when a security context is registered for their destination, and incoming requests are
+    matched to a context by the kid in their OSCORE option.
+    """
+
+    def __init__(self):
+        # (kid context, recipient id) -> context
+        self._recipients = {}
+        # (host, port) -> context
+        self._peers = {}
+        self._bindings = cachetools.LRUCache(maxsize=defines.TRANSACTION_LIST_MAX_SIZE)
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Tell if any security context is registered.
+
+        :return: True, if OSCORE is in use
+        """
+        return bool(self._recipients)
+
+    def add_context(self, context: SecurityContext, peer: Optional[Tuple[str, int]] = None):
+        """
+        Register a security context.
+
+        :param context: the context
+        :param peer: the (host, port) our requests are protected for, None to only accept requests with the context
+        """
+        self._recipients[(context.id_context, context.recipient_id)] = context
+        if peer is not None:
+            self._peers[(str(peer[0]), peer[1])] = context
+
+    def remove_context(self, context: SecurityContext):
+        """
+        Unregister a security context.
+
+        :param context: the context
+        """
+        self._recipients.pop((context.id_context, context.recipient_id), None)
+        for peer in [peer for peer, item in self._peers.items() if item is context]:
+            del self._peers[peer]
+
+    @staticmethod
+    def _plaintext(message) -> bytes:
+        _, inner = _split(message.options)
+        plaintext = bytes([message.code]) + Serializer.encode_options(inner)
+        payload = message.payload.raw
+        if payload:
+            plaintext += bytes([defines.PAYLOAD_MARKER]) + payload
+        return plaintext
+
+    @staticmethod
+    def _restore(message, plaintext: bytes):
+        if not plaintext:
+            raise errors.CoAPException("Empty OSCORE plaintext")
+        try:
+            data, inner = Serializer.decode_options(plaintext[1:])
+        except errors.CoAPException:
+            raise errors.CoAPException("Malformed OSCORE plaintext")
+        outer, _ = _split(message.options)
+        message.clear_options()
+        message.add_options(outer)
+        message.add_options(inner)
+        message.code = plaintext[0]
+        message.payload = data[1:] if len(data) > 1 else None
+
+    async def send_request(self, request: Request) -> Request:
+        """
+        Protect an outgoing request, if there is a security context for its destination.
+
+        :param request: the request
+        :return: the protected copy of the request, or the request itself
+        """
+        if not self._peers or request.destination is None:
+            return request
+        host, port = request.destination
+        context = self._peers.get((str(host), port), None)
+        if context is None:
+            return request
+        piv = context.next_piv()
+        nonce = context.sender_nonce(piv)
+        ciphertext = context.encrypt(nonce, self._plaintext(request), context.aad(context.sender_id, piv))
+        protected = Request()
+        protected.type = request.type
+        if request.mid is not None:
+            protected.mid = request.mid
+        protected.token = request.token
+        protected.destination = request.destination
+        protected.code = defines.Code.POST
+        outer, _ = _split(request.options)
+        protected.add_options(outer)
+        option = Option(defines.OptionRegistry.OSCORE)
+        option.value = encode_option(piv, context.sender_id, context.id_context)
+        protected.add_option(option)
+        protected.payload = ciphertext
+        key_token = utils.str_append_hash(host, port, request.token)
+        self._bindings[key_token] = SecurityBinding(context, context.sender_id, piv, nonce, request.observe == 0)
+        return protected
+
+    async def receive_request(self, transaction: Transaction) -> Transaction:
+        """
+        Verify and decrypt an incoming request carrying the OSCORE option.
+
+        :param transaction: the transaction that owns the request
+        :return: the edited transaction
+        :raise InternalError: if the request cannot be verified, answered without protection
+        """
+        request = transaction.request
+        host, port = request.source
+        key_token = utils.str_append_hash(host, port, request.token)
+        if self._bindings:
+            self._bindings.pop(key_token, None)
+        value = _oscore_option(request)
+        if value is None:
+            return transaction
+        try:
+            piv, kid, kid_context = decode_option(value)
+        except errors.CoAPException as e:
+            raise errors.InternalError(msg=e.msg, response_code=defines.Code.BAD_OPTION, transaction=transaction)
+        if piv is None or kid is None:
+            raise errors.InternalError(msg="Malformed OSCORE option", response_code=defines.Code.BAD_OPTION,
+                                       transaction=transaction)
+        context = self._recipients.get((kid_context, kid), None)
+        if context is None:
+            raise errors.InternalError(msg="Security context not found", response_code=defines.Code.UNAUTHORIZED,
+                                       transaction=transaction)
+        sequence_number = int.from_bytes(piv, 'big')
+        if not context.replay.check(sequence_number):
+            logger.warning("oscore_replay", peer=request.source, sequence_number=sequence_number)
+            raise errors.InternalError(msg="Replay detected", response_code=defines.Code.UNAUTHORIZED,
+                                       transaction=transaction)
+        nonce = context.recipient_nonce(piv)
+        try:
+            plaintext = context.decrypt(nonce, request.payload.raw or b"", context.aad(kid, piv))
+            self._restore(request, plaintext)
+        except (errors.CoAPException, ValueError):
+            raise errors.InternalError(msg="Decryption failed", response_code=defines.Code.BAD_REQUEST,
+                                       transaction=transaction)
+        context.replay.accept(sequence_number)
+        self._bindings[key_token] = SecurityBinding(context, kid, piv, nonce)
+        return transaction
+
+    async def send_response(self, transaction: Transaction) -> Transaction:
+        """
+        Protect the response to a protected request. Notifications carry their own Partial IV.
+
+        :param transaction: the transaction that owns the response
+        :return: the edited transaction
+        """
+        if not self._bindings or transaction.response is None or transaction.request.source is None:
+            return transaction
+        host, port = transaction.request.source
+        binding = self._bindings.get(utils.str_append_hash(host, port, transaction.request.token), None)
+        if binding is None:
+            return transaction
+        response = transaction.response
+        context = binding.context
+        if response.observe is not None or binding.answered:
+            # the nonce of the request protects one response only
+            piv = context.next_piv()
+            nonce = context.sender_nonce(piv)
+        else:
+            piv = None
+            nonce = binding.nonce
+        binding.answered = True
+        ciphertext = context.encrypt(nonce, self._plaintext(response), context.aad(binding.kid, binding.piv))
+        outer, _ = _split(response.options)
+        response.clear_options()
+        response.add_options(outer)
+        option = Option(defines.OptionRegistry.OSCORE)
+        option.value = encode_option(piv)
+        response.add_option(option)
+        response.code = defines.Code.CHANGED
+        response.payload = ciphertext
+        return transaction
+
+    async def receive_response(self, transaction: Transaction) -> Transaction:
+        """
+        Verify and decrypt the response to a protected request.
+
+        :param transaction: the transaction that owns the response
+        :return: the edited transaction
+        :raise CoAPException: if the response cannot be verified, and must be discarded
+        """
+        if not self._peers:
+            return transaction
+        response = transaction.response
+        host, port = response.source
+        key_token = utils.str_append_hash(host, port, response.token)
+        binding = self._bindings.get(key_token, None)
+        value = _oscore_option(response)
+        if binding is None:
+            if value is not None:
+                transaction.response = None
+                raise errors.CoAPException("Protected response to an unknown request")
+            return transaction
+        if value is None:
+            # e.g. the server could not verify the request
+            logger.warning("oscore_unprotected_response", peer=response.source, code=response.code)
+            self._bindings.pop(key_token, None)
+            return transaction
+        context = binding.context
+        try:
+            piv, _, _ = decode_option(value)
+            if piv is not None:
+                if not context.replay.check(int.from_bytes(piv, 'big')):
+                    raise errors.CoAPException("OSCORE replay detected")
+                nonce = context.recipient_nonce(piv)
+            else:
+                nonce = binding.nonce
+            plaintext = context.decrypt(nonce, response.payload.raw or b"", context.aad(binding.kid, binding.piv))
+            self._restore(response, plaintext)
+        except (errors.CoAPException, ValueError):
+            # the response is discarded, nobody must see it
+            transaction.response = None
+            raise
+        if piv is not None:
+            context.replay.accept(int.from_bytes(piv, 'big'))
+        if response.observe is None and not binding.observe:
+            self._bindings.pop(key_token, None)
+        return transaction
@@ -1,7 +1,6 @@
-import logging
-from typing import List
+from typing import List, Optional
 
-from aiocoapthon.utilities import utils
+from aiocoapthon.utilities import utils, events
 from aiocoapthon.utilities import defines
 from aiocoapthon.utilities.transaction import Transaction
 from aiocoapthon.layers.resourcelayer import ResourceLayer
@@ -10,7 +9,7 @@ from aiocoapthon.resources.resource import Resource
 
 __author__ = 'Giacomo Tanganelli'
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 
 class RequestLayer(object):
@@ -46,24 +45,36 @@ class RequestLayer(object):
             return True
         return False  # pragma: no cover
 
-    # def remove_resource(self, path):
-    #     """
-    #     Helper function to remove resources.
-    #
-    #     :param path: the path for the unwanted resource
-    #     :rtype : the removed object
-    #     """
-    #
-    #     path = path.strip("/")
-    #     path = "/" + path
-    #     try:
-    #         res = self._root[path]
-    #     except KeyError:
-    #         return False
-    #     if res is not None:
-    #         del self._root[path]
-    #     return True
-    #
+    def remove_resource(self, path):
+        """
+        Helper function to remove resources.
+
+        :param path: the path for the unwanted resource
+        :return: True, if the resource was removed
+        """
+
+        path = path.strip("/")
+        path = "/" + path
+        try:
+            self._root[path]
+        except KeyError:
+            return False
+        del self._root[path]
+        return True
+
+    def get_resource(self, path: str) -> Optional[Resource]:
+        """
+        Return the resource at a path.
+
+        :param path: the path
+        :return: the resource, None if there is none
+        """
+        path = "/" + path.strip("/")
+        try:
+            return self._root[path]
+        except KeyError:
+            return None
+
     def get_resources_path(self, prefix=None):
         lst = self._root.dump()
         if prefix is None:
@@ -101,6 +112,10 @@ class RequestLayer(object):
             transaction = await self._handle_put(transaction)
         elif method == defines.Code.DELETE:
             transaction = await self._handle_delete(transaction)
+        elif method == defines.Code.FETCH:
+            transaction = await self._handle_fetch(transaction)
+        elif method == defines.Code.PATCH or method == defines.Code.IPATCH:
+            transaction = await self._handle_patch(transaction)
         return transaction
 
     async def _handle_get(self, transaction: Transaction) -> Transaction:
@@ -249,3 +264,47 @@ class RequestLayer(object):
                 del self._root[path]
         return transaction
 
+    async def _handle_fetch(self, transaction: Transaction) -> Transaction:
+        """
+        Handle FETCH requests
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the request
+        :rtype : Transaction
+        :return: the edited transaction with the response to the request
+        """
+        path = str("/" + transaction.request.uri_path)
+        transaction.response = Response()
+        transaction.response.destination = transaction.request.source
+        transaction.response.token = transaction.request.token
+        try:
+            resource = self._root[path]
+        except KeyError:
+            resource = None
+        if resource is None or path == '/':
+            # Not Found
+            transaction.response.code = defines.Code.NOT_FOUND
+        else:
+            transaction = await self._resourceLayer.fetch_resource(transaction, resource)
+        return transaction
+
+    async def _handle_patch(self, transaction: Transaction) -> Transaction:
+        """
+        Handle PATCH and iPATCH requests. Unlike PUT, they do not create resources.
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the request
+        :rtype : Transaction
+        :return: the edited transaction with the response to the request
+        """
+        path = str("/" + transaction.request.uri_path)
+        transaction.response = Response()
+        transaction.response.destination = transaction.request.source
+        transaction.response.token = transaction.request.token
+        try:
+            resource = self._root[path]
+        except KeyError:
+            transaction.response.code = defines.Code.NOT_FOUND
+        else:
+            transaction = await self._resourceLayer.patch_resource(transaction, resource)
+        return transaction
@@ -1,10 +1,9 @@
 import asyncio
 import functools
-import logging
 import concurrent.futures
 from typing import Callable, List
 
-from aiocoapthon.utilities import errors
+from aiocoapthon.utilities import errors, tracing, events
 from aiocoapthon.utilities import defines
 from aiocoapthon.messages.response import Response
 from aiocoapthon.messages.request import Request
@@ -13,7 +12,7 @@ from aiocoapthon.utilities.transaction import Transaction
 
 __author__ = 'Giacomo Tanganelli'
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 
 class ResourceLayer(object):
@@ -23,7 +22,15 @@ class ResourceLayer(object):
 
     @staticmethod
     async def call_method(method: Callable, request: Request, response: Response):
+        trace = tracing.current()
+        span = trace.start("handler")
+        try:
+            return await ResourceLayer._call_method(method, request, response)
+        finally:
+            trace.end(span)
 
+    @staticmethod
+    async def _call_method(method: Callable, request: Request, response: Response):
         if not asyncio.iscoroutinefunction(method):
             loop = asyncio.get_event_loop()
             with concurrent.futures.ThreadPoolExecutor() as pool:
@@ -62,7 +69,21 @@ class ResourceLayer(object):
         :param transaction: the transaction
         :return: the transaction
         """
+        return await cls._read_resource(transaction, resource, "GET")
 
+    @classmethod
+    async def fetch_resource(cls, transaction: Transaction, resource: Resource) -> Transaction:
+        """
+        Render a FETCH request.
+
+        :param resource: the resource
+        :param transaction: the transaction
+        :return: the transaction
+        """
+        return await cls._read_resource(transaction, resource, "FETCH")
+
+    @classmethod
+    async def _read_resource(cls, transaction: Transaction, resource: Resource, name: str) -> Transaction:
         transaction.resource = resource
         # If-Match
         if transaction.request.if_match:
@@ -71,7 +92,7 @@ class ResourceLayer(object):
                 transaction.response.code = defines.Code.PRECONDITION_FAILED
                 return transaction
 
-        method = getattr(resource, "handle_get", None)
+        method = getattr(resource, "handle_" + name.lower(), None)
         try:
             ret = await cls.call_method(method, request=transaction.request, response=transaction.response)
 
@@ -114,7 +135,7 @@ class ResourceLayer(object):
         except NotImplementedError:  # pragma: no cover
             transaction.response.code = defines.Code.METHOD_NOT_ALLOWED
             transaction.response.clear_options()
-            transaction.response.payload = "GET method is not allowed."
+            transaction.response.payload = "{0} method is not allowed.".format(name)
             return transaction
         except Exception:  # pragma: no cover
             raise errors.InternalError(msg="Resource handler is not correctly implemented",
@@ -130,6 +151,21 @@ class ResourceLayer(object):
         :param resource: the resource
         :return: the response
         """
+        return await cls._write_resource(transaction, resource, "PUT")
+
+    @classmethod
+    async def patch_resource(cls, transaction: Transaction, resource: Resource) -> Transaction:
+        """
+        Render a PATCH or an iPATCH on a resource.
+
+        :param transaction: the transaction
+        :param resource: the resource
+        :return: the response
+        """
+        return await cls._write_resource(transaction, resource, "PATCH")
+
+    @classmethod
+    async def _write_resource(cls, transaction: Transaction, resource: Resource, name: str) -> Transaction:
         # If-Match
         if transaction.request.if_match:
             if "".encode("utf-8") not in transaction.request.if_match and resource.etag \
@@ -137,7 +173,7 @@ class ResourceLayer(object):
                 transaction.response.code = defines.Code.PRECONDITION_FAILED
                 return transaction
 
-        method = getattr(resource, "handle_put", None)
+        method = getattr(resource, "handle_" + name.lower(), None)
         try:
             ret = await cls.call_method(method, request=transaction.request, response=transaction.response)
 
@@ -158,8 +194,10 @@ class ResourceLayer(object):
                                            transaction=transaction)
 
             transaction.resource, transaction.response = resource_rep, response
-            transaction.resource.changed = True
-            transaction.resource.observe_count += 1
+            if transaction.response.code is None or transaction.response.code < defines.Code.BAD_REQUEST:
+                # a rejected change (e.g. a malformed patch) is not notified
+                transaction.resource.changed = True
+                transaction.resource.observe_count += 1
 
             if transaction.response.code is None or transaction.response.code == defines.Code.EMPTY:
                 transaction.response.code = defines.Code.CHANGED
@@ -167,7 +205,7 @@ class ResourceLayer(object):
         except NotImplementedError:  # pragma: no cover
             transaction.response.code = defines.Code.METHOD_NOT_ALLOWED
             transaction.response.clear_options()
-            transaction.response.payload = "PUT method is not allowed."
+            transaction.response.payload = "{0} method is not allowed.".format(name)
         except Exception:  # pragma: no cover
             raise errors.InternalError(msg="Resource handler is not correctly implemented",
                                        response_code=defines.Code.INTERNAL_SERVER_ERROR,
@@ -2,16 +2,50 @@ import base64
 import ipaddress
 from typing import Optional, Union, List, Tuple
 
-from aiocoapthon.messages.options import Option
-from aiocoapthon.utilities import errors, utils, defines
+from aiocoapthon.messages.options import Option, OptionList
+from aiocoapthon.utilities import errors, utils, defines, pool, content_formats
 
 __author__ = 'Giacomo Tanganelli'
 
 
+def _values(options: List[Option]) -> list:
+    return [option.value for option in options]
+
+
+def _first(options: List[Option]):
+    return options[0].value if options else None
+
+
+def _content_type(options: List[Option]) -> defines.ContentType:
+    if not options:
+        return defines.ContentType.TEXT_PLAIN
+    try:
+        return defines.ContentType(options[-1].value)
+    except ValueError:  # pragma: no cover
+        raise errors.CoAPException("Unknown Content Type")
+
+
+def _observe(options: List[Option]) -> Optional[int]:
+    if not options:
+        return None
+    value = options[0].value
+    return 0 if value is None else value
+
+
+def _block(options: List[Option]) -> Optional[Tuple[int, int, int]]:
+    return utils.parse_blockwise(options[-1].value) if options else None
+
+
 class Message(object):
     """
     Class to handle the Messages.
     """
+    __slots__ = ("_type", "_mid", "_token", "_options", "_payload", "_destination", "_source", "_code",
+                 "_acknowledged", "_rejected", "_completed", "_timeouts", "_cancelled", "_duplicated", "_timestamp",
+                 "_version")
+
+    def __new__(cls, *args, **kwargs):
+        return pool.new(cls)
 
     def __init__(self):
         """
@@ -20,7 +54,7 @@ class Message(object):
         self._type = None
         self._mid = None
         self._token = None
-        self._options = []
+        self._options = OptionList()
         self._payload = utils.CoAPPayload()
         self._destination = None
         self._source = None
@@ -143,9 +177,9 @@ class Message(object):
         Return the options of the CoAP message.
 
         :rtype: list
-        :return: the options
+        :return: the options ordered by number
         """
-        return sorted(self._options, key=lambda o: o.number)
+        return self._options.as_list()
 
     @options.setter
     def options(self, value: Optional[List[Option]]):
@@ -158,7 +192,7 @@ class Message(object):
         if value is None:
             value = []
         if isinstance(value, list):
-            self._options = value
+            self._options = OptionList(value)
         else:  # pragma: no cover
             raise errors.CoAPException("Invalid option list")
 
@@ -189,6 +223,34 @@ class Message(object):
         else:  # pragma: no cover
             raise errors.CoAPException("Payload must be bytes, str or None")
 
+    @property
+    def value(self):
+        """
+        Decode the payload with the codec of its Content-Format. The payload is decoded at each access, from a view
+        on it and not from a copy.
+
+        :return: the decoded value, None if there is no payload
+        :raise CoAPException: if the payload is malformed, or there is no codec for its Content-Format
+        """
+        if not len(self._payload):
+            return None
+        return content_formats.decode(self._payload.view, self.content_type)
+
+    def set_value(self, value, content_type: Union[defines.ContentType, int, None] = None):
+        """
+        Encode a value as the payload, with the codec of a Content-Format.
+
+        :param value: the value
+        :param content_type: the Content-Format, set as the Content-Format option, None to use the one of the message
+        :raise CoAPException: if the value cannot be encoded, or there is no codec for the Content-Format
+        """
+        if content_type is None:
+            self.payload = content_formats.encode(value, self.content_type)
+            return
+        self.payload = content_formats.encode(value, content_type)
+        del self.content_type
+        self.content_type = content_type
+
     @property
     def destination(self) -> Optional[Tuple[Union[ipaddress.IPv4Address, ipaddress.IPv6Address], int]]:
         """
@@ -404,10 +466,7 @@ class Message(object):
         :param option: the option to be checked
         :return: True if already present, False otherwise
         """
-        for opt in self._options:
-            if option.number == opt.number:
-                return True
-        return False
+        return option.number in self._options
 
     def add_option(self, option: Option):
         """
@@ -422,11 +481,7 @@ class Message(object):
             ret = self._already_in(option)
             if ret:  # pragma: no cover
                 raise errors.CoAPException("Option {0} is not repeatable".format(option.name))
-            else:
-                self._options.append(option)
-        else:
-            self._options.append(option)
-        # self._options = sorted(self._options, key=lambda o: o.number)
+        self._options.add(option)
 
     def add_options(self, options: List[Option]):
         for o in options:
@@ -440,8 +495,7 @@ class Message(object):
         :param option: the option
         """
         assert isinstance(option, Option)
-        while option in list(self._options):
-            self._options.remove(option)
+        self._options.remove(option)
 
     def del_option_by_name(self, name: str):  # pragma: no cover
         """
@@ -450,10 +504,10 @@ class Message(object):
         :type name: String
         :param name: option name
         """
-        for o in list(self._options):
+        for o in self._options.as_list():
             assert isinstance(o, Option)
             if o.name == name:
-                self._options.remove(o)
+                self._options.remove_number(o.number)
 
     def del_option_by_number(self, number: int):
         """
@@ -462,14 +516,10 @@ class Message(object):
         :type number: Integer
         :param number: option naumber
         """
-        for o in list(self._options):
-            assert isinstance(o, Option)
-            if o.number == number:
-                self._options.remove(o)
+        self._options.remove_number(number)
 
     def clear_options(self):
-        for o in list(self._options):
-            self._options.remove(o)
+        self._options.clear()
 
     @property
     def etag(self) -> List[bytes]:
@@ -479,11 +529,7 @@ class Message(object):
         :rtype: list
         :return: the ETag values or [] if not specified by the request
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.ETAG.value:
-                value.append(option.value)
-        return value
+        return list(self._options.decoded(defines.OptionRegistry.ETAG.value, "values", _values))
 
     @etag.setter
     def etag(self, etag: List[Union[str, bytes]]):
@@ -519,14 +565,7 @@ class Message(object):
 
         :return: the Content-Type value or 0 if not specified by the response
         """
-        value = defines.ContentType.TEXT_PLAIN
-        for option in self.options:
-            if option.number == defines.OptionRegistry.CONTENT_TYPE.value:
-                try:
-                    value = defines.ContentType(option.value)
-                except ValueError:  # pragma: no cover
-                    raise errors.CoAPException("Unknown Content Type")
-        return value
+        return self._options.decoded(defines.OptionRegistry.CONTENT_TYPE.value, "content_type", _content_type)
 
     @content_type.setter
     def content_type(self, content_type: Union[defines.ContentType, int]):
@@ -558,12 +597,7 @@ class Message(object):
 
         :return: 0, if the request is an observing request
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.OBSERVE.value:
-                if option.value is None:
-                    return 0
-                return option.value
-        return None
+        return self._options.decoded(defines.OptionRegistry.OBSERVE.value, "observe", _observe)
 
     @observe.setter
     def observe(self, ob: int):
@@ -591,11 +625,7 @@ class Message(object):
 
         :return: the Block1 value
         """
-        value = None
-        for option in self.options:
-            if option.number == defines.OptionRegistry.BLOCK1.value:
-                value = utils.parse_blockwise(option.value)
-        return value
+        return self._options.decoded(defines.OptionRegistry.BLOCK1.value, "block", _block)
 
     @block1.setter
     def block1(self, value: Tuple[int, int, int]):
@@ -642,11 +672,7 @@ class Message(object):
 
         :return: the Block2 value
         """
-        value = None
-        for option in self.options:
-            if option.number == defines.OptionRegistry.BLOCK2.value:
-                value = utils.parse_blockwise(option.value)
-        return value
+        return self._options.decoded(defines.OptionRegistry.BLOCK2.value, "block", _block)
 
     @block2.setter
     def block2(self, value: Tuple[int, int, int]):
@@ -686,6 +712,20 @@ class Message(object):
         """
         self.del_option_by_number(defines.OptionRegistry.BLOCK2.value)
 
+    def bert_block(self, option: defines.OptionRegistry, num: int, m: int):
+        """
+        Set the Block1 or Block2 option with SZX=7, which stands for a BERT block on reliable transports.
+        The block carries one or more units of BERT_UNIT bytes, and num counts units.
+
+        :param option: BLOCK1 or BLOCK2
+        :param num: the num field of the block option
+        :param m: the M bit of the block option
+        """
+        block = Option(option)
+        block.value = (num << 4) | (m << 3) | 7
+        self.del_option_by_number(option.value)
+        self.add_option(block)
+
     @property
     def cache_key(self) -> str:  # pragma: no cover
         value = [self.code.value.to_bytes(1, 'big').decode("utf-8")]
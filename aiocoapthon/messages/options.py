@@ -1,7 +1,7 @@
 import struct
-from typing import Union
+from typing import Union, List, Iterable, Iterator, Callable, Any, Optional
 
-from aiocoapthon.utilities import utils, errors
+from aiocoapthon.utilities import utils, errors, pool
 from aiocoapthon.utilities.defines import OptionType, OptionRegistry
 
 __author__ = 'Giacomo Tanganelli'
@@ -11,6 +11,11 @@ class Option(object):
     """
     Class to handle the CoAP Options.
     """
+    __slots__ = ("_type", "_raw_value")
+
+    def __new__(cls, *args, **kwargs):
+        return pool.new(cls)
+
     def __init__(self, opt_type: OptionRegistry):
         """
         Data structure to store options.
@@ -191,4 +196,123 @@ class Option(object):
         :rtype : Boolean
         :return: True, if option are equal
         """
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, Option):  # pragma: no cover
+            return NotImplemented
+        return self._type == other._type and self._raw_value == other._raw_value
+
+
+class OptionList(object):
+    """
+    Container of the options of a message, kept ordered by option number and indexed by it.
+    Repeated options keep their insertion order. The values decoded from the options with a given number are cached
+    until an option with that number is added or removed.
+    """
+    __slots__ = ("_options", "_index", "_values")
+
+    def __init__(self, options: Optional[Iterable[Option]] = None):
+        """
+        Initialize the container.
+
+        :param options: the initial options
+        """
+        self._options = []
+        self._index = {}
+        self._values = {}
+        if options is not None:
+            for option in options:
+                self.add(option)
+
+    def add(self, option: Option):
+        """
+        Insert an option after the options with a lower or equal number.
+
+        :param option: the option
+        """
+        number = option.number
+        position = len(self._options)
+        while position > 0 and self._options[position - 1].number > number:
+            position -= 1
+        self._options.insert(position, option)
+        self._index.setdefault(number, []).append(option)
+        self._values.pop(number, None)
+
+    def remove(self, option: Option):
+        """
+        Remove every option equal to the given one.
+
+        :param option: the option
+        """
+        number = option.number
+        if number not in self._index:
+            return
+        self._options = [o for o in self._options if not (o.number == number and o == option)]
+        remaining = [o for o in self._index[number] if o != option]
+        if remaining:
+            self._index[number] = remaining
+        else:
+            del self._index[number]
+        self._values.pop(number, None)
+
+    def remove_number(self, number: int):
+        """
+        Remove the options with the given number.
+
+        :param number: the option number
+        """
+        if number not in self._index:
+            return
+        del self._index[number]
+        self._options = [o for o in self._options if o.number != number]
+        self._values.pop(number, None)
+
+    def clear(self):
+        """
+        Remove every option.
+        """
+        self._options = []
+        self._index = {}
+        self._values = {}
+
+    def get(self, number: int) -> List[Option]:
+        """
+        Return the options with the given number, in insertion order.
+
+        :param number: the option number
+        :return: the options, or an empty list
+        """
+        return self._index.get(number, [])
+
+    def __contains__(self, number: int) -> bool:
+        return number in self._index
+
+    def decoded(self, number: int, name: str, decode: Callable[[List[Option]], Any]) -> Any:
+        """
+        Return a value decoded from the options with the given number, decoding it on first access.
+
+        :param number: the option number
+        :param name: the name of the decoded value, since a number can be decoded in several ways
+        :param decode: the function that computes the value from the options
+        :return: the decoded value
+        """
+        values = self._values.get(number, None)
+        if values is None:
+            values = self._values[number] = {}
+        try:
+            return values[name]
+        except KeyError:
+            value = values[name] = decode(self._index.get(number, []))
+            return value
+
+    def __iter__(self) -> Iterator[Option]:
+        return iter(self._options)
+
+    def __len__(self) -> int:
+        return len(self._options)
+
+    def as_list(self) -> List[Option]:
+        """
+        Return the options ordered by number.
+
+        :return: a new list with the options
+        """
+        return list(self._options)
@@ -1,16 +1,26 @@
 from typing import Optional, List, Union
 
 from aiocoapthon.utilities import errors, defines
-from aiocoapthon.messages.message import Message
+from aiocoapthon.messages.message import Message, _values, _first
 from aiocoapthon.messages.options import Option
 
 __author__ = 'Giacomo Tanganelli'
 
 
+def _path(options: List[Option]) -> Optional[str]:
+    return "/".join(option.value for option in options) if options else None
+
+
+def _query(options: List[Option]) -> Optional[str]:
+    return "&".join(option.value for option in options) if options else None
+
+
 class Request(Message):
     """
     Class to handle the Requests.
     """
+    __slots__ = ()
+
     def __init__(self):
         """
         Initialize a Request message.
@@ -27,13 +37,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Query string
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_QUERY.number:
-                value.append(option.value)
-        if len(value) == 0:
-            return None
-        return "&".join(value)
+        return self._options.decoded(defines.OptionRegistry.URI_QUERY.number, "joined", _query)
 
     @uri_query.setter
     def uri_query(self, value: str):
@@ -65,11 +69,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Query string
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_QUERY.number:
-                value.append(option.value)
-        return value
+        return list(self._options.decoded(defines.OptionRegistry.URI_QUERY.number, "values", _values))
 
     @property
     def uri_path(self) -> Optional[str]:
@@ -79,13 +79,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Path
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_PATH.number:
-                value.append(option.value)
-        if len(value) == 0:
-            return None
-        return "/".join(value)
+        return self._options.decoded(defines.OptionRegistry.URI_PATH.number, "joined", _path)
 
     @uri_path.setter
     def uri_path(self, path: str):
@@ -119,11 +113,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Path
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_PATH.number:
-                value.append(option.value)
-        return value
+        return list(self._options.decoded(defines.OptionRegistry.URI_PATH.number, "values", _values))
 
     @property
     def accept(self) -> Optional[int]:
@@ -133,10 +123,7 @@ class Request(Message):
         :return: the Accept value or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.ACCEPT.number:
-                return option.value
-        return None
+        return self._options.decoded(defines.OptionRegistry.ACCEPT.number, "first", _first)
 
     @accept.setter
     def accept(self, value: int):
@@ -169,11 +156,7 @@ class Request(Message):
         :return: the If-Match values or [] if not specified by the request
         :rtype : list
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.IF_MATCH.number:
-                value.append(option.value)
-        return value
+        return list(self._options.decoded(defines.OptionRegistry.IF_MATCH.number, "values", _values))
 
     @if_match.setter
     def if_match(self, values: Union[List[bytes], bytes]):
@@ -206,10 +189,7 @@ class Request(Message):
         :return: True, if if-none-match is present
         :rtype : bool
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.IF_NONE_MATCH.number:
-                return True
-        return False
+        return defines.OptionRegistry.IF_NONE_MATCH.number in self._options
 
     @if_none_match.setter
     def if_none_match(self, v: bool=True):
@@ -231,10 +211,7 @@ class Request(Message):
 
     @property
     def no_response(self) -> bool:
-        for option in self.options:
-            if option.number == defines.OptionRegistry.NO_RESPONSE.number:
-                return True
-        return False
+        return defines.OptionRegistry.NO_RESPONSE.number in self._options
 
     @no_response.setter
     def no_response(self, v: bool = True):
@@ -263,10 +240,7 @@ class Request(Message):
         :return: the Proxy-Uri values or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.PROXY_URI.number:
-                return option.value
-        return None
+        return self._options.decoded(defines.OptionRegistry.PROXY_URI.number, "first", _first)
 
     @proxy_uri.setter
     def proxy_uri(self, value: str):
@@ -295,10 +269,7 @@ class Request(Message):
         :return: the Proxy-Schema values or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.PROXY_SCHEME.number:
-                return option.value
-        return None
+        return self._options.decoded(defines.OptionRegistry.PROXY_SCHEME.number, "first", _first)
 
     @proxy_schema.setter
     def proxy_schema(self, value: str):
@@ -1,3 +1,5 @@
+from typing import List
+
 from aiocoapthon.utilities import defines
 from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.options import Option
@@ -5,10 +7,23 @@ from aiocoapthon.messages.options import Option
 __author__ = 'Giacomo Tanganelli'
 
 
+def _location_path(options: List[Option]) -> str:
+    return "/".join(str(option.value) for option in options)
+
+
+def _location_query(options: List[Option]) -> str:
+    return "&".join(option.value for option in options)
+
+
+def _max_age(options: List[Option]) -> int:
+    return options[-1].value if options else defines.OptionRegistry.MAX_AGE.default
+
+
 class Response(Message):
     """
     Class to handle the Responses.
     """
+    __slots__ = ()
 
     def __init__(self):
         super().__init__()
@@ -21,11 +36,7 @@ class Response(Message):
         :rtype : String
         :return: the Location-Path option
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.LOCATION_PATH.number:
-                value.append(str(option.value))
-        return "/".join(value)
+        return self._options.decoded(defines.OptionRegistry.LOCATION_PATH.number, "joined", _location_path)
 
     @location_path.setter
     def location_path(self, path: str):
@@ -60,11 +71,7 @@ class Response(Message):
         :rtype : String
         :return: the Location-Query option
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.LOCATION_QUERY.number:
-                value.append(option.value)
-        return "&".join(value)
+        return self._options.decoded(defines.OptionRegistry.LOCATION_QUERY.number, "joined", _location_query)
 
     @location_query.setter
     def location_query(self, value: str):
@@ -96,11 +103,7 @@ class Response(Message):
         :rtype : int
         :return: the MaxAge option
         """
-        value = defines.OptionRegistry.MAX_AGE.default
-        for option in self.options:
-            if option.number == defines.OptionRegistry.MAX_AGE.number:
-                value = option.value
-        return value
+        return self._options.decoded(defines.OptionRegistry.MAX_AGE.number, "max_age", _max_age)
 
     @max_age.setter
     def max_age(self, value: int):
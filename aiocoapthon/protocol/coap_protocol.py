@@ -1,28 +1,40 @@
 import asyncio
 import functools
-import logging
 import random
 import socket
 import struct
+import time
 from ipaddress import IPv4Address, IPv6Address
-from typing import Union
+from typing import Union, Optional
 
 from aiocoapthon.layers.blocklayer import BlockLayer
 from aiocoapthon.layers.messagelayer import MessageLayer
 from aiocoapthon.layers.observelayer import ObserveLayer
+from aiocoapthon.layers.oscorelayer import OSCORELayer
 from aiocoapthon.layers.requestlayer import RequestLayer
 from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.request import Request
 from aiocoapthon.messages.response import Response
-from aiocoapthon.utilities import errors, defines
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.transport.udp import UDPTransport
+from aiocoapthon.utilities import errors, defines, pool, tracing, events, utils
+from aiocoapthon.utilities.admission import AdmissionControl
+from aiocoapthon.utilities.dedup import DeduplicationCache
+from aiocoapthon.utilities.metrics import MetricsRegistry, MetricsExporter
+from aiocoapthon.utilities.oscore import SecurityContext
 from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities.tracing import Tracer
 from aiocoapthon.utilities.transaction import Transaction
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
+
+_TYPE_LABELS = ("CON", "NON", "ACK", "RST")
+_CODE_LABELS = tuple("{0}.{1:02d}".format(code >> 5, code & 0x1F) for code in range(256))
 
 
 class CoAPProtocol(object):
-    def __init__(self, local_address=None, remote_address=None, loop=None, starting_mid=1, enable_multicast=False):
+    def __init__(self, local_address=None, remote_address=None, loop=None, starting_mid=1, enable_multicast=False,
+                 admission: AdmissionControl = None, tracer: Tracer = None, transport: Transport = None):
         if isinstance(local_address, tuple) and (isinstance(local_address[0], IPv4Address) or isinstance(local_address[0], IPv6Address)):
             ip, port = local_address
             local_address = (ip.compressed, port)
@@ -36,15 +48,28 @@ class CoAPProtocol(object):
         self._multicast = enable_multicast
 
         self._serializer = Serializer()
-        self._messageLayer = MessageLayer(starting_mid)
-        self._blockLayer = BlockLayer()
+        # timers follow the loop clock, which is virtual on a simulated network
+        self._messageLayer = MessageLayer(starting_mid, timer=self._loop.time)
+        self._oscoreLayer = OSCORELayer()
+        self._blockLayer = BlockLayer(bert=self._bert_size)
         self._observeLayer = ObserveLayer()
         self._requestLayer = RequestLayer()
+        self._deduplication = DeduplicationCache(timer=self._loop.time)
+        self._admission = admission or AdmissionControl(timer=self._loop.time)
+        self._metrics = MetricsRegistry()
+        self._register_metrics()
+        self._exporter = None
+        self._lag_monitor = None
+        self._tracer = tracer
+        self.leisure = defines.DEFAULT_LEISURE
 
         self._socket = None
         self._multicast_socket = None
+        self._transport = transport
         self._stop = asyncio.Event()
 
+        if self._transport is not None:
+            return
         if self._address is not None:
             addrinfo = socket.getaddrinfo(self._address[0], None)[0]
             if self._multicast:
@@ -62,6 +87,84 @@ class CoAPProtocol(object):
                 self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
             self._socket.setblocking(False)
+        self._transport = UDPTransport(self._socket, self._loop, pktinfo=self._multicast)
+
+    def add_security_context(self, context: SecurityContext, peer: Optional[tuple] = None):
+        """
+        Enable OSCORE with a peer.
+
+        :param context: the security context shared with the peer
+        :param peer: the (host, port) of the peer, to protect our requests to it; None to only accept its requests
+        """
+        self._oscoreLayer.add_context(context, peer)
+
+    def remove_security_context(self, context: SecurityContext):
+        """
+        Disable OSCORE with a peer.
+
+        :param context: the security context
+        """
+        self._oscoreLayer.remove_context(context)
+
+    def _bert_size(self, peer) -> int:
+        return self._transport.bert_size(peer)
+
+    def _register_metrics(self):
+        registry = self._metrics
+        self._messages_received = registry.counter("coap_messages_received_total",
+                                                   "Datagrams received, by message type and code", ("type", "code"))
+        self._messages_sent = registry.counter("coap_messages_sent_total",
+                                               "Datagrams sent, by message type and code", ("type", "code"))
+        self._rst = registry.counter("coap_rst_total", "Reset messages, by direction", ("direction",))
+        self._retransmissions = registry.counter("coap_retransmissions_total", "Confirmable messages retransmitted")
+        self._give_ups = registry.counter("coap_give_ups_total",
+                                          "Confirmable messages not acknowledged after MAX_RETRANSMIT attempts")
+        self._duplicates = registry.counter("coap_duplicates_total", "Duplicate requests received")
+        registry.gauge("coap_live_transactions", "Transactions within their exchange lifetime",
+                       function=self._messageLayer.live_transactions)
+        registry.gauge("coap_observe_relations", "Observe relations, by resource", ("resource",),
+                       function=lambda: {(path,): count for path, count
+                                         in self._observeLayer.relations_per_resource().items()})
+        registry.gauge("coap_block_transfers", "Blockwise transfers in progress",
+                       function=self._blockLayer.transfers_in_progress)
+        self._handler_latency = registry.histogram("coap_handler_seconds",
+                                                   "Time to handle a request, by resource", ("resource",))
+        self._loop_lag = registry.gauge("coap_event_loop_lag_seconds", "Delay of the event loop in running a timer")
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        """
+        Return the metrics of the endpoint.
+
+        :return: the registry
+        """
+        return self._metrics
+
+    def _count(self, counter, data: bytes, direction: str):
+        message_type = (data[0] >> 4) & 0x03
+        counter.inc(_TYPE_LABELS[message_type], _CODE_LABELS[data[1]])
+        if message_type == defines.Type.RST:
+            self._rst.inc(direction)
+
+    async def start_metrics(self, port: Optional[int] = defines.METRICS_HTTP_PORT, host: str = "127.0.0.1",
+                            lag_interval: float = defines.METRICS_LOOP_LAG_INTERVAL):
+        """
+        Start measuring the event-loop lag and, if a port is given, export the metrics over HTTP.
+
+        :param port: the port of the Prometheus exporter, None to disable it
+        :param host: the address of the Prometheus exporter
+        :param lag_interval: how often the event-loop lag is measured
+        """
+        self._lag_monitor = self._loop.create_task(self._monitor_loop_lag(lag_interval))
+        if port is not None:
+            self._exporter = MetricsExporter(self._metrics, host, port)
+            await self._exporter.start()
+
+    async def _monitor_loop_lag(self, interval: float):
+        while not self._stop.is_set():
+            start = self._loop.time()
+            await asyncio.sleep(interval)
+            self._loop_lag.set(max(0.0, self._loop.time() - start - interval))
 
     def _create_multicast_socket(self, addrinfo):
 
@@ -106,49 +209,82 @@ class CoAPProtocol(object):
 
         self._socket.bind(self._address)
 
-    def recvfrom(self, fut=None, registed=False):
-        fd = self._socket.fileno()
-        if fut is None:
-            fut = self._loop.create_future()
-        if registed:
-            try:
-                self._loop.remove_reader(fd)
-            except ValueError:  # pragma: no cover
-                return
-        try:
-            data, addr = self._socket.recvfrom(defines.RECEIVING_BUFFER)
-        except (BlockingIOError, InterruptedError):
-            self._loop.add_reader(fd, self.recvfrom, fut, True)
-        else:
-            fut.set_result((data, addr))
-        return fut
-
-    def sendto(self, data, addr, fut=None, registed=False):
-        fd = self._socket.fileno()
-        if fut is None:
-            fut = self._loop.create_future()
-        if registed:  # pragma: no cover
-            try:
-                self._loop.remove_writer(fd)
-            except ValueError:
-                return
+    @property
+    def transport(self) -> Transport:
+        """
+        Return the transport used to exchange datagrams.
+
+        :return: the transport
+        """
+        return self._transport
+
+    def recvfrom(self):
+        return self._transport.recvfrom()
+
+    def recvmsg(self):
+        return self._transport.recvmsg()
+
+    def sendto(self, data, addr):
         if not data:  # pragma: no cover
             return
-        try:
-            n = self._socket.sendto(data, addr)
-        except (BlockingIOError, InterruptedError):  # pragma: no cover
-            self._loop.add_writer(fd, self.sendto, data, addr, fut, True)
-        else:
-            fut.set_result(n)
-        return fut
+        if len(data) >= 4:
+            self._count(self._messages_sent, data, "out")
+        return self._transport.sendto(data, addr)
 
     async def receive_message(self):
-        data, addr = await self.recvfrom()
-        self._loop.create_task(self._handler(data, addr))
+        data, addr, destination = await self.recvmsg()
+        header = self._serializer.parse_header(data)
+        admitted = False
+        if header is not None:
+            self._count(self._messages_received, data, "in")
+        if header is not None and 0 < header[1] < 32:  # requests only, responses belong to our own exchanges
+            raw = self._deduplication.get(addr, header[2], header[3])
+            if raw is not None:
+                logger.debug("duplicate_replayed", peer=addr, mid=header[2])
+                self._duplicates.inc()
+                await self.sendto(raw, addr)
+                return
+            reason = self._admission.admit(addr)
+            if reason is not None:
+                await self._shed(header, addr, reason)
+                return
+            admitted = True
+        self._loop.create_task(self._handler(data, addr, header, admitted, destination))
 
-    async def _handler(self, data, addr):
+    async def _shed(self, header, addr, reason):
+        """
+        Reject a request refused by the admission control, looking only at its header.
+        CON requests are answered with 5.03 Service Unavailable, NON requests are dropped.
+
+        :param header: the header of the request
+        :param addr: the address of the peer
+        :param reason: why the request is shed
+        """
+        logger.debug("request_shed", peer=addr, reason=reason)
+        message_type, _, mid, token = header
+        if message_type != defines.Type.CON:
+            return
+        response = Response()
+        response.destination = addr
+        response.type = defines.Type.ACK
+        response.mid = mid
+        response.token = token
+        response.code = defines.Code.SERVICE_UNAVAILABLE
+        response.max_age = self._admission.retry_after
+        await self._send_datagram(response)
+
+    async def _handler(self, data, addr, header=None, admitted=False, destination=None):
+        try:
+            await self._handle(data, addr, header, destination)
+        finally:
+            if admitted:
+                self._admission.release()
+
+    async def _handle(self, data, addr, header, destination=None):
+        if self._tracer is not None:
+            self._tracer.begin()
         try:
-            transaction, msg_type = await self._handle_datagram(data, addr)
+            transaction, msg_type = await self._handle_datagram(data, addr, header, destination)
             await self.handle_message(transaction, msg_type)
         except errors.PongException as e:
             if e.message is not None:
@@ -175,7 +311,12 @@ class CoAPProtocol(object):
                case where the message is Empty, uses a code with a reserved class
                (1, 6, or 7), or has a message format error.  Rejecting a Non-
                confirmable message MAY involve sending a matching Reset message
+
+               From RFC 7252, Section 8.1
+               A server SHOULD NOT send a Reset in reply to a multicast request
             '''
+            if utils.is_multicast(destination):
+                return
             rst = Message()
             rst.destination = addr
             rst.type = defines.Type.RST
@@ -191,9 +332,10 @@ class CoAPProtocol(object):
             e.transaction.response.destination = addr
             e.transaction.response.code = e.response_code
             e.transaction.response.payload = e.msg
+            e.transaction = await self._oscoreLayer.send_response(e.transaction)
             transaction = await self._messageLayer.send_response(e.transaction)
             await self._send_datagram(transaction.response)
-            logger.error(e.msg)
+            logger.error("internal_error", error=e.msg)
         except errors.ObserveError as e:
             if e.transaction is not None:
                 if e.transaction.separate_task is not None:
@@ -205,26 +347,38 @@ class CoAPProtocol(object):
                 e.transaction.response.code = e.response_code
                 e.transaction = await self._messageLayer.send_response(e.transaction)
                 await self._send_datagram(e.transaction.response)
-                logger.error("Observe Error")
+                logger.error("observe_error", error=e.msg)
         except errors.CoAPException as e:
-            logger.error(e.msg)
+            logger.error("coap_error", error=e.msg)
         except Exception as e:
-            logger.exception(e)
+            logger.exception("handler_failed", error=e)
 
-    async def _handle_datagram(self, data, addr):
-        message = await self._serializer.deserialize(data, source=addr)
-        logger.debug(f"handle_datagram: {message}")
+    async def _handle_datagram(self, data, addr, header=None, destination=None):
+        trace = tracing.current()
+        span = trace.start("deserialize")
+        if header is not None and self._serializer.is_empty(data, header):
+            message = self._serializer.deserialize_empty(header, source=addr)
+        else:
+            message = await self._serializer.deserialize(data, source=addr)
+            if utils.is_multicast(destination):
+                message.destination = destination
+        trace.end(span)
+        logger.debug("handle_datagram", message=message)
         if isinstance(message, Request):
             if message.type == defines.Type.RST or message.type == defines.Type.ACK:  # pragma: no cover
                 raise errors.ProtocolError("Request cannot be carried in RST or ACK messages",
                                            message.mid)
+            span = trace.start("message_layer")
             transaction = await self._messageLayer.receive_request(message)
+            trace.end(span)
             return transaction, message
         elif isinstance(message, Response):
             if message.type == defines.Type.RST:  # pragma: no cover
                 raise errors.ProtocolError("Responses cannot be carried in RST messages",
                                            message.mid)
+            span = trace.start("message_layer")
             transaction = await self._messageLayer.receive_response(message)
+            trace.end(span)
             return transaction, message
         elif isinstance(message, Message):
             if message.type == defines.Type.NON:  # pragma: no cover
@@ -235,14 +389,22 @@ class CoAPProtocol(object):
                 '''
                 raise errors.ProtocolError("NON messages cannot be EMPTY",
                                            message.mid)
+            span = trace.start("message_layer")
             transaction = await self._messageLayer.receive_empty(message)
+            trace.end(span)
             return transaction, message
         else:
             return None
 
     async def handle_message(self, transaction, message):
-        logger.debug(f"handle_message: {message}")
+        logger.debug("handle_message", message=message)
+        trace = tracing.current()
         if isinstance(message, Response):
+            if self._oscoreLayer.enabled:
+                # decrypted before any await, so that a waiting request never sees the protected response
+                span = trace.start("oscore_layer")
+                transaction = await self._oscoreLayer.receive_response(transaction)
+                trace.end(span)
             if transaction.retransmit_task is not None:
                 transaction.retransmit_stop = True
                 transaction.retransmit_task.cancel()
@@ -250,22 +412,36 @@ class CoAPProtocol(object):
                 transaction.response.acknowledged = True
                 transaction, message = await self._messageLayer.send_empty(transaction, defines.MessageRelated.RESPONSE)
                 await self._send_datagram(message)
+            span = trace.start("block_layer")
             transaction = await self._blockLayer.receive_response(transaction)
+            trace.end(span)
+            span = trace.start("observe_layer")
             transaction = await self._observeLayer.receive_response(transaction)
+            trace.end(span)
 
             async with transaction.response_wait:
                 transaction.response_wait.notify()
 
         elif isinstance(message, Request):
+            start = time.perf_counter()
             if transaction.request.duplicated:
-                logger.warning("Duplicate request")
-                if transaction.response.completed is False:
+                logger.info("duplicate_request", peer=transaction.request.source, mid=transaction.request.mid)
+                self._duplicates.inc()
+                raw = self._deduplication.get(transaction.request.source, transaction.request.mid,
+                                              transaction.request.token)
+                if raw is not None:
+                    host, port = transaction.request.source
+                    await self.sendto(raw, (str(host), port))
+                elif utils.is_multicast(transaction.request.destination):
+                    # the response is still waiting for the leisure, it answers the duplicate as well
+                    pass
+                elif transaction.response.completed is False:
                     transaction.send_separate.set()
                 else:
                     if transaction.separate_task is not None:
                         transaction.separate_task.cancel()
                     transaction = await self._messageLayer.send_response(transaction)
-                    await self._send_datagram(transaction.response)
+                    await self._send_reply(transaction, transaction.response)
                 return
 
             transaction.separate_task = self._loop.create_task(self._send_ack(transaction))
@@ -273,33 +449,58 @@ class CoAPProtocol(object):
                                                                         functools.partial(self._send_automatic_ack,
                                                                                           transaction))
 
+            if self._oscoreLayer.enabled:
+                span = trace.start("oscore_layer")
+                transaction = await self._oscoreLayer.receive_request(transaction)
+                trace.end(span)
+            span = trace.start("block_layer")
             transaction = await self._blockLayer.receive_request(transaction)
+            trace.end(span)
             if transaction.block_transfer:
                 transaction.separate_task.cancel()
                 transaction = await self._blockLayer.send_response(transaction)
+                transaction = await self._oscoreLayer.send_response(transaction)
                 transaction = await self._messageLayer.send_response(transaction)
-                await self._send_datagram(transaction.response)
+                await self._send_reply(transaction, transaction.response)
+                self._observe_latency(transaction, start)
                 return
+            span = trace.start("observe_layer")
             transaction = await self._observeLayer.receive_request(transaction)
+            trace.end(span)
 
+            span = trace.start("request_layer")
             transaction = await self._requestLayer.receive_request(transaction)
+            trace.end(span)
             transaction.response.source = self._address
 
+            span = trace.start("observe_layer")
             transaction = await self._observeLayer.send_response(transaction)
+            trace.end(span)
+            span = trace.start("block_layer")
             transaction = await self._blockLayer.send_response(transaction)
+            trace.end(span)
 
             transaction.separate_task.cancel()
 
+            if self._oscoreLayer.enabled:
+                span = trace.start("oscore_layer")
+                transaction = await self._oscoreLayer.send_response(transaction)
+                trace.end(span)
+            span = trace.start("message_layer")
             transaction = await self._messageLayer.send_response(transaction)
+            trace.end(span)
 
             if transaction.response is not None:
+                if utils.is_multicast(transaction.request.destination):
+                    await self._leisure()
                 if transaction.response.type == defines.Type.CON:
                     future_time = random.uniform(defines.ACK_TIMEOUT,
                                                  (defines.ACK_TIMEOUT * defines.ACK_RANDOM_FACTOR))
                     transaction.retransmit_task = self._loop.create_task(
                         self._retransmit(transaction, transaction.response, future_time, 0))
 
-                await self._send_datagram(transaction.response)
+                await self._send_reply(transaction, transaction.response)
+            self._observe_latency(transaction, start)
             if transaction.resource is not None and transaction.resource.notify_queue is not None \
                     and transaction.resource.changed:
                 await transaction.resource.notify_queue.put(transaction.resource)
@@ -312,12 +513,38 @@ class CoAPProtocol(object):
                     if transaction.retransmit_task is not None:
                         transaction.retransmit_stop = True
                         transaction.retransmit_task.cancel()
-                transaction.response = message
+                # an ACK or RST of the response we sent, e.g. a CON notification, must not replace it
+                if not isinstance(transaction.response, Response) or transaction.response.mid != message.mid:
+                    transaction.response = message
             async with transaction.response_wait:
                 transaction.response_wait.notify()
         else:  # pragma: no cover
             raise errors.CoAPException("Unknown Message type")
 
+    async def _leisure(self):
+        """
+        Wait a random time within the leisure before answering a multicast request.
+
+        From RFC 7252, Section 8.2
+        If a server does decide to respond to a multicast request, it should
+        not respond immediately.  Instead, it should pick a random point of
+        time within the chosen leisure period to send back the unicast
+        response to the multicast request.
+        """
+        if self.leisure > 0:
+            await asyncio.sleep(random.uniform(0, self.leisure))
+
+    def _observe_latency(self, transaction: Transaction, start: float):
+        resource = transaction.resource
+        if resource is None:
+            self._handler_latency.observe(time.perf_counter() - start, "")
+        elif resource.deleted or self._requestLayer.get_resource(resource.path) is not resource:
+            # the series of a removed resource would never be updated again, e.g. a registration of a Resource
+            # Directory: the series are bounded by the resources that exist
+            self._handler_latency.remove(resource.path)
+        else:
+            self._handler_latency.observe(time.perf_counter() - start, resource.path)
+
     @property
     def current_mid(self):
         """
@@ -337,8 +564,21 @@ class CoAPProtocol(object):
         assert isinstance(c, int)
         self._currentMID = c
 
+    def stats(self) -> dict:
+        """
+        Return the runtime statistics of the endpoint.
+
+        :return: a dict with the statistics
+        """
+        return {"mid_usage": self._messageLayer.mid_usage(),
+                "deduplication": self._deduplication.stats(),
+                "admission": self._admission.stats(),
+                "pools": pool.stats()}
+
     async def _retransmit(self, transaction: Transaction, message: Message,
                           future_time: float, retransmit_count: int):
+        if self._transport.reliable:
+            return
         try:
             if message.type == defines.Type.CON:
                 while retransmit_count < defines.MAX_RETRANSMIT and \
@@ -348,28 +588,47 @@ class CoAPProtocol(object):
                     if not message.acknowledged and not message.rejected:
                         retransmit_count += 1
                         future_time *= 2
-                        logger.error(f"Retransmit message #{retransmit_count}, next attempt in {future_time}")
+                        self._retransmissions.inc()
+                        logger.debug("retransmit", mid=message.mid, attempt=retransmit_count, next_timeout=future_time)
                         await self._send_datagram(message)
 
                 if message.acknowledged or message.rejected:
                     message.timeouts = False
                 else:
-                    logger.error("Give up on message {message}".format(message=message.line_print))
+                    logger.warning("give_up", message=message)
+                    self._give_ups.inc()
                     message.timeouts = True
                     if message.observe is not None:
                         await self._observeLayer.remove_subscriber(message)
                 transaction.retransmit_stop = False
         except asyncio.CancelledError:
-            logger.debug("_retransmit cancelled")
+            logger.debug("retransmit_cancelled")
 
     async def _send_datagram(self, message: Union[Request, Response, Message]):
         destination = message.destination
         if isinstance(destination, tuple) and (isinstance(destination[0], IPv4Address) or isinstance(destination[0], IPv6Address)):
             ip, port = destination
             destination = (ip.compressed, port)
+        trace = tracing.current()
+        span = trace.start("serialize")
         raw_message = await self._serializer.serialize(message, destination=destination)
-        self._messageLayer.fetch_mid()
+        trace.end(span)
+        span = trace.start("send")
         await self.sendto(raw_message.raw, destination)
+        trace.end(span)
+        return raw_message.raw
+
+    async def _send_reply(self, transaction: Transaction, message: Union[Response, Message]):
+        """
+        Send the reply to a request and store its serialized form, so that duplicates of the request are answered
+        with the same bytes.
+
+        :param transaction: the transaction that owns the request
+        :param message: the reply, the response or an empty ACK
+        """
+        raw = await self._send_datagram(message)
+        self._deduplication.store(transaction.request.source, transaction.request.mid, raw,
+                                  transaction.request.token)
 
     async def _send_ack(self, transaction: Transaction):
         """
@@ -380,11 +639,11 @@ class CoAPProtocol(object):
         try:
             await transaction.send_separate.wait()
             if not transaction.request.acknowledged and transaction.request.type == defines.Type.CON:
-                logger.debug("send empty ack")
+                logger.debug("send_empty_ack", mid=transaction.request.mid)
                 transaction, ack = await self._messageLayer.send_empty(transaction, defines.MessageRelated.REQUEST)
-                await self._send_datagram(ack)
+                await self._send_reply(transaction, ack)
         except asyncio.CancelledError:  # pragma: no cover
-            logger.debug("_send_ack cancelled")
+            logger.debug("send_ack_cancelled")
 
     @staticmethod
     def _send_automatic_ack(transaction: Transaction):
@@ -393,7 +652,11 @@ class CoAPProtocol(object):
 
     def stop(self):
         self._stop.set()
-        if self._socket is not None:
-            self._socket.close()
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+        if self._exporter is not None:
+            self._exporter.stop()
+        if self._transport is not None:
+            self._transport.close()
         if self._multicast_socket is not None:
             self._multicast_socket.close()
@@ -0,0 +1,54 @@
+from typing import Tuple
+
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import defines, events
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class LogLevelsResource(Resource):
+    """
+    Resource to read and change at runtime the log level of the subsystems.
+
+    GET returns one "subsystem=LEVEL" line for each subsystem. PUT and POST take lines in the same format, e.g.
+    "layers.messagelayer=DEBUG", or "=INFO" for the whole package.
+    """
+
+    def __init__(self, name: str = "log"):
+        """
+        Initialize the resource.
+
+        :param name: the name of the resource
+        """
+        super().__init__(name, visible=True, observable=False)
+
+    async def handle_get(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        response.payload = "\n".join("{0}={1}".format(subsystem, level)
+                                     for subsystem, level in events.levels().items())
+        response.content_type = defines.ContentType.TEXT_PLAIN
+        return self, response
+
+    async def handle_put(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        payload = str(request.payload) if request.payload is not None else ""
+        changes = []
+        for line in payload.splitlines():
+            if not line.strip():
+                continue
+            subsystem, sep, level = line.partition("=")
+            if not sep:
+                response.code = defines.Code.BAD_REQUEST
+                response.payload = "Expected subsystem=LEVEL"
+                return self, response
+            try:
+                changes.append((subsystem.strip(), events.parse_level(level)))
+            except ValueError as e:
+                response.code = defines.Code.BAD_REQUEST
+                response.payload = str(e)
+                return self, response
+        for subsystem, level in changes:
+            events.set_level(subsystem, level)
+        response.code = defines.Code.CHANGED
+        return self, response
+
+    async def handle_post(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        return await self.handle_put(request, response)
@@ -0,0 +1,28 @@
+from typing import Tuple
+
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.metrics import MetricsRegistry
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class MetricsResource(Resource):
+    """
+    Resource exposing the metrics of an endpoint in the Prometheus text format.
+    """
+
+    def __init__(self, registry: MetricsRegistry, name: str = "metrics"):
+        """
+        Initialize the resource.
+
+        :param registry: the metrics to expose, usually CoAPServer.metrics
+        :param name: the name of the resource
+        """
+        super().__init__(name, visible=True, observable=False)
+        self._registry = registry
+
+    async def handle_get(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        response.payload = self._registry.render()
+        response.content_type = defines.ContentType.TEXT_PLAIN
+        return self, response
@@ -0,0 +1,518 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+from typing import Optional, Tuple, List, Dict, Set, Iterable
+
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import defines, errors, events
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+# registration parameters which are not attributes of the endpoint
+_PARAMETERS = ("lt", "base")
+# lookup parameters which are not filters
+_PAGING = ("page", "count")
+# link attributes holding space-separated lists, indexed by each item
+_LISTS = ("rt", "if")
+
+
+def _tokens(name: str, value) -> List[str]:
+    if value is None:
+        return [""]
+    value = str(value)
+    return value.split(" ") if name in _LISTS else [value]
+
+
+def _match(name: str, value, pattern: Optional[str]) -> bool:
+    if pattern is None:
+        return True
+    if pattern.endswith("*"):
+        return any(token.startswith(pattern[:-1]) for token in _tokens(name, value))
+    return pattern in _tokens(name, value)
+
+
+def _query(request) -> List[Tuple[str, Optional[str]]]:
+    ret = []
+    for q in request.uri_query_list:
+        name, sep, value = str(q).partition("=")
+        ret.append((name, value if sep else None))
+    return ret
+
+
+class _Index(object):
+    """
+    Inverted index from the values of an attribute to the keys of the entries having them. The values are also kept
+    sorted, so that a prefix query (e.g. rt=temp*) reads a contiguous range of them.
+    """
+    __slots__ = ("_entries", "_values")
+
+    def __init__(self):
+        self._entries = {}
+        self._values = []
+
+    def add(self, value: str, key):
+        keys = self._entries.get(value, None)
+        if keys is None:
+            keys = self._entries[value] = set()
+            bisect.insort(self._values, value)
+        keys.add(key)
+
+    def remove(self, value: str, key):
+        keys = self._entries.get(value, None)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._entries[value]
+            del self._values[bisect.bisect_left(self._values, value)]
+
+    def lookup(self, pattern: Optional[str]) -> Set:
+        if pattern is None:
+            # the attribute is present, with any value
+            pattern = "*"
+        if not pattern.endswith("*"):
+            return set(self._entries.get(pattern, ()))
+        prefix = pattern[:-1]
+        ret = set()
+        for i in range(bisect.bisect_left(self._values, prefix), len(self._values)):
+            if not self._values[i].startswith(prefix):
+                break
+            ret |= self._entries[self._values[i]]
+        return ret
+
+
+class Registration(object):
+    """
+    The registration of an endpoint and of its links.
+    """
+    __slots__ = ("id", "ep", "d", "base", "lifetime", "expires", "attributes", "links", "resource")
+
+    def __init__(self, identifier: int, ep: str, d: Optional[str]):
+        """
+        Data structure to store a registration.
+
+        :param identifier: the identifier, which names the registration resource
+        :param ep: the endpoint name
+        :param d: the sector, None if absent
+        """
+        self.id = identifier
+        self.ep = ep
+        self.d = d
+        self.base = None
+        self.lifetime = defines.RD_DEFAULT_LIFETIME
+        self.expires = None
+        # the endpoint attributes, e.g. ep, d and et
+        self.attributes = {}
+        # (target, attributes) as registered
+        self.links = []
+        self.resource = None
+
+    @property
+    def path(self) -> str:
+        return "/reg/{0}".format(self.id)
+
+    def resolve(self, target: str) -> str:
+        """
+        Return the absolute URI of a link target, which is relative to the base URI of the registration.
+
+        :param target: the target
+        :return: the URI
+        """
+        if "://" in target:
+            return target
+        return self.base + ("" if target.startswith("/") else "/") + target
+
+
+class ResourceDirectory(object):
+    """
+    Resource Directory (RFC 9176) on top of a CoAPServer: endpoints POST their links to /rd, and refresh or remove
+    their registration at the location returned, /reg/<id>. Registrations expire at the end of their lifetime.
+
+    The endpoint and resource lookup interfaces, /rd-lookup/ep and /rd-lookup/res, answer from inverted indexes on
+    ep and d, and on the rt, if and href of the links, and only check the remaining filters on the entries selected
+    by those. Results are ordered by registration and paginated with page and count.
+    """
+
+    def __init__(self, server, loop: asyncio.AbstractEventLoop = None):
+        """
+        Add the interfaces of the directory to a server.
+
+        :param server: the CoAPServer
+        :param loop: the event loop
+        """
+        self._server = server
+        self._loop = loop or asyncio.get_event_loop()
+        self._ids = itertools.count(1)
+        self._registrations = {}
+        # (ep, d) -> registration
+        self._names = {}
+        # endpoint attribute -> index of the registration ids
+        self._endpoints = {"ep": _Index(), "d": _Index()}
+        # link attribute -> index of (registration id, link position)
+        self._resources = {"rt": _Index(), "if": _Index(), "href": _Index()}
+        # (expiry time, registration id), an entry is stale if the registration expires at another time
+        self._expiries = []
+        self._timer = None
+        server.add_resource("rd/", RegistrationInterface(self))
+        server.add_resource("rd-lookup/ep/", LookupResource(self, "ep"))
+        server.add_resource("rd-lookup/res/", LookupResource(self, "res"))
+
+    def __len__(self):
+        return len(self._registrations)
+
+    def get(self, identifier: int) -> Optional[Registration]:
+        """
+        Return a registration.
+
+        :param identifier: the registration id
+        :return: the registration, None if there is none
+        """
+        return self._registrations.get(identifier, None)
+
+    def register(self, request) -> Registration:
+        """
+        Register an endpoint, or replace the registration of the same endpoint name and sector.
+
+        :param request: the POST to the registration interface
+        :return: the registration
+        :raise CoAPException: if the request is not a valid registration
+        """
+        query = dict(_query(request))
+        ep = query.get("ep", None)
+        if not ep:
+            raise errors.CoAPException("Missing endpoint name")
+        d = query.get("d", None)
+        lifetime = self._lifetime(query)
+        links = self._links(request)
+        registration = self._names.get((ep, d), None)
+        if registration is None:
+            registration = Registration(next(self._ids), ep, d)
+            registration.resource = RegistrationResource(self, registration)
+            self._registrations[registration.id] = registration
+            self._names[(ep, d)] = registration
+        else:
+            self._unindex(registration)
+            registration.attributes = {}
+            registration.base = None
+        self._update(registration, request, query, lifetime or defines.RD_DEFAULT_LIFETIME, links)
+        logger.debug("rd_register", ep=ep, d=d, registration=registration.path, links=len(registration.links))
+        return registration
+
+    def update(self, registration: Registration, request):
+        """
+        Refresh a registration, changing its lifetime, base or attributes, and its links if there is a payload.
+
+        :param registration: the registration
+        :param request: the POST to the registration resource
+        :raise CoAPException: if the request is not a valid update
+        """
+        query = dict(_query(request))
+        if any(query.get(name, None) not in (None, getattr(registration, name)) for name in ("ep", "d")):
+            raise errors.CoAPException("The endpoint name and the sector cannot change")
+        lifetime = self._lifetime(query)
+        links = self._links(request) if len(request.payload) else None
+        self._unindex(registration)
+        self._update(registration, request, query, lifetime or registration.lifetime, links)
+        logger.debug("rd_update", registration=registration.path)
+
+    def remove(self, registration: Registration):
+        """
+        Remove a registration, after its resource was deleted from the server.
+
+        :param registration: the registration
+        """
+        if self._registrations.pop(registration.id, None) is None:
+            return
+        del self._names[(registration.ep, registration.d)]
+        self._unindex(registration)
+        logger.debug("rd_remove", registration=registration.path)
+
+    def close(self):
+        """
+        Stop the expiry of the registrations.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    @staticmethod
+    def _links(request) -> List[Tuple[str, dict]]:
+        if not len(request.payload):
+            return []
+        if request.content_type != defines.ContentType.application_link_format:
+            raise errors.CoAPException("Links must be in link-format")
+        return request.value
+
+    @staticmethod
+    def _lifetime(query: Dict[str, Optional[str]]) -> Optional[int]:
+        lifetime = query.get("lt", None)
+        if lifetime is None:
+            return None
+        if not lifetime.isdigit() or not 0 < int(lifetime) <= defines.RD_MAX_LIFETIME:
+            raise errors.CoAPException("Invalid lifetime")
+        return int(lifetime)
+
+    def _update(self, registration: Registration, request, query: Dict[str, Optional[str]], lifetime: int,
+                links: Optional[List[Tuple[str, dict]]]):
+        registration.lifetime = lifetime
+        if query.get("base", None):
+            registration.base = query["base"].rstrip("/")
+        elif registration.base is None:
+            host, port = request.source
+            host = str(host)
+            registration.base = "coap://{0}:{1}".format("[" + host + "]" if ":" in host else host, port)
+        for name, value in query.items():
+            if name not in _PARAMETERS:
+                registration.attributes[name] = value
+        if links is not None:
+            registration.links = links
+        self._index(registration)
+        registration.expires = self._loop.time() + registration.lifetime
+        heapq.heappush(self._expiries, (registration.expires, registration.id))
+        if len(self._expiries) > 2 * len(self._registrations) + 64:
+            # drop the stale entries left by the updates
+            self._expiries = [(r.expires, r.id) for r in self._registrations.values()]
+            heapq.heapify(self._expiries)
+        self._schedule()
+
+    def _index(self, registration: Registration):
+        for name, index in self._endpoints.items():
+            value = registration.attributes.get(name, None)
+            if value is not None:
+                index.add(value, registration.id)
+        for position, (target, attributes) in enumerate(registration.links):
+            key = (registration.id, position)
+            self._resources["href"].add(target, key)
+            for name in _LISTS:
+                if name in attributes:
+                    for token in _tokens(name, attributes[name]):
+                        self._resources[name].add(token, key)
+
+    def _unindex(self, registration: Registration):
+        for name, index in self._endpoints.items():
+            value = registration.attributes.get(name, None)
+            if value is not None:
+                index.remove(value, registration.id)
+        for position, (target, attributes) in enumerate(registration.links):
+            key = (registration.id, position)
+            self._resources["href"].remove(target, key)
+            for name in _LISTS:
+                if name in attributes:
+                    for token in _tokens(name, attributes[name]):
+                        self._resources[name].remove(token, key)
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._expiries:
+            self._timer = self._loop.call_at(self._expiries[0][0], self._expire)
+
+    def _expire(self):
+        self._timer = None
+        now = self._loop.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, identifier = heapq.heappop(self._expiries)
+            registration = self._registrations.get(identifier, None)
+            if registration is not None and registration.expires == expires:
+                logger.debug("rd_expire", ep=registration.ep, registration=registration.path)
+                self.remove(registration)
+                self._server.remove_resource(registration.path)
+        self._schedule()
+
+    def _candidates(self, filters: List[Tuple[str, Optional[str]]], links: bool) -> Tuple[Optional[Set], list]:
+        """
+        Select the entries matching the indexed filters.
+
+        :param filters: the (name, pattern) filters of the lookup
+        :param links: True, to select (registration id, link position) keys, False for registration ids
+        :return: the selected keys, None if no filter is indexed, and the filters left to check
+        """
+        selected = None
+        remaining = []
+        for name, pattern in filters:
+            if name in self._endpoints:
+                keys = self._endpoints[name].lookup(pattern)
+                if links:
+                    keys = {(identifier, position) for identifier in keys
+                            for position in range(len(self._registrations[identifier].links))}
+            elif name in self._resources:
+                keys = self._resources[name].lookup(pattern)
+                if not links:
+                    keys = {identifier for identifier, _ in keys}
+            else:
+                remaining.append((name, pattern))
+                continue
+            selected = keys if selected is None else selected & keys
+        return selected, remaining
+
+    @staticmethod
+    def _check(registration: Registration, attributes: Optional[dict], name: str, pattern: Optional[str]) -> bool:
+        if name in registration.attributes:
+            return _match(name, registration.attributes[name], pattern)
+        if name == "base":
+            return _match(name, registration.base, pattern)
+        if name == "lt":
+            return _match(name, registration.lifetime, pattern)
+        if attributes is not None:
+            return name in attributes and _match(name, attributes[name], pattern)
+        # an endpoint matches a link attribute if any of its links does
+        return any(name in a and _match(name, a[name], pattern) for _, a in registration.links)
+
+    def lookup_endpoints(self, filters: List[Tuple[str, Optional[str]]]) -> List[Registration]:
+        """
+        Return the registrations matching all the filters.
+
+        :param filters: the (name, pattern) filters, a pattern ending with * matches by prefix, None matches any value
+        :return: the registrations, in the order they were created
+        """
+        selected, remaining = self._candidates(filters, links=False)
+        identifiers = sorted(selected) if selected is not None else sorted(self._registrations)
+        ret = []
+        for identifier in identifiers:
+            registration = self._registrations[identifier]
+            if all(self._check(registration, None, name, pattern) for name, pattern in remaining):
+                ret.append(registration)
+        return ret
+
+    def lookup_resources(self, filters: List[Tuple[str, Optional[str]]]) -> List[Tuple[Registration, str, dict]]:
+        """
+        Return the links matching all the filters.
+
+        :param filters: the (name, pattern) filters, a pattern ending with * matches by prefix, None matches any value
+        :return: the (registration, target, attributes) of the links, in the order they were registered
+        """
+        selected, remaining = self._candidates(filters, links=True)
+        if selected is None:
+            selected = ((identifier, position) for identifier, registration in self._registrations.items()
+                        for position in range(len(registration.links)))
+        ret = []
+        for identifier, position in sorted(selected):
+            registration = self._registrations[identifier]
+            target, attributes = registration.links[position]
+            if all(self._check(registration, attributes, name, pattern) for name, pattern in remaining):
+                ret.append((registration, target, attributes))
+        return ret
+
+
+def _page(request, results: list) -> list:
+    query = dict(_query(request))
+    count = query.get("count", None)
+    page = query.get("page", None)
+    if count is None:
+        return results
+    if not count.isdigit() or (page is not None and not page.isdigit()):
+        raise errors.CoAPException("Invalid page or count")
+    start = int(page or 0) * int(count)
+    return results[start:start + int(count)]
+
+
+def _links(response, links: Iterable[Tuple[str, dict]]):
+    response.set_value(list(links), defines.ContentType.application_link_format)
+
+
+class RegistrationInterface(Resource):
+    """
+    The registration interface of a Resource Directory, /rd.
+    """
+
+    def __init__(self, directory: ResourceDirectory, name: str = "rd"):
+        """
+        Initialize the resource.
+
+        :param directory: the directory
+        :param name: the name of the resource
+        """
+        super().__init__(name, visible=True, observable=False)
+        self.attributes["rt"] = "core.rd"
+        self.attributes["ct"] = str(int(defines.ContentType.application_link_format))
+        self._directory = directory
+
+    async def handle_post(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        if len(request.payload) and request.content_type != defines.ContentType.application_link_format:
+            response.code = defines.Code.UNSUPPORTED_CONTENT_FORMAT
+            return self, response
+        try:
+            registration = self._directory.register(request)
+        except errors.CoAPException as e:
+            response.code = defines.Code.BAD_REQUEST
+            response.payload = e.msg
+            return self, response
+        response.location_path = registration.path
+        return registration.resource, response
+
+
+class RegistrationResource(Resource):
+    """
+    The resource of a registration, /reg/<id>: POST refreshes it, GET reads its links and DELETE removes it.
+    """
+
+    def __init__(self, directory: ResourceDirectory, registration: Registration):
+        """
+        Initialize the resource.
+
+        :param directory: the directory
+        :param registration: the registration
+        """
+        super().__init__(str(registration.id), visible=False, observable=False)
+        self.path = registration.path
+        self._directory = directory
+        self._registration = registration
+
+    async def handle_get(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        _links(response, self._registration.links)
+        return self, response
+
+    async def handle_post(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        if len(request.payload) and request.content_type != defines.ContentType.application_link_format:
+            response.code = defines.Code.UNSUPPORTED_CONTENT_FORMAT
+            return self, response
+        try:
+            self._directory.update(self._registration, request)
+        except errors.CoAPException as e:
+            response.code = defines.Code.BAD_REQUEST
+            response.payload = e.msg
+        return self, response
+
+    async def handle_delete(self, request: "Request", response: "Response") -> Tuple[bool, "Response"]:
+        self._directory.remove(self._registration)
+        return True, response
+
+
+class LookupResource(Resource):
+    """
+    A lookup interface of a Resource Directory: /rd-lookup/ep lists registrations, /rd-lookup/res lists links.
+    """
+
+    def __init__(self, directory: ResourceDirectory, kind: str):
+        """
+        Initialize the resource.
+
+        :param directory: the directory
+        :param kind: "ep" for endpoint lookup, "res" for resource lookup
+        """
+        super().__init__(kind, visible=True, observable=False)
+        self.attributes["rt"] = "core.rd-lookup-" + kind
+        self.attributes["ct"] = str(int(defines.ContentType.application_link_format))
+        self._directory = directory
+        self._kind = kind
+
+    async def handle_get(self, request: "Request", response: "Response") -> Tuple["Resource", "Response"]:
+        filters = [(name, pattern) for name, pattern in _query(request) if name not in _PAGING]
+        try:
+            if self._kind == "ep":
+                results = _page(request, self._directory.lookup_endpoints(filters))
+                links = [(r.path, dict(r.attributes, base=r.base, lt=r.lifetime)) for r in results]
+            else:
+                results = _page(request, self._directory.lookup_resources(filters))
+                links = [(r.resolve(target), dict(attributes, anchor=attributes.get("anchor", r.base)))
+                         for r, target, attributes in results]
+        except errors.CoAPException as e:
+            response.code = defines.Code.BAD_REQUEST
+            response.payload = e.msg
+            return self, response
+        _links(response, links)
+        return self, response
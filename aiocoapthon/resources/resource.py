@@ -1,6 +1,6 @@
 from typing import Optional, Union, List, Tuple, Callable
 
-from aiocoapthon.utilities import utils, defines
+from aiocoapthon.utilities import utils, defines, content_formats
 
 __author__ = 'Giacomo Tanganelli'
 
@@ -41,6 +41,10 @@ class Resource(object):
 
         self._payload = utils.CoAPPayload()
 
+        # the value rendered with the codecs, and its encodings by Content-Format
+        self._value = None
+        self._encoded = {}
+
         self._content_type = None
 
         self._etag = None
@@ -389,6 +393,64 @@ class Resource(object):
             p = p.raw
         self._payload.payload = p
 
+    @property
+    def value(self):
+        """
+        Get the value of the resource, which render encodes with the codec of a Content-Format.
+
+        :return: the value
+        """
+        return self._value
+
+    @value.setter
+    def value(self, v):
+        """
+        Set the value of the resource. Its encodings are computed again on the next render, so a value changed in
+        place must be assigned again.
+
+        :param v: the new value
+        """
+        self._value = v
+        self._encoded = {}
+
+    def _default_content_type(self, content_type: Union[defines.ContentType, int, None]) -> \
+            Union[defines.ContentType, int]:
+        if content_type is not None:
+            return content_type
+        return self._content_type if self._content_type is not None else defines.ContentType.TEXT_PLAIN
+
+    def encoded(self, content_type: Union[defines.ContentType, int, None] = None) -> bytes:
+        """
+        Encode the value of the resource. The encoding is kept until the value changes, so the notifications of an
+        observed resource and the blocks of a large one share a single encoding.
+
+        :param content_type: the Content-Format, None for the one of the resource
+        :return: the payload
+        :raise CoAPException: if there is no codec for the Content-Format
+        """
+        content_type = int(self._default_content_type(content_type))
+        payload = self._encoded.get(content_type, None)
+        if payload is None:
+            payload = content_formats.encode(self._value, content_type)
+            self._encoded[content_type] = payload
+        return payload
+
+    def render(self, response: "Response", content_type: Union[defines.ContentType, int, None] = None) -> \
+            Tuple["Resource", "Response"]:
+        """
+        Fill a response with the encoded value of the resource, e.g. in handle_get.
+
+        :param response: the response
+        :param content_type: the Content-Format, None for the one of the resource
+        :return: a tuple with (the resource, the response)
+        :raise CoAPException: if there is no codec for the Content-Format
+        """
+        content_type = self._default_content_type(content_type)
+        response.payload = self.encoded(content_type)
+        del response.content_type
+        response.content_type = content_type
+        return self, response
+
     async def handle_get(self, request: "Request", response: "Response") -> Union[Tuple["Resource", "Response"],
                                                                                   Callable]:  # pragma: no cover
         """
@@ -432,3 +494,27 @@ class Resource(object):
         :return: a tuple with a boolean and the response or a callback
         """
         raise NotImplementedError
+
+    async def handle_fetch(self, request: "Request", response: "Response") -> Union[Tuple["Resource", "Response"],
+                                                                                    Callable]:  # pragma: no cover
+        """
+        Method to be redefined to render a FETCH request on the resource. The payload of the request selects the
+        part of the representation to return, like a GET it can be observed and answered with 2.03 Valid.
+
+        :param response: the partially filled response
+        :param request: the request
+        :return: a tuple with (the resource, the response) or a callback
+        """
+        raise NotImplementedError
+
+    async def handle_patch(self, request: "Request", response: "Response") -> Union[Tuple["Resource", "Response"],
+                                                                                    Callable]:  # pragma: no cover
+        """
+        Method to be redefined to render a PATCH or an iPATCH request on the resource, request.code tells them apart.
+        The payload of the request is a set of changes to apply to the resource.
+
+        :param response: the partially filled response
+        :param request: the request
+        :return: a tuple with (the resource, the response) or a callback
+        """
+        raise NotImplementedError
@@ -1,29 +1,49 @@
 import asyncio
-import logging
+import concurrent.futures
 import random
 import time
-from typing import List
+from typing import List, Optional, Tuple
 
 from aiocoapthon.protocol.coap_protocol import CoAPProtocol
 from aiocoapthon.resources.resource import Resource
-from aiocoapthon.utilities import errors, defines
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.utilities import errors, defines, events
+from aiocoapthon.utilities.admission import AdmissionControl
+from aiocoapthon.utilities.persistence import Store, RelationRecord, ResourceRecord
+from aiocoapthon.utilities.tracing import Tracer
+from aiocoapthon.utilities.watchdog import LoopWatchdog
 
-logger = logging.getLogger(__name__)
+logger = events.get_logger(__name__)
 
 __author__ = 'Giacomo Tanganelli'
 
 
 class CoAPServer(CoAPProtocol):
-    def __init__(self, host, port, starting_mid=1, loop=None):
-        super().__init__(local_address=(host, port), starting_mid=starting_mid, loop=loop)
+    def __init__(self, host, port, starting_mid=1, loop=None, admission: AdmissionControl = None,
+                 tracer: Tracer = None, watchdog: LoopWatchdog = None, transport: Transport = None,
+                 multicast: bool = False, leisure: float = defines.DEFAULT_LEISURE, store: Store = None,
+                 snapshot_interval: float = defines.PERSISTENCE_SNAPSHOT_INTERVAL):
+        super().__init__(local_address=(host, port), starting_mid=starting_mid, loop=loop, admission=admission,
+                         tracer=tracer, transport=transport, enable_multicast=multicast)
         self._address = (host, port)
+        self.leisure = leisure
         self.queue = asyncio.Queue()
+        self._watchdog = watchdog or LoopWatchdog()
 
         self._notifier = self._loop.create_task(self._notify_all())
         self._notifier_resource = self._loop.create_task(self._notify())
         self.notify_queue = asyncio.Queue()
 
+        self._store = store
+        self.snapshot_interval = snapshot_interval
+        # one thread saves the periodic snapshots, stop() waits for the one in progress before closing the store
+        self._saver = concurrent.futures.ThreadPoolExecutor(max_workers=1) if store is not None else None
+        self._saving = None
+        self._snapshotter = self._loop.create_task(self._snapshot_all()) if store is not None else None
+
     async def create_server(self):
+        self._watchdog.start(self._loop)
+        self.restore()
         while not self._stop.is_set():
             try:
                 await self.receive_message()
@@ -32,6 +52,123 @@ class CoAPServer(CoAPProtocol):
             except Exception:  # pragma: no cover
                 return
 
+    def stats(self) -> dict:
+        """
+        Return the runtime statistics of the server, including the event-loop watchdog.
+
+        :return: a dict with the statistics
+        """
+        ret = super().stats()
+        ret["watchdog"] = self._watchdog.stats()
+        return ret
+
+    def stop(self):
+        self._watchdog.stop()
+        if self._store is not None:
+            if self._saving is not None:
+                # a save not started yet is dropped, the one in progress completes: the final snapshot is newer
+                self._saving.cancel()
+                concurrent.futures.wait([self._saving])
+                self._saving = None
+            self._saver.shutdown(wait=True)
+            self.snapshot()
+            self._store.close()
+            self._store = None
+        super().stop()
+
+    def snapshot(self):
+        """
+        Save the observe relations and the resources in the store, done when the server stops.
+        """
+        if self._store is None:  # pragma: no cover
+            return
+        relations, resources = self._records()
+        self._store.save(relations, resources)
+        logger.debug("snapshot", relations=len(relations), resources=len(resources))
+
+    def _records(self) -> Tuple[List[RelationRecord], List[ResourceRecord]]:
+        """
+        Take the records of the observe relations and of the resources, on the event loop which changes them.
+
+        :return: the observe relations and the resources
+        """
+        resources = []
+        for path in self._requestLayer.get_resources_path():
+            if path == "/":
+                continue
+            resource = self._requestLayer.get_resource(path)
+            content_type = int(resource.content_type) if resource.content_type is not None else None
+            resources.append(ResourceRecord(path, resource.payload.raw, content_type, resource.etag,
+                                            resource.observe_count))
+        return self._observeLayer.snapshot(), resources
+
+    def restore(self):
+        """
+        Restore the resources and the observe relations saved in the store, after the resources of the application are
+        added. The state of those resources is restored, the children they created are added again. The relations are
+        rebuilt lazily by the ObserveLayer, so the observers keep receiving the notifications without registering again.
+        """
+        if self._store is None:
+            return
+        start = time.perf_counter()
+        relations, resources = self._store.load()
+        for record in resources:
+            resource = self._requestLayer.get_resource(record.path)
+            if resource is None:
+                parent = self._parent(record.path)
+                if parent is None or parent.allow_children is None:
+                    logger.debug("restore_dropped", path=record.path)
+                    continue
+                resource = parent.allow_children()
+                self.add_resource(record.path, resource)
+            if record.payload is not None:
+                resource.payload = record.payload
+            if record.content_type is not None:
+                resource.content_type = record.content_type
+            if record.etag is not None:
+                resource.etag = record.etag
+            # the observers discard a notification older than the last one they received
+            resource.observe_count = record.observe_count + 1
+        self._observeLayer.restore(relations, self._requestLayer.get_resource)
+        logger.info("restore", relations=len(relations), resources=len(resources),
+                    duration=time.perf_counter() - start)
+
+    def _parent(self, path: str) -> Optional[Resource]:
+        """
+        Return the nearest ancestor of a path in the resource tree.
+
+        :param path: the path
+        :return: the resource, None if there is none
+        """
+        while path != "/":
+            path = "/" + path.strip("/").rpartition("/")[0]
+            resource = self._requestLayer.get_resource(path)
+            if resource is not None:
+                return resource
+        return None  # pragma: no cover
+
+    async def _snapshot_all(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.snapshot_interval)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:  # pragma: no cover
+                break
+            if self._stop.is_set() or self._store is None:
+                break
+            relations, resources = self._records()
+            try:
+                # the store blocks on the disk, it is written by another thread while the loop keeps serving
+                self._saving = self._saver.submit(self._store.save, relations, resources)
+                await asyncio.wrap_future(self._saving)
+            except asyncio.CancelledError:  # pragma: no cover
+                break
+            except Exception as e:  # pragma: no cover
+                logger.exception("snapshot_failed", error=e)
+            else:
+                logger.debug("snapshot", relations=len(relations), resources=len(resources))
+
     def add_resource(self, path: str, resource: Resource) -> bool:
         """
         Helper function to add resources to the resource directory during server initialization.
@@ -43,14 +180,15 @@ class CoAPServer(CoAPProtocol):
         resource.notify_queue = self.notify_queue
         return self._requestLayer.add_resource(path, resource)
 
-    def remove_resource(self, path: str) -> bool:  # pragma: no cover
+    def remove_resource(self, path: str) -> bool:
         """
         Helper function to remove resources.
 
         :param path: the path for the unwanted resource
-        :rtype : the removed object
+        :return: True, if the resource was removed
         """
 
+        self._handler_latency.remove("/" + path.strip("/"))
         return self._requestLayer.remove_resource(path)
 
     def get_resources(self, prefix: str = None) -> List[str]:
@@ -64,7 +202,7 @@ class CoAPServer(CoAPProtocol):
                 observers = await self._observeLayer.notify(resource)
                 for transaction in observers:
                     try:
-                        logger.debug("Notify resource {0} to {1}".format(resource, transaction.response.destination))
+                        logger.debug("notify", resource=resource, destination=transaction.response.destination)
                         transaction.response = None
                         del transaction.request.block2
                         transaction = await self._blockLayer.receive_request(transaction)
@@ -72,11 +210,14 @@ class CoAPServer(CoAPProtocol):
                         transaction = await self._requestLayer.receive_request(transaction)
                         transaction = await self._observeLayer.send_response(transaction)
                         transaction = await self._blockLayer.send_response(transaction)
+                        transaction = await self._oscoreLayer.send_response(transaction)
                         transaction = await self._messageLayer.send_response(transaction)
                         if transaction.response is not None:
                             if transaction.response.type == defines.Type.CON:
                                 future_time = random.uniform(defines.ACK_TIMEOUT,
                                                              (defines.ACK_TIMEOUT * defines.ACK_RANDOM_FACTOR))
+                                # the ACK of the previous notification left the flag set
+                                transaction.retransmit_stop = False
                                 transaction.retransmit_task = self._loop.create_task(
                                     self._retransmit(transaction, transaction.response, future_time, 0))
 
@@ -94,7 +235,7 @@ class CoAPServer(CoAPProtocol):
             except asyncio.CancelledError or RuntimeError:
                 break
             except Exception as e:  # pragma: no cover
-                logger.exception(e)
+                logger.exception("notifier_failed", error=e)
                 break
 
     async def _notify_all(self):
@@ -105,7 +246,7 @@ class CoAPServer(CoAPProtocol):
                 min_pmin = defines.MINIMUM_OBSERVE_INTERVAL
                 for transaction in observers:
                     try:
-                        logger.debug("Notify All")
+                        logger.debug("notify_all", resource=transaction.resource)
                         if transaction.response.max_age is not None:
                             max_age = transaction.response.max_age
                         else:
@@ -119,6 +260,7 @@ class CoAPServer(CoAPProtocol):
                                 transaction = await self._requestLayer.receive_request(transaction)
                                 transaction = await self._observeLayer.send_response(transaction)
                                 transaction = await self._blockLayer.send_response(transaction)
+                                transaction = await self._oscoreLayer.send_response(transaction)
                                 transaction = await self._messageLayer.send_response(transaction)
                                 if transaction.response is not None:
                                     if transaction.response.max_age is not None:
@@ -129,14 +271,15 @@ class CoAPServer(CoAPProtocol):
                                     if transaction.response.type == defines.Type.CON:
                                         future_time = random.uniform(defines.ACK_TIMEOUT,
                                                                      (defines.ACK_TIMEOUT * defines.ACK_RANDOM_FACTOR))
+                                        transaction.retransmit_stop = False
                                         transaction.retransmit_task = self._loop.create_task(
                                             self._retransmit(transaction, transaction.response, future_time, 0))
 
                                     self._loop.create_task(self._send_datagram(transaction.response))
                             elif not transaction.response.acknowledged:
                                 transaction.notification_not_acknowledged += 1
-                                logger.debug("Notification for {0} on resource {1} has not been acknowledged".format(
-                                    transaction.response.destination, transaction.resource.path))
+                                logger.debug("notification_not_acknowledged", resource=transaction.resource,
+                                             destination=transaction.response.destination)
                                 notify_in = max_age
                                 if transaction.notification_not_acknowledged > defines.MAX_LOST_NOTIFICATION:
                                     await self._observeLayer.remove_subscriber(transaction.response)
@@ -153,9 +296,12 @@ class CoAPServer(CoAPProtocol):
                             e.transaction = await self._messageLayer.send_response(e.transaction)
                             self._loop.create_task(self._send_datagram(e.transaction.response))
 
+                if self._observeLayer.pending:
+                    # the restored relations which are not rebuilt yet
+                    min_pmin = min(min_pmin, defines.OBSERVE_RESTORE_INTERVAL)
                 await asyncio.sleep(min_pmin)
             except asyncio.CancelledError or RuntimeError:
                 break
             except Exception as e:  # pragma: no cover
-                logger.exception(e)
+                logger.exception("notifier_failed", error=e)
                 break
@@ -0,0 +1,194 @@
+import random
+import asyncio
+import json
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.messages.response import Response
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.utilities import cbor, content_formats
+from aiocoapthon.utilities.errors import CoAPException
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestContentFormatsClass(unittest.TestCase):  # pragma: no cover
+    def setUp(self):
+        self.server_address = ("127.0.0.1", 5683)
+        self.server_mid = random.randint(1000, 2000)
+
+    async def start_client_server(self):
+        server = CoAPServer(self.server_address[0], self.server_address[1], starting_mid=self.server_mid)
+        server.add_resource('test/', TestResource())
+
+        loop = asyncio.get_event_loop()
+        loop.create_task(server.create_server())
+        client = CoAPClient("127.0.0.1", 5683)
+        return client, server
+
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    @async_test
+    async def test_fetch_patch(self):
+        client, server = await self.start_client_server()
+        print("FETCH_PATCH")
+        resource = JSONResource(state={"temperature": 21, "humidity": 40, "log": "x" * 2000})
+        server.add_resource('state/', resource)
+        client.start_receiver()
+        merge = defines.ContentType.application_merge_patch_json
+
+        ret = await client.fetch("/state", json.dumps(["temperature"]), timeout=5)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(json.loads(str(ret.payload)), {"temperature": 21})
+        # the payload is sent again with every block of the result
+        ret = await client.fetch("/state", json.dumps(["log", "humidity"]), timeout=5)
+        self.assertEqual(json.loads(str(ret.payload)), {"log": "x" * 2000, "humidity": 40})
+        ret = await client.fetch("/state", "[", timeout=5)
+        self.assertEqual(ret.code, defines.Code.BAD_REQUEST)
+
+        ret = await client.patch("/state", json.dumps({"humidity": 45, "log": None}), timeout=5,
+                                 content_type=merge)
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        self.assertEqual(resource.state, {"temperature": 21, "humidity": 45})
+        # a patch larger than a block comes in Block1
+        ret = await client.ipatch("/state", json.dumps({"log": "y" * 3000}), timeout=5, content_type=merge)
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        self.assertEqual(resource.state["log"], "y" * 3000)
+        ret = await client.patch("/state", "{}", timeout=5)
+        self.assertEqual(ret.code, defines.Code.UNSUPPORTED_CONTENT_FORMAT)
+        ret = await client.patch("/missing", "{}", timeout=5, content_type=merge)
+        self.assertEqual(ret.code, defines.Code.NOT_FOUND)
+        ret = await client.fetch("/test", "[]", timeout=5)
+        self.assertEqual(ret.code, defines.Code.METHOD_NOT_ALLOWED)
+
+        # an observed FETCH notifies the selected members
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        observer = asyncio.get_event_loop().create_task(client.observe("/state", queue=queue, stop=stop, timeout=5,
+                                                                       code=defines.Code.FETCH,
+                                                                       payload=json.dumps(["temperature"])))
+        ret = await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(json.loads(str(ret.payload)), {"temperature": 21})
+        await client.ipatch("/state", json.dumps({"temperature": 22}), timeout=5, content_type=merge)
+        ret = await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(json.loads(str(ret.payload)), {"temperature": 22})
+        print("PASS")
+
+        stop.set()
+        observer.cancel()
+        self.stop_client_server(client, server)
+
+    def test_content_formats(self):
+        print("CONTENT_FORMATS")
+        pack = [{"bn": "urn:dev:ow:10e2073a01080063:", "bt": 1.276020076001e+09, "u": "Cel", "v": 23.5},
+                {"n": "door", "vb": True, "t": -5}, {"n": "blob", "vd": b"\x00\xff"}]
+        for content_type in (defines.ContentType.application_senml_json, defines.ContentType.application_senml_cbor):
+            data = content_formats.encode(pack, content_type)
+            self.assertEqual(content_formats.decode(data, content_type), pack)
+            # a generator of records is streamed to the same payload, and read back one record at a time
+            self.assertEqual(b"".join(content_formats.iterencode(iter(pack), content_type)), data)
+            self.assertEqual(next(content_formats.iterdecode(memoryview(data), content_type)), pack[0])
+        # the CBOR records are keyed by the integer labels
+        self.assertEqual(cbor.loads(content_formats.encode(pack[:1], defines.ContentType.application_senml_cbor)),
+                         [{-2: "urn:dev:ow:10e2073a01080063:", -3: 1.276020076001e+09, 1: "Cel", 2: 23.5}])
+        self.assertEqual(cbor.loads(cbor.dumps([0.5, 0.1, -1.0])), [0.5, 0.1, -1.0])
+        self.assertEqual(content_formats.decode(b"[]", defines.ContentType.application_senml_json), [])
+        with self.assertRaises(CoAPException):
+            content_formats.decode(b"[{}", defines.ContentType.application_senml_json)
+        with self.assertRaises(CoAPException):
+            content_formats.get(defines.ContentType.application_exi)
+
+        links = content_formats.decode(b'</sensors>;ct=40;title="Sensor Index", </sensors/temp>;rt="temperature-c";obs',
+                                       defines.ContentType.application_link_format)
+        self.assertEqual(links, [("/sensors", {"ct": 40, "title": "Sensor Index"}),
+                                 ("/sensors/temp", {"rt": "temperature-c", "obs": None})])
+        data = content_formats.encode(links, defines.ContentType.application_link_format)
+        self.assertEqual(content_formats.decode(data, defines.ContentType.application_link_format), links)
+
+        response = Response()
+        self.assertIsNone(response.value)
+        response.set_value({"a": [1, 2.5]}, defines.ContentType.application_cbor)
+        self.assertEqual(response.content_type, defines.ContentType.application_cbor)
+        self.assertEqual(response.value, {"a": [1, 2.5]})
+
+        resource = SenMLResource(pack=pack)
+        resource.render(response)
+        self.assertEqual(response.content_type, defines.ContentType.application_senml_cbor)
+        self.assertEqual(response.value, pack)
+        # the encoding is kept until the value is assigned again
+        self.assertIs(resource.encoded(), response.payload.raw)
+        resource.value = pack[:1]
+        self.assertEqual(cbor.loads(resource.encoded()), [{-2: "urn:dev:ow:10e2073a01080063:",
+                                                           -3: 1.276020076001e+09, 1: "Cel", 2: 23.5}])
+        print("PASS")
+
+    @async_test
+    async def test_senml_resource(self):
+        client, server = await self.start_client_server()
+        print("SENML_RESOURCE")
+        pack = [{"bn": "urn:dev:ow:10e2073a01080063:", "n": "sensor{0}".format(i), "v": i + 0.5} for i in range(100)]
+        resource = SenMLResource(pack=pack)
+        server.add_resource('senml/', resource)
+        client.start_receiver()
+
+        # larger than a block
+        ret = await client.get("/senml", timeout=5)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(ret.content_type, defines.ContentType.application_senml_cbor)
+        self.assertGreater(len(ret.payload), defines.MAX_PAYLOAD)
+        self.assertEqual(ret.value, pack)
+        ret = await client.get("/senml", timeout=5, accept=defines.ContentType.application_senml_json)
+        self.assertEqual(ret.content_type, defines.ContentType.application_senml_json)
+        self.assertEqual(ret.value, pack)
+        ret = await client.get("/senml", timeout=5, accept=defines.ContentType.application_exi)
+        self.assertEqual(ret.code, defines.Code.NOT_ACCEPTABLE)
+
+        # a pack that fits in a single block
+        resource.value = pack[:2]
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        observer = asyncio.get_event_loop().create_task(client.observe("/senml", queue=queue, stop=stop, timeout=5))
+        ret = await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(ret.value, pack[:2])
+        update = [{"n": "door", "vb": False}]
+        ret = await client.put("/senml", content_formats.encode(update, defines.ContentType.application_senml_json),
+                               timeout=5, content_type=defines.ContentType.application_senml_json)
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        ret = await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(ret.value, update)
+        ret = await client.put("/senml", b"\x81", timeout=5, content_type=defines.ContentType.application_senml_cbor)
+        self.assertEqual(ret.code, defines.Code.BAD_REQUEST)
+        print("PASS")
+
+        stop.set()
+        observer.cancel()
+        self.stop_client_server(client, server)
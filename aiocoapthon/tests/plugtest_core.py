@@ -369,7 +369,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid+1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.token = req.token
         expected.source = "127.0.0.1", 5683
@@ -411,7 +411,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CHANGED
         expected.token = req.token
         expected.source = "127.0.0.1", 5683
@@ -452,7 +452,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 7
+        expected.mid = self.server_mid + 2
         expected.code = defines.Code.CHANGED
         expected.token = req.token
         expected.source = "127.0.0.1", 5683
@@ -493,7 +493,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 10
+        expected.mid = self.server_mid + 3
         expected.code = defines.Code.DELETED
         expected.token = req.token
         expected.source = "127.0.0.1", 5683
@@ -1483,7 +1483,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Long Time"
         expected.token = req.token
@@ -1559,7 +1559,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 2
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Long Time"
         expected.token = token
@@ -1609,7 +1609,7 @@ class PlugtestCoreClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Long Time"
         expected.token = token
@@ -9,6 +9,9 @@ from aiocoapthon.client.coap_client import CoAPClient
 from aiocoapthon.server.coap_server import CoAPServer
 from aiocoapthon.tests.plugtest_core_resources import *
 from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.errors import CoAPException
+from aiocoapthon.utilities.tokens import TokenAllocator
+from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.response import Response
 
 logger = logging.getLogger(__name__)
@@ -291,7 +294,7 @@ class PlugtestCoreClientClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid+1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.source = "127.0.0.1", 5683
         expected.payload = "Separate"
@@ -668,3 +671,119 @@ class PlugtestCoreClientClass(unittest.TestCase):  # pragma: no cover
         self.assertEqual(ret, expected)
         await self.stop_client_server(client, server)
 
+
+    @async_test
+    async def test_concurrent_gather(self):
+        client, server = await self.start_client_server()
+        print("CONCURRENT_CLIENT_GATHER")
+        paths = ["/test", "/seg1/seg2/seg3", "/query"] * 50
+
+        ret = await client.gather(paths, timeout=10)
+        self.assertEqual(len(ret), len(paths))
+        for path, response in zip(paths, ret):
+            self.assertIsInstance(response, Response)
+            self.assertEqual(response.code, defines.Code.CONTENT)
+            if path == "/test":
+                self.assertEqual(response.payload.raw, b"Test")
+        self.assertEqual(len(set(response.token for response in ret)), len(paths))
+        self.assertEqual(len(client._tokens), 0)
+        print("PASS")
+
+        await self.stop_client_server(client, server)
+
+    @async_test
+    async def test_receiver_survives_errors(self):
+        client, server = await self.start_client_server()
+        print("CONCURRENT_CLIENT_RECEIVER_ERROR")
+        receive_message = client.receive_message
+        failures = [OSError("sendto failed")]
+
+        async def failing_receive_message():
+            if failures:
+                raise failures.pop()
+            await receive_message()
+
+        client.receive_message = failing_receive_message
+        client.start_receiver()
+        ret = await client.gather(["/test"] * 5, timeout=10)
+        self.assertEqual(failures, [])
+        self.assertEqual([response.code for response in ret], [defines.Code.CONTENT] * 5)
+        print("PASS")
+
+        await self.stop_client_server(client, server)
+
+    @async_test
+    async def test_concurrent_map(self):
+        client, server = await self.start_client_server()
+        print("CONCURRENT_CLIENT_MAP")
+        paths = ["/test", "/storage"] * 20
+        received = []
+
+        async for path, response in client.map(paths, msgtype=defines.Type.NON, timeout=10):
+            self.assertIsInstance(response, Response)
+            self.assertEqual(response.type, defines.Type.NON)
+            received.append(path)
+
+        self.assertEqual(sorted(received), sorted(paths))
+        print("PASS")
+
+        await self.stop_client_server(client, server)
+
+    @async_test
+    async def test_observe_token_reserved(self):
+        client, server = await self.start_client_server()
+        print("CONCURRENT_CLIENT_OBSERVE_TOKEN")
+        client.start_receiver()
+        # without a callback or a queue the observation outlives the call
+        response = await client.observe("/test", timeout=10)
+        self.assertIsNotNone(response.observe)
+        self.assertTrue(client._tokens.is_observe(response.token))
+        ret = await client.gather(["/test"] * 20, timeout=10)
+        self.assertNotIn(response.token, [r.token for r in ret])
+        self.assertEqual(client._tokens.observing, 1)
+
+        ret = await client.cancel_observe("/test", response.token, timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertIsNone(ret.observe)
+        self.assertEqual(len(client._tokens), 0)
+
+        response = await client.observe("/test", timeout=10)
+        reset = Message()
+        reset.type = defines.Type.RST
+        reset.token = response.token
+        reset.mid = response.mid
+        reset.destination = response.source
+        await client.send_request(reset)
+        self.assertEqual(len(client._tokens), 0)
+        print("PASS")
+
+        await self.stop_client_server(client, server)
+
+    def test_token_allocator(self):
+        print("TOKEN_ALLOCATOR")
+        allocator = TokenAllocator(8)
+        tokens = [allocator.allocate() for _ in range(1000)]
+        self.assertEqual(len(set(tokens)), len(tokens))
+        self.assertTrue(all(len(token) == 8 for token in tokens))
+
+        observe = allocator.allocate(observe=True)
+        for token in tokens:
+            allocator.release(token)
+        self.assertEqual(len(allocator), 1)
+        self.assertEqual(allocator.observing, 1)
+        self.assertTrue(allocator.in_use(observe))
+
+        # by default a token is a 2-byte sequence number followed by 2 random bytes
+        allocator = TokenAllocator()
+        tokens = [allocator.allocate() for _ in range(100)]
+        self.assertTrue(all(len(token) == defines.TOKEN_LENGTH for token in tokens))
+        sequence = [int.from_bytes(token[:2], "big") for token in tokens]
+        self.assertEqual(sequence, [(sequence[0] + i) % 65536 for i in range(100)])
+        self.assertGreater(len(set(token[2:] for token in tokens)), 1)
+
+        allocator = TokenAllocator(1)
+        live = set(allocator.allocate(observe=True) for _ in range(255))
+        self.assertNotIn(allocator.allocate(), live)
+        with self.assertRaises(CoAPException):
+            TokenAllocator(9)
+        print("PASS")
@@ -1,7 +1,10 @@
+import asyncio
+import json
 from typing import Union, Tuple, Callable
 
 from aiocoapthon.utilities import defines
 from aiocoapthon.utilities import utils
+from aiocoapthon.utilities.errors import CoAPException
 from aiocoapthon.resources.resource import Resource
 
 
@@ -204,3 +207,84 @@ class SlowResource(Resource):
     #     response.payload = self.payload
     #     return self, response
 
+
+
+class DelayedResource(Resource):
+
+    def __init__(self, name="Delayed", delay=1.0):
+        super().__init__(name)
+        self.payload = "Delayed"
+        self.delay = delay
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        await asyncio.sleep(self.delay)
+        response.payload = self.payload
+        return self, response
+
+
+class JSONResource(Resource):
+    """
+    Device state as a JSON object. FETCH selects a list of members, PATCH and iPATCH apply a JSON merge patch.
+    """
+
+    def __init__(self, name="json", state=None):
+        super().__init__(name)
+        self.state = state if state is not None else {}
+        self.content_type = defines.ContentType.application_json
+
+    def _render(self, state, response):
+        response.payload = json.dumps(state, sort_keys=True)
+        response.content_type = defines.ContentType.application_json
+        return self, response
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        return self._render(self.state, response)
+
+    async def handle_fetch(self, request: "Request", response: "Response"):
+        try:
+            keys = json.loads(str(request.payload))
+        except ValueError:
+            response.code = defines.Code.BAD_REQUEST
+            return self, response
+        return self._render({k: self.state[k] for k in keys if k in self.state}, response)
+
+    async def handle_patch(self, request: "Request", response: "Response"):
+        if request.content_type != defines.ContentType.application_merge_patch_json:
+            response.code = defines.Code.UNSUPPORTED_CONTENT_FORMAT
+            return self, response
+        try:
+            patch = json.loads(str(request.payload))
+        except ValueError:
+            response.code = defines.Code.BAD_REQUEST
+            return self, response
+        for k, v in patch.items():
+            if v is None:
+                self.state.pop(k, None)
+            else:
+                self.state[k] = v
+        return self, response
+
+
+class SenMLResource(Resource):
+    """
+    A pack of SenML records, rendered in the Content-Format asked with Accept and replaced by a PUT of any of them.
+    """
+
+    def __init__(self, name="senml", pack=None):
+        super().__init__(name)
+        self.value = pack if pack is not None else []
+        self.content_type = defines.ContentType.application_senml_cbor
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        try:
+            return self.render(response, request.accept)
+        except CoAPException:
+            response.code = defines.Code.NOT_ACCEPTABLE
+            return self, response
+
+    async def handle_put(self, request: "Request", response: "Response"):
+        try:
+            self.value = request.value
+        except CoAPException:
+            response.code = defines.Code.BAD_REQUEST
+        return self, response
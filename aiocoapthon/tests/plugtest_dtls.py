@@ -0,0 +1,124 @@
+import asyncio
+import datetime
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport import dtls
+from aiocoapthon.transport.dtls import DTLSTransport
+from aiocoapthon.utilities.errors import CoAPException
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestDTLSClass(unittest.TestCase):  # pragma: no cover
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    @unittest.skipIf(dtls.tls is None, "DTLS requires the python-mbedtls package")
+    @async_test
+    async def test_dtls(self):
+        print("DTLS")
+        server_transport = DTLSTransport(psk_store={"client": b"secretsecret1234"})
+        await server_transport.listen("127.0.0.1", 5695)
+        server = CoAPServer("127.0.0.1", 5695, transport=server_transport)
+        resource = TestResource()
+        server.add_resource('test/', resource)
+        asyncio.get_event_loop().create_task(server.create_server())
+        client_transport = DTLSTransport(psk=("client", b"secretsecret1234"))
+        client = CoAPClient("127.0.0.1", 5695, transport=client_transport)
+        client.start_receiver()
+
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(str(ret.payload), "Test")
+        session = client_transport.session(("127.0.0.1", 5695))
+        resource.payload = "y" * 3000
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(str(ret.payload), "y" * 3000)
+        # one handshake for all the exchanges
+        self.assertIs(client_transport.session(("127.0.0.1", 5695)), session)
+        self.assertEqual(len(server_transport._sessions), 1)
+        self.assertGreater(session.sent, session.written)
+
+        # a client that lost its session handshakes again from the same address
+        client_transport._sessions.clear()
+        ret = await client.put("/test", "Test", timeout=5)
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        self.assertIsNot(client_transport.session(("127.0.0.1", 5695)), session)
+        self.assertEqual(len(server_transport._sessions), 1)
+
+        stranger = CoAPClient("127.0.0.1", 5695, transport=DTLSTransport(psk=("client", b"wrongwrongwrong!")))
+        stranger.start_receiver()
+        with self.assertRaises(CoAPException):
+            await stranger.get("/test", timeout=5)
+        stranger.stop()
+        print("PASS")
+
+        self.stop_client_server(client, server)
+
+    @unittest.skipIf(dtls.tls is None, "DTLS requires the python-mbedtls package")
+    @async_test
+    async def test_dtls_certificates(self):
+        from mbedtls import hashlib, pk, x509
+        from mbedtls.tls import TrustStore
+        print("DTLS CERTIFICATES")
+        now = datetime.datetime.utcnow()
+        ca_key = pk.ECC()
+        ca_key.generate()
+        ca = x509.CRT.selfsign(x509.CSR.new(ca_key, "CN=Test CA", hashlib.sha256()), ca_key, not_before=now,
+                               not_after=now + datetime.timedelta(days=1), serial_number=1,
+                               basic_constraints=x509.BasicConstraints(True, 1))
+        key = pk.ECC()
+        key.generate()
+        certificate = ca.sign(x509.CSR.new(key, "CN=localhost", hashlib.sha256()), ca_key, now,
+                              now + datetime.timedelta(days=1), 2)
+
+        server_transport = DTLSTransport(certificate_chain=((certificate, ca), key))
+        await server_transport.listen("127.0.0.1", 5696)
+        server = CoAPServer("127.0.0.1", 5696, transport=server_transport)
+        server.add_resource('test/', TestResource())
+        asyncio.get_event_loop().create_task(server.create_server())
+        client = CoAPClient("127.0.0.1", 5696, transport=DTLSTransport(trust_store=TrustStore([ca]),
+                                                                       server_hostname="localhost"))
+        client.start_receiver()
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(str(ret.payload), "Test")
+
+        stranger = CoAPClient("127.0.0.1", 5696, transport=DTLSTransport(trust_store=TrustStore([ca]),
+                                                                         server_hostname="example.com"))
+        stranger.start_receiver()
+        with self.assertRaises(CoAPException):
+            await stranger.get("/test", timeout=5)
+        stranger.stop()
+        print("PASS")
+
+        self.stop_client_server(client, server)
@@ -0,0 +1,350 @@
+import random
+import asyncio
+import collections
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.layers.messagelayer import MessageLayer, MidSpace, TransactionCache
+from aiocoapthon.messages.message import Message
+from aiocoapthon.messages.options import Option, OptionList
+from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.utilities.admission import AdmissionControl
+from aiocoapthon.utilities.dedup import DeduplicationCache
+from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities import pool
+from aiocoapthon.utilities.errors import CoAPException
+from aiocoapthon.utilities.transaction import Transaction
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestMessagingClass(unittest.TestCase):  # pragma: no cover
+    def setUp(self):
+        self.server_address = ("127.0.0.1", 5683)
+        self.server_mid = random.randint(1000, 2000)
+
+    async def start_client_server(self, admission=None):
+        server = CoAPServer(self.server_address[0], self.server_address[1], starting_mid=self.server_mid,
+                            admission=admission)
+        server.add_resource('test/', TestResource())
+
+        loop = asyncio.get_event_loop()
+        loop.create_task(server.create_server())
+        client = CoAPClient("127.0.0.1", 5683)
+        return client, server
+
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    def test_mid_space(self):
+        print("MID_SPACE")
+        layer = MessageLayer(starting_mid=65535)
+        first = ("127.0.0.1", 5683)
+        second = ("127.0.0.2", 5683)
+        self.assertEqual(layer.fetch_mid(first), 65535)
+        self.assertEqual(layer.fetch_mid(first), 0)
+        self.assertEqual(layer.fetch_mid(second), 65535)
+        usage = layer.mid_usage()
+        self.assertEqual(usage["127.0.0.1:5683"], 2 / defines.MID_SPACE_SIZE)
+        self.assertEqual(usage["127.0.0.2:5683"], 1 / defines.MID_SPACE_SIZE)
+        # a hostname is a unicast peer
+        self.assertEqual(layer.fetch_mid(("localhost", 5683)), 65535)
+
+        # a sequence idle for EXCHANGE_LIFETIME starts over, one evicted earlier starts at a random MID
+        now = [0.0]
+        layer = MessageLayer(starting_mid=1, timer=lambda: now[0], max_peers=2)
+        self.assertEqual(layer.fetch_mid(first), 1)
+        now[0] += defines.EXCHANGE_LIFETIME
+        self.assertEqual(layer.fetch_mid(first), 1)
+        self.assertEqual(layer.fetch_mid(second), 1)
+        random.seed(1)
+        third = ("127.0.0.3", 5683)
+        layer.fetch_mid(third)
+        self.assertNotEqual([layer.fetch_mid(first) for _ in range(3)], [1, 2, 3])
+
+        space = MidSpace(10, lifetime=100)
+        self.assertEqual(space.fetch(0), 10)
+        space._current_mid = 10
+        self.assertEqual(space.fetch(1), 11)
+        space._current_mid = 10
+        self.assertEqual(space.fetch(100), 10)
+        self.assertEqual(space.usage(200), 0)
+
+        # the MIDs in use of a reserved sequence are skipped
+        reserved = MidSpace(20, lifetime=100)
+        self.assertEqual(reserved.fetch(0), 20)
+        space = MidSpace(19, lifetime=100)
+        self.assertEqual([space.fetch(1, reserved) for _ in range(2)], [19, 21])
+        print("PASS")
+
+    @async_test
+    async def test_duplicate_replay(self):
+        client, server = await self.start_client_server()
+        print("DUPLICATE_REPLAY")
+        path = "/test"
+        req = Request()
+        req.code = defines.Code.GET
+        req.uri_path = path
+        req.type = defines.Type.CON
+        req.mid = random.randint(1, 1000)
+        req.destination = self.server_address
+        req.token = utils.generate_random_hex(2)
+
+        expected = Response()
+        expected.type = defines.Type.ACK
+        expected.mid = req.mid
+        expected.code = defines.Code.CONTENT
+        expected.payload = "Test"
+        expected.token = req.token
+        expected.content_type = defines.ContentType.TEXT_PLAIN
+
+        expected.source = "127.0.0.1", 5683
+
+        transaction = await client.send_request(req)
+        ret = await client.receive_response(transaction, 10)
+        self.assertEqual(ret, expected)
+
+        transaction = await client.send_request(req)
+        ret = await client.receive_response(transaction, 10)
+
+        if ret == expected:
+            print("PASS")
+        else:
+            print("Received: {0}".format(ret))
+            print("Expected: {0}".format(expected))
+
+        self.assertEqual(ret, expected)
+        self.assertEqual(server.stats()["deduplication"]["hits"], 1)
+
+        self.stop_client_server(client, server)
+
+    def test_deduplication_cache(self):
+        print("DEDUPLICATION_CACHE")
+        now = [0]
+        cache = DeduplicationCache(lifetime=10, max_bytes=8, timer=lambda: now[0])
+        peer = ("127.0.0.1", 5683)
+        cache.store(peer, 1, b"abcd")
+        cache.store(peer, 2, b"efgh")
+        self.assertEqual(cache.get(peer, 1), b"abcd")
+        self.assertIsNone(cache.get(("127.0.0.2", 5683), 1))
+        cache.store(peer, 3, b"ij", b"\x01")
+        self.assertIsNone(cache.get(peer, 3, b"\x02"))
+        self.assertIsNone(cache.get(peer, 1))
+        self.assertEqual(cache.get(peer, 3, b"\x01"), b"ij")
+        now[0] = 10
+        self.assertIsNone(cache.get(peer, 2))
+        self.assertEqual(cache.stats(), {"entries": 0, "bytes": 0, "max_bytes": 8, "hits": 2, "misses": 4,
+                                         "expired": 2, "evicted": 1})
+        print("PASS")
+
+    @async_test
+    async def test_admission_shedding(self):
+        client, server = await self.start_client_server(AdmissionControl(rate=0, burst=1, retry_after=3))
+        print("ADMISSION_SHEDDING")
+        path = "/test"
+        req = Request()
+        req.code = defines.Code.GET
+        req.uri_path = path
+        req.type = defines.Type.CON
+        req.mid = random.randint(1, 1000)
+        req.destination = self.server_address
+        req.token = utils.generate_random_hex(2)
+
+        transaction = await client.send_request(req)
+        ret = await client.receive_response(transaction, 10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+
+        req = Request()
+        req.code = defines.Code.GET
+        req.uri_path = path
+        req.type = defines.Type.CON
+        req.mid = random.randint(1001, 2000)
+        req.destination = self.server_address
+        req.token = utils.generate_random_hex(2)
+
+        expected = Response()
+        expected.type = defines.Type.ACK
+        expected.mid = req.mid
+        expected.code = defines.Code.SERVICE_UNAVAILABLE
+        expected.token = req.token
+        expected.max_age = 3
+
+        expected.source = "127.0.0.1", 5683
+
+        transaction = await client.send_request(req)
+        ret = await client.receive_response(transaction, 10)
+
+        if ret == expected:
+            print("PASS")
+        else:
+            print("Received: {0}".format(ret))
+            print("Expected: {0}".format(expected))
+
+        self.assertEqual(ret, expected)
+
+        req = Request()
+        req.code = defines.Code.GET
+        req.uri_path = path
+        req.type = defines.Type.NON
+        req.mid = random.randint(2001, 3000)
+        req.destination = self.server_address
+        req.token = utils.generate_random_hex(2)
+        await client.send_request(req)
+        await asyncio.sleep(0.5)
+
+        stats = server.stats()["admission"]
+        self.assertEqual(stats["shed"], {AdmissionControl.RATE_LIMITED: 2})
+        self.assertEqual(stats["in_flight"], 0)
+
+        self.stop_client_server(client, server)
+
+    def test_admission_control(self):
+        print("ADMISSION_CONTROL")
+        now = [0]
+        admission = AdmissionControl(rate=1, burst=2, max_in_flight=3, timer=lambda: now[0])
+        peer = ("127.0.0.1", 5683)
+        self.assertIsNone(admission.admit(peer))
+        self.assertIsNone(admission.admit(peer))
+        self.assertEqual(admission.admit(peer), AdmissionControl.RATE_LIMITED)
+        self.assertIsNone(admission.admit(("127.0.0.2", 5683)))
+        self.assertEqual(admission.admit(("127.0.0.3", 5683)), AdmissionControl.OVERLOADED)
+        admission.release()
+        now[0] = 1
+        self.assertIsNone(admission.admit(peer))
+        self.assertEqual(admission.stats(), {"in_flight": 3, "peers": 2,
+                                             "shed": {AdmissionControl.RATE_LIMITED: 1,
+                                                      AdmissionControl.OVERLOADED: 1}})
+        print("PASS")
+
+    @async_test
+    async def test_header_preparse(self):
+        print("HEADER_PREPARSE")
+        req = Request()
+        req.code = defines.Code.GET
+        req.uri_path = "/test"
+        req.type = defines.Type.CON
+        req.mid = 4660
+        req.token = b"\x01\x02"
+        raw = (await Serializer.serialize(req, destination=self.server_address)).raw
+        header = Serializer.parse_header(raw)
+        self.assertEqual(header, (defines.Type.CON, defines.Code.GET, 4660, b"\x01\x02"))
+        self.assertFalse(Serializer.is_empty(raw, header))
+        self.assertIsNone(Serializer.parse_header(raw[:3]))
+        self.assertIsNone(Serializer.parse_header(bytes([0x04]) + raw[1:]))
+
+        ack = Message()
+        ack.type = defines.Type.ACK
+        ack.mid = 4660
+        ack.code = defines.Code.EMPTY
+        raw = (await Serializer.serialize(ack, destination=self.server_address)).raw
+        header = Serializer.parse_header(raw)
+        self.assertTrue(Serializer.is_empty(raw, header))
+        message = Serializer.deserialize_empty(header, source=self.server_address)
+        self.assertEqual(message, await Serializer.deserialize(raw, source=self.server_address))
+        print("PASS")
+
+    def test_compact_transaction(self):
+        print("COMPACT_TRANSACTION")
+        transaction = Transaction(request=Request(), response=Response())
+        for obj in (transaction, transaction.request, transaction.response, transaction.request.payload):
+            self.assertFalse(hasattr(obj, "__dict__"))
+        self.assertIsNone(transaction._response_wait)
+        self.assertIs(transaction.response_wait, transaction.response_wait)
+        self.assertIs(transaction.send_separate, transaction.send_separate)
+        print("PASS")
+
+    def test_option_list(self):
+        print("OPTION_LIST")
+        req = Request()
+        req.observe = 0
+        req.uri_query = "a=1&b=2"
+        req.uri_path = "/seg1/seg2"
+        self.assertEqual([o.number for o in req.options], [6, 11, 11, 15, 15])
+        self.assertEqual(req.uri_path, "seg1/seg2")
+        self.assertIs(req.uri_path, req.uri_path)
+        option = Option(defines.OptionRegistry.URI_PATH)
+        option.value = "seg3"
+        req.add_option(option)
+        self.assertEqual(req.uri_path, "seg1/seg2/seg3")
+        req.del_option(option)
+        self.assertEqual(req.uri_path_list, ["seg1", "seg2"])
+        del req.uri_path
+        self.assertIsNone(req.uri_path)
+        self.assertEqual(req.uri_query, "a=1&b=2")
+
+        options = OptionList([option])
+        self.assertIn(option.number, options)
+        options.clear()
+        self.assertEqual(len(options), 0)
+        self.assertEqual(options.get(option.number), [])
+        print("PASS")
+
+    def test_pooling(self):
+        print("POOLING")
+        now = [0]
+        references = collections.Counter()
+        recycled = []
+        by_mid = TransactionCache(10, 5, references, recycled.append, timer=lambda: now[0])
+        by_token = TransactionCache(10, 5, references, recycled.append, timer=lambda: now[0])
+        overwritten = Transaction(request=Request())
+        expired = Transaction(request=Request())
+        by_mid["a"] = overwritten
+        by_mid["a"] = expired
+        by_token["b"] = expired
+        self.assertEqual(recycled, [])
+        now[0] = 3
+        by_mid.expire()
+        self.assertEqual(recycled, [])
+        now[0] = 6
+        by_mid.expire()
+        by_token.expire()
+        self.assertEqual(recycled, [expired])
+        self.assertEqual(len(references), 0)
+
+        pool.enable(maxsize=2, debug=True)
+        try:
+            req = Request()
+            req.uri_path = "test"
+            transaction = Transaction(request=req, response=Response())
+            pool.release_transaction(transaction)
+            with self.assertRaises(CoAPException):
+                print(req.uri_path)
+            with self.assertRaises(CoAPException):
+                pool.release(req)
+            self.assertIs(Request(), req)
+            self.assertIsNone(req.uri_path)
+            self.assertEqual(pool.stats()["Request"]["reused"], 1)
+        finally:
+            pool.disable()
+        self.assertIsNot(Request(), req)
+        print("PASS")
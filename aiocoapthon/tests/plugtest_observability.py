@@ -0,0 +1,242 @@
+import random
+import asyncio
+import json
+import logging
+import time
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.resources.loglevels import LogLevelsResource
+from aiocoapthon.resources.metrics import MetricsResource
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.utilities import events
+from aiocoapthon.utilities.metrics import MetricsRegistry
+from aiocoapthon.utilities.tracing import Tracer, RingBufferExporter, Span
+from aiocoapthon.utilities.watchdog import LoopWatchdog
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestObservabilityClass(unittest.TestCase):  # pragma: no cover
+    def setUp(self):
+        self.server_address = ("127.0.0.1", 5683)
+        self.server_mid = random.randint(1000, 2000)
+
+    async def start_client_server(self, tracer=None, watchdog=None):
+        server = CoAPServer(self.server_address[0], self.server_address[1], starting_mid=self.server_mid,
+                            tracer=tracer, watchdog=watchdog)
+        server.add_resource('test/', TestResource())
+        server.add_resource('storage/', StorageResource())
+
+        loop = asyncio.get_event_loop()
+        loop.create_task(server.create_server())
+        client = CoAPClient("127.0.0.1", 5683)
+        return client, server
+
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    @async_test
+    async def test_metrics(self):
+        client, server = await self.start_client_server()
+        print("METRICS")
+        server.add_resource('metrics/', MetricsResource(server.metrics))
+        await server.start_metrics(port=0)
+
+        ret = await client.get("/test", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(server.metrics.get("coap_messages_received_total").value("CON", "0.01"), 1)
+        self.assertEqual(server.metrics.get("coap_messages_sent_total").value("ACK", "2.05"), 1)
+        self.assertEqual(server.metrics.get("coap_handler_seconds").value("/test")[0], 1)
+
+        ret = await client.get("/metrics", timeout=10)
+        self.assertIn('coap_handler_seconds_count{resource="/test"} 1', ret.payload.decode())
+
+        # the series of a resource end with it
+        ret = await client.put("/storage/new", "x", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CREATED)
+        self.assertEqual(server.metrics.get("coap_handler_seconds").value("/storage/new")[0], 1)
+        server.remove_resource("/storage/new")
+        self.assertIsNone(server.metrics.get("coap_handler_seconds").value("/storage/new"))
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", server._exporter.port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        body = (await reader.read()).decode()
+        writer.close()
+        self.assertTrue(body.startswith("HTTP/1.1 200 OK"))
+        self.assertIn('coap_messages_received_total{type="CON",code="0.01"} ', body)
+        self.assertIn("# TYPE coap_live_transactions gauge", body)
+        print("PASS")
+
+        self.stop_client_server(client, server)
+
+    def test_metrics_registry(self):
+        print("METRICS_REGISTRY")
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ("method",))
+        counter.inc("GET")
+        counter.inc("GET", amount=2)
+        self.assertIs(registry.counter("requests_total", "Requests", ("method",)), counter)
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        registry.gauge("live", "Live", function=lambda: 7)
+        self.assertEqual(registry.render(), "# HELP requests_total Requests\n# TYPE requests_total counter\n"
+                                            "requests_total{method=\"GET\"} 3\n"
+                                            "# HELP latency_seconds Latency\n# TYPE latency_seconds histogram\n"
+                                            "latency_seconds_bucket{le=\"0.1\"} 1\n"
+                                            "latency_seconds_bucket{le=\"1\"} 2\n"
+                                            "latency_seconds_bucket{le=\"+Inf\"} 3\n"
+                                            "latency_seconds_sum 5.55\nlatency_seconds_count 3\n"
+                                            "# HELP live Live\n# TYPE live gauge\nlive 7\n")
+        print("PASS")
+
+    @async_test
+    async def test_tracing(self):
+        exporter = RingBufferExporter()
+        client, server = await self.start_client_server(tracer=Tracer(sample_rate=1.0, listeners=[exporter]))
+        print("TRACING")
+
+        ret = await client.get("/test", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        records = RingBufferExporter.decode(exporter.dump())
+        names = [name for _, _, name, _, _ in records]
+        self.assertEqual(names, ["deserialize", "message_layer", "block_layer", "observe_layer", "handler",
+                                 "request_layer", "observe_layer", "block_layer", "message_layer", "serialize",
+                                 "send"])
+        self.assertEqual(len({trace_id for trace_id, _, _, _, _ in records}), 1)
+
+        server._tracer.sample_rate = 0.0
+        ret = await client.get("/test", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(len(exporter), len(records))
+        print("PASS")
+
+        self.stop_client_server(client, server)
+
+    def test_trace_ring_buffer(self):
+        print("TRACE_RING_BUFFER")
+        exporter = RingBufferExporter(capacity=3)
+        for i in range(5):
+            span = Span(1, i, "step" if i % 2 else "send", 1000 * i)
+            span.end = 1000 * i + i
+            exporter.span_end(span)
+        self.assertEqual(len(exporter), 3)
+        self.assertEqual(RingBufferExporter.decode(exporter.dump()),
+                         [(1, 2, "send", 2000, 2), (1, 3, "step", 3000, 3), (1, 4, "send", 4000, 4)])
+        print("PASS")
+
+    @async_test
+    async def test_log_levels(self):
+        client, server = await self.start_client_server()
+        print("LOG_LEVELS")
+        server.add_resource('log/', LogLevelsResource())
+        messagelayer = logging.getLogger("aiocoapthon.layers.messagelayer")
+
+        ret = await client.get("/log", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertIn("layers.messagelayer=WARNING", ret.payload.decode().split("\n"))
+
+        try:
+            ret = await client.put("/log", "layers.messagelayer=debug", timeout=10)
+            self.assertEqual(ret.code, defines.Code.CHANGED)
+            self.assertEqual(messagelayer.level, logging.DEBUG)
+
+            ret = await client.put("/log", "layers=INFO\nprotocol=LOUD", timeout=10)
+            self.assertEqual(ret.code, defines.Code.BAD_REQUEST)
+            self.assertEqual(logging.getLogger("aiocoapthon.layers").level, logging.NOTSET)
+        finally:
+            messagelayer.setLevel(logging.NOTSET)
+        print("PASS")
+
+        self.stop_client_server(client, server)
+
+    def test_log_events(self):
+        print("LOG_EVENTS")
+
+        class Counted(object):
+            formatted = 0
+
+            def __str__(self):
+                Counted.formatted += 1
+                return "counted"
+
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        underlying = logging.getLogger("aiocoapthon.tests.events")
+        underlying.addHandler(handler)
+        underlying.propagate = False
+        logger = events.get_logger("aiocoapthon.tests.events")
+        try:
+            events.set_level("tests", "INFO")
+            logger.debug("skipped", value=Counted())
+            self.assertEqual(Counted.formatted, 0)
+            self.assertEqual(records, [])
+            self.assertEqual(events.levels()["tests.events"], "INFO")
+
+            logger.info("sent", value=Counted(), mid=7, level="high")
+            self.assertEqual(Counted.formatted, 0)
+            self.assertEqual(records[0].event, "sent")
+            self.assertEqual(records[0].getMessage(), "sent value=counted mid=7 level=high")
+            data = json.loads(events.JSONFormatter().format(records[0]))
+            self.assertEqual((data["event"], data["level"]), ("sent", "INFO"))
+            self.assertEqual(data["fields"], {"value": "counted", "mid": 7, "level": "high"})
+            self.assertRaises(ValueError, events.set_level, "tests", "LOUD")
+        finally:
+            logging.getLogger("aiocoapthon.tests").setLevel(logging.NOTSET)
+            underlying.removeHandler(handler)
+            events._subsystems.pop("tests.events", None)
+        print("PASS")
+
+    @staticmethod
+    def block_loop(seconds):
+        time.sleep(seconds)
+
+    @async_test
+    async def test_watchdog(self):
+        client, server = await self.start_client_server(watchdog=LoopWatchdog(threshold=0.2, interval=0.05))
+        print("WATCHDOG")
+        await asyncio.sleep(0.1)
+
+        ret = await client.get("/test", timeout=10)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(server.stats()["watchdog"]["stalls"], 0)
+
+        self.block_loop(0.5)
+        await asyncio.sleep(0.1)
+        stats = server.stats()["watchdog"]
+        self.assertEqual(stats["stalls"], 1)
+        self.assertGreaterEqual(stats["max_lag"], 0.2)
+        self.assertIn("block_loop", "".join(stats["last_stall"]["stack"]))
+        print("PASS")
+
+        self.stop_client_server(client, server)
@@ -10,6 +10,7 @@ from aiocoapthon.utilities import utils
 from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.request import Request
 from aiocoapthon.messages.response import Response
+from aiocoapthon.tests.plugtest_core_resources import TestResource
 from aiocoapthon.tests.plugtest_observe_resources import *
 
 logger = logging.getLogger(__name__)
@@ -94,7 +95,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid+1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -141,7 +142,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CONTENT
         expected.payload = "7"
         expected.token = token
@@ -154,7 +155,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.RST
-        req.mid = self.server_mid + 4
+        req.mid = self.server_mid + 1
         req.destination = self.server_address
         req.token = token
 
@@ -207,7 +208,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.NON
-        expected.mid = self.server_mid + 2
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -263,7 +264,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -276,7 +277,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.RST
-        req.mid = self.server_mid + 1
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -328,7 +329,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -346,7 +347,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 1
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -378,7 +379,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.NOT_FOUND
         expected.token = token
         expected.source = self.server_address
@@ -389,7 +390,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 4
+        req.mid = self.server_mid + 1
         req.destination = self.server_address
         req.token = token
 
@@ -444,7 +445,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -464,7 +465,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 1
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -500,7 +501,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.NOT_ACCEPTABLE
         expected.token = token
         expected.source = self.server_address
@@ -555,7 +556,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -573,7 +574,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 1
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -606,7 +607,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CONTENT
         expected.token = token
         expected.source = self.server_address
@@ -662,7 +663,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -680,7 +681,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 1
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -713,7 +714,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 4
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CONTENT
         expected.payload = "7"
         expected.token = token
@@ -769,7 +770,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "6"
         expected.token = token
@@ -910,7 +911,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 2
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.token = token
         expected.observe = 3
@@ -935,7 +936,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         req = Message()
         req.code = defines.Code.EMPTY
         req.type = defines.Type.ACK
-        req.mid = self.server_mid + 2
+        req.mid = self.server_mid
         req.destination = self.server_address
         req.token = token
 
@@ -1026,7 +1027,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1084,7 +1085,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.NON
-        expected.mid = self.server_mid + 2
+        expected.mid = self.server_mid + 1
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1144,7 +1145,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1164,7 +1165,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1184,7 +1185,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1204,7 +1205,7 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
 
         expected = Response()
         expected.type = defines.Type.CON
-        expected.mid = self.server_mid + 1
+        expected.mid = self.server_mid
         expected.code = defines.Code.CONTENT
         expected.payload = "Stable"
         expected.token = token
@@ -1232,3 +1233,30 @@ class PlugtestObserveClass(unittest.TestCase):  # pragma: no cover
         self.assertEqual(ret, expected)
 
         self.stop_client_server(client, server)
+
+    @async_test
+    async def test_consecutive_con_notifications(self):
+        client, server = await self.start_client_server()
+        print("CONSECUTIVE_CON_NOTIFICATIONS")
+        resource = TestResource()
+        server.add_resource('counter/', resource)
+        client.start_receiver()
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        observer = asyncio.get_event_loop().create_task(client.observe("/counter", queue=queue, stop=stop,
+                                                                       timeout=5))
+        ret = await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(str(ret.payload), "Test")
+
+        for i in range(3):
+            resource.payload = str(i)
+            resource.observe_count += 1
+            await resource.notify()
+            ret = await asyncio.wait_for(queue.get(), 5)
+            self.assertEqual(ret.type, defines.Type.CON)
+            self.assertEqual(str(ret.payload), str(i))
+        print("PASS")
+
+        stop.set()
+        observer.cancel()
+        self.stop_client_server(client, server)
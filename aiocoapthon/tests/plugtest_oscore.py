@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.layers.oscorelayer import OSCORELayer
+from aiocoapthon.messages.response import Response
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport import simulated
+from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities import cbor, oscore
+from aiocoapthon.utilities.errors import InternalError
+from aiocoapthon.utilities.transaction import Transaction
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+# RFC 8613, Appendix C.1.1
+OSCORE_SECRET = bytes.fromhex("0102030405060708090a0b0c0d0e0f10")
+OSCORE_SALT = bytes.fromhex("9e7ca92223786340")
+
+
+class PlugtestOSCOREClass(unittest.TestCase):  # pragma: no cover
+    def main(self):
+        unittest.main()
+
+    @unittest.skipIf(oscore.AESCCM is None, "OSCORE requires the cryptography package")
+    @async_test
+    async def test_oscore_vectors(self):
+        print("OSCORE_VECTORS")
+        value = [b"", None, 10, "Key", 16, -1, True, {1: [b"\x01"]}, "x" * 30]
+        self.assertEqual(cbor.loads(cbor.dumps(value)), value)
+        self.assertEqual(cbor.dumps([b"", None, 10, "IV", 13]).hex(), "85" "40" "f6" "0a" "624956" "0d")
+
+        client_context = oscore.SecurityContext(OSCORE_SECRET, b"", b"\x01", OSCORE_SALT)
+        server_context = oscore.SecurityContext(OSCORE_SECRET, b"\x01", b"", OSCORE_SALT)
+        self.assertEqual(client_context.sender_key.hex(), "f0910ed7295e6ad4b54fc793154302ff")
+        self.assertEqual(client_context.recipient_key.hex(), "ffb14e093c94c9cac9471648b4f98710")
+        self.assertEqual(client_context.common_iv.hex(), "4622d4dd6d944168eefb54987c")
+        self.assertEqual(server_context.sender_key, client_context.recipient_key)
+
+        # C.4: GET coap://localhost/tv1 with sequence number 20
+        client = OSCORELayer()
+        client.add_context(client_context, ("127.0.0.1", 5683))
+        client_context.sequence_number = 20
+        request = Serializer.deserialize(bytes.fromhex("44015d1f00003974396c6f63616c686f737483747631"),
+                                         destination=("127.0.0.1", 5683))
+        request = await client.send_request(await request)
+        datagram = bytes((await Serializer.serialize(request)).raw)
+        self.assertEqual(datagram.hex(), "44025d1f00003974396c6f63616c686f7374620914ff612f1092f1776f1c1668b3825e")
+
+        server = OSCORELayer()
+        server.add_context(server_context)
+        received = await Serializer.deserialize(datagram, source=("127.0.0.1", 40000))
+        transaction = await server.receive_request(Transaction(request=received))
+        self.assertEqual(transaction.request.code, defines.Code.GET)
+        self.assertEqual(transaction.request.uri_path, "tv1")
+
+        # C.7: 2.05 Content "Hello World!" without Partial IV
+        response = Response()
+        response.type = defines.Type.ACK
+        response.mid = 0x5d1f
+        response.token = transaction.request.token
+        response.destination = ("127.0.0.1", 40000)
+        response.code = defines.Code.CONTENT
+        response.payload = "Hello World!"
+        transaction.response = response
+        transaction = await server.send_response(transaction)
+        datagram = bytes((await Serializer.serialize(transaction.response)).raw)
+        self.assertEqual(datagram.hex(), "64445d1f0000397490ffdbaad1e9a7e7b2a813d3c31524378303cdafae119106")
+
+        received = await Serializer.deserialize(datagram, source=("127.0.0.1", 5683))
+        transaction = await client.receive_response(Transaction(request=request, response=received))
+        self.assertEqual(transaction.response.code, defines.Code.CONTENT)
+        self.assertEqual(str(transaction.response.payload), "Hello World!")
+
+        # the same request again is a replay
+        received = await Serializer.deserialize(bytes.fromhex("44025d2000003974396c6f63616c686f7374620914ff612f"
+                                                              "1092f1776f1c1668b3825e"), source=("127.0.0.1", 40000))
+        with self.assertRaises(InternalError) as e:
+            await server.receive_request(Transaction(request=received))
+        self.assertEqual(e.exception.response_code, defines.Code.UNAUTHORIZED)
+
+        window = oscore.ReplayWindow(4)
+        for sequence_number in (5, 3, 8):
+            self.assertTrue(window.check(sequence_number))
+            window.accept(sequence_number)
+        self.assertEqual([window.check(n) for n in range(3, 10)], [False, False, False, True, True, False, True])
+        print("PASS")
+
+    @staticmethod
+    async def oscore_exchange(network):
+        server_address, client_address = ("10.0.0.1", 5683), ("10.0.0.2", 40000)
+        server = CoAPServer(server_address[0], server_address[1], transport=network.endpoint(server_address))
+        resource = TestResource()
+        server.add_resource('test/', resource)
+        server.add_security_context(oscore.SecurityContext(OSCORE_SECRET, b"\x01", b"", OSCORE_SALT))
+        asyncio.get_event_loop().create_task(server.create_server())
+        client = CoAPClient(server_address[0], server_address[1], transport=network.endpoint(client_address))
+        client.add_security_context(oscore.SecurityContext(OSCORE_SECRET, b"", b"\x01", OSCORE_SALT),
+                                    server_address)
+        client.start_receiver()
+        ret = {"get": await client.get("/test", timeout=10)}
+
+        # notifications carry their own Partial IV
+        queue, stop = asyncio.Queue(), asyncio.Event()
+        task = asyncio.get_event_loop().create_task(client.observe("/test", queue=queue, stop=stop, timeout=10))
+        ret["observe"] = [await queue.get()]
+        resource.payload = "changed"
+        resource.observe_count += 1
+        await resource.notify()
+        ret["observe"].append(await queue.get())
+        stop.set()
+        task.cancel()
+
+        # block-wise transfers of the inner message
+        ret["put"] = await client.put("/test", "x" * 3000, timeout=10)
+        ret["large"] = await client.get("/test", timeout=10)
+
+        # a client whose context the server does not know
+        stranger = CoAPClient(server_address[0], server_address[1],
+                              transport=network.endpoint(("10.0.0.3", 40000)))
+        stranger.add_security_context(oscore.SecurityContext(OSCORE_SECRET, b"\x07", b"", OSCORE_SALT),
+                                      server_address)
+        stranger.start_receiver()
+        ret["stranger"] = await stranger.get("/test", timeout=10)
+        stranger.stop()
+        client.stop()
+        server.stop()
+        return ret
+
+    @unittest.skipIf(oscore.AESCCM is None, "OSCORE requires the cryptography package")
+    def test_oscore(self):
+        print("OSCORE")
+        network = simulated.SimulatedNetwork(seed=3, latency=0.01)
+        ret = simulated.run(self.oscore_exchange(network))
+        self.assertEqual(ret["get"].code, defines.Code.CONTENT)
+        self.assertEqual(str(ret["get"].payload), "Test")
+        self.assertEqual(ret["put"].code, defines.Code.CHANGED)
+        self.assertEqual(str(ret["large"].payload), "x" * 3000)
+        self.assertEqual([str(response.payload) for response in ret["observe"]], ["Test", "changed"])
+        self.assertEqual([response.code for response in ret["observe"]], [defines.Code.CONTENT] * 2)
+        self.assertEqual(ret["stranger"].code, defines.Code.UNAUTHORIZED)
+        print("PASS")
@@ -0,0 +1,163 @@
+import random
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport import simulated
+from aiocoapthon.utilities.persistence import SQLiteStore, RelationRecord, ResourceRecord
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestPersistenceClass(unittest.TestCase):  # pragma: no cover
+    def setUp(self):
+        self.server_address = ("127.0.0.1", 5683)
+        self.server_mid = random.randint(1000, 2000)
+
+    def main(self):
+        unittest.main()
+
+    @staticmethod
+    async def persistence_exchange(network, path):
+        server_address = ("10.0.0.1", 5683)
+
+        def start():
+            server = CoAPServer(server_address[0], server_address[1], transport=network.endpoint(server_address),
+                                store=SQLiteStore(path))
+            resource = TestResource()
+            server.add_resource('test/', resource)
+            server.add_resource('storage/', StorageResource())
+            asyncio.get_event_loop().create_task(server.create_server())
+            return server, resource
+
+        server, resource = start()
+        client = CoAPClient(server_address[0], server_address[1], transport=network.endpoint(("10.0.0.2", 40000)))
+        client.start_receiver()
+        queue, stop = asyncio.Queue(), asyncio.Event()
+        task = asyncio.get_event_loop().create_task(client.observe("/test", queue=queue, stop=stop, timeout=10))
+        ret = {"observe": [await queue.get()]}
+        ret["child"] = await client.put("/storage/child", "child", timeout=10)
+        resource.payload = "before"
+        resource.observe_count += 1
+        await resource.notify()
+        ret["observe"].append(await queue.get())
+        server.stop()
+        await asyncio.sleep(1)
+
+        # the restarted server notifies the observer, which does not register again
+        server, resource = start()
+        await asyncio.sleep(1)
+        ret["pending"] = server._observeLayer.pending
+        ret["payload"] = str(resource.payload)
+        resource.payload = "after"
+        resource.observe_count += 1
+        await resource.notify()
+        ret["observe"].append(await queue.get())
+        ret["resources"] = server.get_resources()
+        ret["restored_child"] = server._requestLayer.get_resource("/storage/child")
+        ret["relations"] = server._observeLayer.relations_per_resource()
+        stop.set()
+        task.cancel()
+        client.stop()
+        server.stop()
+        return ret
+
+    def test_persistence(self):
+        print("PERSISTENCE")
+        network = simulated.SimulatedNetwork(seed=5, latency=0.01)
+        with tempfile.TemporaryDirectory() as directory:
+            ret = simulated.run(self.persistence_exchange(network, os.path.join(directory, "server.db")))
+        self.assertEqual(ret["child"].code, defines.Code.CREATED)
+        self.assertEqual(ret["pending"], 1)
+        self.assertEqual(ret["payload"], "before")
+        self.assertEqual([str(response.payload) for response in ret["observe"]], ["Test", "before", "after"])
+        observe = [response.observe for response in ret["observe"]]
+        self.assertEqual(observe, sorted(observe))
+        self.assertIn("/storage/child", ret["resources"])
+        self.assertIsInstance(ret["restored_child"], ChildResource)
+        self.assertEqual(ret["relations"], {"/test": 1})
+
+        store = SQLiteStore(":memory:")
+        store.save([RelationRecord("10.0.0.2", 40000, b"\x01", "/test", "a=1", 1, None, 0, 0, 7, 1.5)],
+                   [ResourceRecord("/test", b"Test", 0, None, 7)])
+        relations, resources = store.load()
+        self.assertEqual([r.astuple() for r in relations],
+                         [("10.0.0.2", 40000, b"\x01", "/test", "a=1", 1, None, 0, 0, 7, 1.5)])
+        self.assertEqual([r.astuple() for r in resources], [("/test", b"Test", 0, None, 7)])
+        store.save([], [])
+        self.assertEqual(store.load(), ([], []))
+        store.close()
+        print("PASS")
+
+    @async_test
+    async def test_periodic_snapshot(self):
+        print("PERIODIC_SNAPSHOT")
+        threads = []
+
+        class RecordingStore(SQLiteStore):
+            def save(self, relations, resources):
+                threads.append(threading.get_ident())
+                super().save(relations, resources)
+
+        store = RecordingStore(":memory:")
+        server = CoAPServer(self.server_address[0], self.server_address[1], store=store, snapshot_interval=0.1)
+        server.add_resource('test/', TestResource())
+        asyncio.get_event_loop().create_task(server.create_server())
+        await asyncio.sleep(0.35)
+        # the periodic snapshots are saved out of the event loop
+        self.assertGreaterEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+        relations, resources = store.load()
+        self.assertEqual([record.path for record in resources], ["/test"])
+        # the last one, when the server stops, is saved before the store is closed
+        server.stop()
+        self.assertEqual(threads[-1], threading.get_ident())
+        [task.cancel() for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        # stopping while a periodic snapshot is saved waits for it, then saves the final one
+        saves = []
+        started = threading.Event()
+
+        class SlowStore(SQLiteStore):
+            def save(self, relations, resources):
+                started.set()
+                saves.append("start")
+                time.sleep(0.2)
+                super().save(relations, resources)
+                saves.append("end")
+
+        store = SlowStore(":memory:")
+        server = CoAPServer(self.server_address[0], self.server_address[1], store=store, snapshot_interval=0.05)
+        server.add_resource('test/', TestResource())
+        asyncio.get_event_loop().create_task(server.create_server())
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        server.stop()
+        self.assertEqual(saves, ["start", "end", "start", "end"])
+        print("PASS")
+
+        [task.cancel() for task in asyncio.all_tasks() if task is not asyncio.current_task()]
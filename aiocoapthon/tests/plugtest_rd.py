@@ -0,0 +1,133 @@
+import random
+import asyncio
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.resources.rd import ResourceDirectory
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestRDClass(unittest.TestCase):  # pragma: no cover
+    def setUp(self):
+        self.server_address = ("127.0.0.1", 5683)
+        self.server_mid = random.randint(1000, 2000)
+
+    async def start_client_server(self):
+        server = CoAPServer(self.server_address[0], self.server_address[1], starting_mid=self.server_mid)
+        loop = asyncio.get_event_loop()
+        loop.create_task(server.create_server())
+        client = CoAPClient("127.0.0.1", 5683)
+        return client, server
+
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    @async_test
+    async def test_resource_directory(self):
+        client, server = await self.start_client_server()
+        print("RESOURCE_DIRECTORY")
+        directory = ResourceDirectory(server)
+        client.start_receiver()
+        link_format = defines.ContentType.application_link_format
+
+        ret = await client.discover(timeout=5, uri_query="rt=core.rd*")
+        self.assertEqual([link.split(">")[0] for link in str(ret.payload).split("<")[1:]],
+                         ["/rd", "/rd-lookup/ep", "/rd-lookup/res"])
+
+        locations = []
+        for i in range(5):
+            links = '</sensors/temp>;rt="temperature-c";if="sensor",</sensors/light>;rt="light-lux";if="sensor",' \
+                    '</node{0}/config>;ct=40'.format(i)
+            query = "ep=node{0}&d={1}&et=sensor&lt=3600".format(i, "floor1" if i < 3 else "floor2")
+            ret = await client.post("/rd", links, timeout=5, content_type=link_format, uri_query=query)
+            self.assertEqual(ret.code, defines.Code.CREATED)
+            locations.append(ret.location_path)
+        self.assertEqual(len(directory), 5)
+        ret = await client.post("/rd", "", timeout=5, uri_query="lt=60")
+        self.assertEqual(ret.code, defines.Code.BAD_REQUEST)
+        ret = await client.post("/rd", "</a>", timeout=5, uri_query="ep=x")
+        self.assertEqual(ret.code, defines.Code.UNSUPPORTED_CONTENT_FORMAT)
+
+        ret = await client.get("/rd-lookup/ep", timeout=5, uri_query="d=floor2")
+        self.assertEqual([target for target, _ in ret.value], ["/" + locations[3], "/" + locations[4]])
+        self.assertEqual(ret.value[0][1]["ep"], "node3")
+        self.assertEqual(ret.value[0][1]["lt"], 3600)
+        base = ret.value[0][1]["base"]
+        # a filter on a link attribute selects the endpoints with a matching link
+        ret = await client.get("/rd-lookup/ep", timeout=5, uri_query="href=/node1*")
+        self.assertEqual([a["ep"] for _, a in ret.value], ["node1"])
+        ret = await client.get("/rd-lookup/res", timeout=5, uri_query="rt=temperature*&d=floor1")
+        self.assertEqual(ret.value, [(base + "/sensors/temp", {"rt": "temperature-c", "if": "sensor", "anchor": base})]
+                         * 3)
+        ret = await client.get("/rd-lookup/res", timeout=5, uri_query="if=sensor&et=sensor&page=1&count=4")
+        self.assertEqual(len(ret.value), 4)
+        self.assertEqual(ret.value[0][0], base + "/sensors/temp")
+        ret = await client.get("/rd-lookup/res", timeout=5, uri_query="ct=40&count=2")
+        self.assertEqual([target for target, _ in ret.value], [base + "/node0/config", base + "/node1/config"])
+
+        # the same endpoint registering again replaces its links and keeps its location
+        ret = await client.post("/rd", "</sensors/door>;rt=door", timeout=5, content_type=link_format,
+                                uri_query="ep=node0&d=floor1&base=coap://192.0.2.1")
+        self.assertEqual(ret.location_path, locations[0])
+        ret = await client.get("/rd-lookup/res", timeout=5, uri_query="ep=node0")
+        self.assertEqual(ret.value, [("coap://192.0.2.1/sensors/door", {"rt": "door", "anchor": "coap://192.0.2.1"})])
+        ret = await client.get("/" + locations[0], timeout=5)
+        self.assertEqual(ret.value, [("/sensors/door", {"rt": "door"})])
+
+        ret = await client.post("/" + locations[1], "", timeout=5, uri_query="lt=1")
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        ret = await client.post("/" + locations[1], "", timeout=5, uri_query="ep=other")
+        self.assertEqual(ret.code, defines.Code.BAD_REQUEST)
+        ret = await client.delete("/" + locations[2], timeout=5)
+        self.assertEqual(ret.code, defines.Code.DELETED)
+        ret = await client.get("/rd-lookup/ep", timeout=5, uri_query="d=floor1")
+        self.assertEqual([a["ep"] for _, a in ret.value], ["node0", "node1"])
+
+        # node1 expires
+        await asyncio.sleep(1.5)
+        ret = await client.get("/rd-lookup/ep", timeout=5, uri_query="ep=node*")
+        self.assertEqual([a["ep"] for _, a in ret.value], ["node0", "node3", "node4"])
+        ret = await client.post("/" + locations[1], "", timeout=5)
+        self.assertEqual(ret.code, defines.Code.NOT_FOUND)
+        ret = await client.get("/rd-lookup/res", timeout=5, uri_query="href=/node1/config")
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertIsNone(ret.value)
+        # the latency series of the removed registrations are dropped
+        latency = server.metrics.get("coap_handler_seconds")
+        self.assertIsNotNone(latency.value("/" + locations[0]))
+        self.assertIsNone(latency.value("/" + locations[1]))
+        self.assertIsNone(latency.value("/" + locations[2]))
+        print("PASS")
+
+        directory.close()
+        self.stop_client_server(client, server)
@@ -0,0 +1,159 @@
+import random
+import asyncio
+import logging
+import time
+import unittest
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.client.group import Group
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport import simulated
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestSimulatedClass(unittest.TestCase):  # pragma: no cover
+    def main(self):
+        unittest.main()
+
+    @staticmethod
+    async def simulated_exchanges(network, requests):
+        loop = asyncio.get_event_loop()
+        server = CoAPServer("10.0.0.1", 5683, transport=network.endpoint(("10.0.0.1", 5683)))
+        server.add_resource('test/', TestResource())
+        loop.create_task(server.create_server())
+        client = CoAPClient("10.0.0.1", 5683, transport=network.endpoint(("10.0.0.2", 40000)))
+        client.start_receiver()
+        codes = []
+        for _ in range(requests):
+            ret = await client.get("/test", timeout=defines.EXCHANGE_LIFETIME)
+            codes.append(ret.code if ret is not None else None)
+        client.stop()
+        server.stop()
+        return codes, loop.time(), network.stats()
+
+    def test_simulated_network(self):
+        print("SIMULATED_NETWORK")
+        results = []
+        start = time.perf_counter()
+        for _ in range(2):
+            random.seed(1)
+            network = simulated.SimulatedNetwork(seed=3, loss=0.2, duplication=0.1, reordering=0.1, latency=0.05,
+                                                 jitter=0.02, bandwidth=10000)
+            results.append(simulated.run(self.simulated_exchanges(network, 30)))
+        codes, elapsed, stats = results[0]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(codes, [defines.Code.CONTENT] * 30)
+        self.assertGreater(stats["lost"], 0)
+        self.assertGreater(stats["duplicated"], 0)
+        self.assertGreater(elapsed, 2 * defines.ACK_TIMEOUT)
+        self.assertLess(time.perf_counter() - start, elapsed)
+
+        network = simulated.SimulatedNetwork(seed=3, loss=1.0)
+        codes, elapsed, stats = simulated.run(self.simulated_exchanges(network, 1))
+        self.assertEqual(codes, [None])
+        self.assertEqual(stats["sent"], defines.MAX_RETRANSMIT + 1)
+        print("PASS")
+
+    @staticmethod
+    async def multicast_exchange(network, members):
+        loop = asyncio.get_event_loop()
+        servers = []
+        for i in range(members):
+            address = ("10.0.0.{0}".format(i + 1), 5683)
+            network.join(defines.ALL_COAP_NODES, address)
+            server = CoAPServer(address[0], address[1], transport=network.endpoint(address))
+            server.add_resource('test/', TestResource())
+            loop.create_task(server.create_server())
+            servers.append(server)
+        client = CoAPClient(defines.ALL_COAP_NODES, 5683, transport=network.endpoint(("10.0.0.100", 40000)))
+        arrivals = []
+        async for response in client.multicast("/test"):
+            arrivals.append((str(response.source[0]), response.code, loop.time()))
+        client.stop()
+        for server in servers:
+            server.stop()
+        return arrivals, network.stats()
+
+    def test_multicast(self):
+        print("MULTICAST")
+        random.seed(2)
+        # every datagram is delivered twice, the client must keep one response per member
+        network = simulated.SimulatedNetwork(seed=5, duplication=1.0, latency=0.01)
+        arrivals, stats = simulated.run(self.multicast_exchange(network, 5))
+        self.assertEqual(sorted(source for source, _, _ in arrivals), ["10.0.0.{0}".format(i + 1) for i in range(5)])
+        self.assertEqual({code for _, code, _ in arrivals}, {defines.Code.CONTENT})
+        # the members answer at random points of their leisure, not all at once
+        times = [t for _, _, t in arrivals]
+        self.assertLess(max(times), defines.DEFAULT_LEISURE + 0.1)
+        self.assertGreater(max(times) - min(times), 0.5)
+        self.assertEqual(stats["delivered"], 2 * (5 + 5))
+        print("PASS")
+
+    @staticmethod
+    async def group_exchange(network, members):
+        loop = asyncio.get_event_loop()
+        servers, resources = [], []
+        for i in range(members):
+            address = ("10.0.0.{0}".format(i + 1), 5683)
+            network.join(defines.ALL_COAP_NODES, address)
+            server = CoAPServer(address[0], address[1], transport=network.endpoint(address))
+            resource = TestResource()
+            server.add_resource('test/', resource)
+            loop.create_task(server.create_server())
+            servers.append(server)
+            resources.append(resource)
+        # a member that does not receive the multicast requests
+        network.leave(defines.ALL_COAP_NODES, ("10.0.0.1", 5683))
+        client = CoAPClient(defines.ALL_COAP_NODES, 5683, transport=network.endpoint(("10.0.0.100", 40000)))
+        group = Group(client, members=[("10.0.0.1", 5683)])
+        read = await group.read("/test")
+        sent = network.stats()["sent"]
+
+        updates = []
+        async for member, response in group.observe("/test"):
+            updates.append((member, str(response.payload)))
+            if len(updates) == members:
+                for i in (0, 2):
+                    resources[i].payload = "changed"
+                    resources[i].observe_count += 1
+                    await resources[i].notify()
+            elif len(updates) == members + 2:
+                break
+        client.stop()
+        for server in servers:
+            server.stop()
+        return read, sent, updates, group.view("/test")
+
+    def test_group(self):
+        print("GROUP")
+        random.seed(4)
+        network = simulated.SimulatedNetwork(seed=1, latency=0.01)
+        read, sent, updates, view = simulated.run(self.group_exchange(network, 4))
+        members = [("10.0.0.{0}".format(i + 1), 5683) for i in range(4)]
+        self.assertEqual(sorted(read), members)
+        self.assertEqual({str(response.payload) for response in read.values()}, {"Test"})
+        # one multicast request and its 3 responses, one unicast exchange with the member out of the group
+        self.assertEqual(sent, 1 + 3 + 2)
+        self.assertEqual(sorted(member for member, _ in updates[:4]), members)
+        self.assertEqual(sorted(updates[4:]), [(members[0], "changed"), (members[2], "changed")])
+        self.assertEqual(len(view), 4)
+        self.assertEqual(str(view[members[2]].payload), "changed")
+        self.assertEqual(str(view[members[1]].payload), "Test")
+        print("PASS")
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import unittest
+
+from aiounittest import async_test
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.messages.request import Request
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport.tcp import TCPTransport
+from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities.stream_serializer import StreamSerializer
+from aiocoapthon.tests.plugtest_core_resources import *
+
+logger = logging.getLogger(__name__)
+# create logger
+logger.setLevel(logging.DEBUG)
+
+# create console handler and set level to debug
+ch = logging.StreamHandler()
+ch.setLevel(logging.DEBUG)
+
+# create formatter
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# add formatter to ch
+ch.setFormatter(formatter)
+
+# add ch to logger
+logger.addHandler(ch)
+
+
+class PlugtestTCPClass(unittest.TestCase):  # pragma: no cover
+    @staticmethod
+    def stop_client_server(client, server):
+        server.stop()
+        client.stop()
+        tasks = [t for t in asyncio.all_tasks() if t is not
+                 asyncio.current_task()]
+
+        [task.cancel() for task in tasks]
+
+    def main(self):
+        unittest.main()
+
+    @async_test
+    async def test_stream_framing(self):
+        print("STREAM_FRAMING")
+        request = Request()
+        request.type = defines.Type.CON
+        request.mid = 1234
+        request.token = b"\x01\x02"
+        request.code = defines.Code.PUT
+        request.destination = ("127.0.0.1", 5683)
+        request.uri_path = "test"
+        for size in (0, 5, 8, 260, 264, 65800, 65810):
+            request.payload = "x" * size
+            datagram = bytes((await Serializer.serialize(request)).raw)
+            frame = StreamSerializer.frame(datagram)
+            body = len(datagram) - 6
+            self.assertEqual(len(frame), 1 + body + 3 + (0 if body < 13 else 1 if body < 269 else
+                                                          2 if body < 65805 else 4))
+            self.assertEqual(StreamSerializer.unframe(frame, 1234, defines.Type.CON), datagram)
+        csm = StreamSerializer.signal(defines.Signal.CSM, options=[(defines.CSMOption.MAX_MESSAGE_SIZE, b"\x04\x80"),
+                                                                   (defines.CSMOption.BLOCK_WISE_TRANSFER, b"")])
+        self.assertEqual(csm, bytes([0x40, 0xE1, 0x22, 0x04, 0x80, 0x20]))
+        self.assertEqual(StreamSerializer.parse_signal(csm), (defines.Signal.CSM, b"",
+                                                              [(2, b"\x04\x80"), (4, b"")], b""))
+        # the same number names a different option in each signal
+        self.assertEqual(defines.ReleaseOption(2).name, "ALTERNATIVE_ADDRESS")
+        self.assertEqual(defines.AbortOption(2).name, "BAD_CSM_OPTION")
+        self.assertEqual(len(defines.ReleaseOption), 2)
+        print("PASS")
+
+    @async_test
+    async def test_tcp(self):
+        print("TCP")
+        server_transport = TCPTransport(max_message_size=4096)
+        await server_transport.listen("127.0.0.1", 5693)
+        server = CoAPServer("127.0.0.1", 5693, transport=server_transport)
+        resource = TestResource()
+        server.add_resource('test/', resource)
+        server.add_resource('delayed/', DelayedResource(delay=defines.ACK_TIMEOUT * defines.ACK_RANDOM_FACTOR + 0.5))
+        asyncio.get_event_loop().create_task(server.create_server())
+        client_transport = TCPTransport()
+        client = CoAPClient("127.0.0.1", 5693, transport=client_transport)
+        client.start_receiver()
+
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        self.assertEqual(str(ret.payload), "Test")
+        ret = await client.get_non("/test", timeout=5)
+        self.assertEqual(ret.code, defines.Code.CONTENT)
+        # the separate response comes after the first retransmission timeout, and the request is not retransmitted
+        ret = await client.get("/delayed", timeout=10)
+        self.assertEqual(str(ret.payload), "Delayed")
+        self.assertIsNone(client.metrics.get("coap_retransmissions_total").value())
+        self.assertIsNone(server.metrics.get("coap_retransmissions_total").value())
+
+        resource.payload = "y" * 3000
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(str(ret.payload), "y" * 3000)
+
+        connection = client_transport.connection(("127.0.0.1", 5693))
+        await asyncio.wait_for(connection.csm.wait(), 5)
+        self.assertEqual(connection.max_message_size, 4096)
+        self.assertTrue(connection.block_wise)
+        rtt = await client_transport.ping(("127.0.0.1", 5693))
+        self.assertLess(rtt, 1)
+        print("PASS")
+
+        self.stop_client_server(client, server)
+
+    @async_test
+    async def test_bert(self):
+        print("BERT")
+        server_transport = TCPTransport()
+        await server_transport.listen("127.0.0.1", 5694)
+        server = CoAPServer("127.0.0.1", 5694, transport=server_transport)
+        resource = TestResource()
+        server.add_resource('test/', resource)
+        asyncio.get_event_loop().create_task(server.create_server())
+        client_transport = TCPTransport(max_message_size=32 * 1024 + 256)
+        client = CoAPClient("127.0.0.1", 5694, transport=client_transport)
+        client.start_receiver()
+
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(str(ret.payload), "Test")
+        connection = client_transport.connection(("127.0.0.1", 5694))
+        await asyncio.wait_for(connection.csm.wait(), 5)
+        # blocks sent to the client fit its Max-Message-Size
+        self.assertEqual(server_transport.bert_size(list(server_transport._connections)[0]), 32 * 1024)
+        self.assertEqual(client_transport.bert_size(("127.0.0.1", 5694)), defines.BERT_MAX_SIZE)
+
+        payload = "".join(chr(ord("a") + i % 26) for i in range(200 * 1024 + 100))
+        resource.payload = payload
+        ret = await client.get("/test", timeout=5)
+        self.assertEqual(str(ret.payload), payload)
+        # 7 BERT blocks of 32 units instead of 201 blocks of 1024 bytes
+        self.assertEqual(server.metrics.get("coap_messages_sent_total").value("NON", "2.05"), 1 + 7)
+
+        ret = await client.put("/test", payload[::-1], timeout=5)
+        self.assertEqual(ret.code, defines.Code.CHANGED)
+        self.assertEqual(str(resource.payload), payload[::-1])
+        self.assertEqual(server.metrics.get("coap_messages_sent_total").value("NON", "2.31"), 3)
+        print("PASS")
+
+        self.stop_client_server(client, server)
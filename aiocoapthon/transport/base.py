@@ -0,0 +1,55 @@
+import asyncio
+from typing import Tuple, Optional
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class Transport(object):
+    """
+    Datagram transport used by CoAPProtocol to exchange messages with its peers.
+    """
+    # True if the transport delivers every message, so Confirmable messages are never retransmitted
+    reliable = False
+
+    def recvfrom(self) -> "asyncio.Future":
+        """
+        Receive the next datagram.
+
+        :return: a future resolved with (data, address)
+        """
+        raise NotImplementedError
+
+    async def recvmsg(self) -> Tuple[bytes, Tuple, Optional[Tuple]]:
+        """
+        Receive the next datagram together with the address it was sent to, which tells multicast requests apart.
+        Transports that cannot tell the destination return None for it.
+
+        :return: (data, address, destination)
+        """
+        data, address = await self.recvfrom()
+        return data, address, None
+
+    def sendto(self, data: bytes, address: Tuple) -> "asyncio.Future":
+        """
+        Send a datagram.
+
+        :param data: the datagram
+        :param address: the (host, port) of the destination
+        :return: a future resolved with the number of bytes sent
+        """
+        raise NotImplementedError
+
+    def bert_size(self, address: Tuple) -> int:
+        """
+        Return how many bytes a BERT block exchanged with a peer may carry.
+
+        :param address: the (host, port) of the peer
+        :return: a multiple of BERT_UNIT, 0 if BERT cannot be used
+        """
+        return 0
+
+    def close(self):
+        """
+        Release the transport.
+        """
+        raise NotImplementedError
@@ -0,0 +1,309 @@
+import asyncio
+import socket
+from typing import Tuple, Optional, Dict
+
+import cachetools
+
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.transport.udp import UDPTransport
+from aiocoapthon.utilities import defines, errors, events
+
+try:
+    from mbedtls import tls
+    from mbedtls.exceptions import TLSError
+except ImportError:  # pragma: no cover
+    tls = None
+    TLSError = None
+
+# the handshake of a server reads TLSWrappedBuffer._handshake_state and resets the buffer after a HelloVerifyRequest
+# with _reset(), which python-mbedtls does not expose publicly: setup.py pins the releases they were tested with
+if tls is not None and not all(hasattr(tls.TLSWrappedBuffer, name) for name in ("_handshake_state", "_reset")):
+    tls = None  # pragma: no cover
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+# DTLS record header: type, version, epoch, sequence number, length
+_RECORD_HEADER = 13
+_HANDSHAKE = 22
+
+
+def _records(data: bytes, mtu: int):
+    """
+    Pack the records of a flight in datagrams of at most mtu bytes. A single record larger than mtu is sent alone.
+    """
+    datagram = b""
+    offset = 0
+    while offset + _RECORD_HEADER <= len(data):
+        end = offset + _RECORD_HEADER + int.from_bytes(data[offset + 11:offset + 13], 'big')
+        if datagram and len(datagram) + end - offset > mtu:
+            yield datagram
+            datagram = b""
+        datagram += data[offset:end]
+        offset = end
+    if datagram:
+        yield datagram
+
+
+def _client_hello(data: bytes) -> bool:
+    # a handshake record of epoch 0 from an established peer: the peer lost its session, e.g. it rebooted
+    return len(data) > _RECORD_HEADER and data[0] == _HANDSHAKE and data[3:5] == b"\x00\x00"
+
+
+class Session(object):
+    """
+    A DTLS association with a peer, in progress or established.
+    """
+    __slots__ = ("address", "buffer", "established", "written", "sent")
+
+    def __init__(self, address: Tuple[str, int], buffer, established: Optional[asyncio.Future] = None):
+        """
+        Data structure to store a DTLS association.
+
+        :param address: the (host, port) of the peer
+        :param buffer: the mbedtls buffer holding the state of the association
+        :param established: the future resolved when the handshake we started ends, None for the server side
+        """
+        self.address = address
+        self.buffer = buffer
+        self.established = established
+        # application bytes written and the datagram bytes they took, which tell the per-message overhead
+        self.written = 0
+        self.sent = 0
+
+
+class DTLSTransport(Transport):
+    """
+    CoAP over DTLS 1.2 (RFC 7252, Section 9), the transport of coaps URIs, with pre-shared keys or certificates.
+
+    Established sessions are kept in a cache bounded in size and idle time, so a peer pays for the handshake once
+    and not at every exchange. The server answers a ClientHello with a HelloVerifyRequest cookie first, and a
+    ClientHello from a peer with an established session starts a new handshake, e.g. after the peer rebooted.
+    Handshake flights are retransmitted with an exponential back-off, the records carrying CoAP messages are not:
+    they are as lossy as UDP and the message layer retransmits Confirmable messages.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None, psk: Optional[Tuple[str, bytes]] = None,
+                 psk_store: Optional[Dict[str, bytes]] = None, certificate_chain: Optional[tuple] = None,
+                 trust_store=None, server_hostname: Optional[str] = None,
+                 max_sessions: int = defines.DTLS_MAX_SESSIONS,
+                 session_timeout: float = defines.DTLS_SESSION_TIMEOUT,
+                 handshake_timeout: float = defines.DTLS_HANDSHAKE_TIMEOUT, mtu: int = defines.DTLS_MTU):
+        """
+        Initialize the transport.
+
+        :param loop: the event loop
+        :param psk: the (identity, key) we use when we start a handshake, PSK mode
+        :param psk_store: the identity -> key of the clients we accept, PSK mode
+        :param certificate_chain: the (certificates, private key) we authenticate with, certificate mode
+        :param trust_store: the trust store of the certificates of the servers, None to skip their validation
+        :param server_hostname: the name the certificates of the servers must have
+        :param max_sessions: the most established sessions kept
+        :param session_timeout: how long an idle session is kept, in seconds
+        :param handshake_timeout: how long we wait for a handshake we started
+        :param mtu: the largest datagram sent
+        :raise CoAPException: if the python-mbedtls package is missing or not a supported release
+        """
+        if tls is None:  # pragma: no cover
+            raise errors.CoAPException("DTLS requires the python-mbedtls package, version 2.10")
+        self.loop = loop or asyncio.get_event_loop()
+        self.server_hostname = server_hostname
+        self.handshake_timeout = handshake_timeout
+        self.mtu = mtu
+        common = dict(lowest_supported_version=tls.DTLSVersion.DTLSv1_2,
+                      highest_supported_version=tls.DTLSVersion.DTLSv1_2,
+                      handshake_timeout_min=defines.DTLS_RETRANSMIT_TIMEOUT, handshake_timeout_max=handshake_timeout)
+        self._client = tls.ClientContext(tls.DTLSConfiguration(
+            pre_shared_key=psk, certificate_chain=certificate_chain, trust_store=trust_store,
+            validate_certificates=trust_store is not None, **common))
+        self._server = None
+        if psk_store is not None or certificate_chain is not None:
+            self._server = tls.ServerContext(tls.DTLSConfiguration(
+                pre_shared_key_store=psk_store or {}, certificate_chain=certificate_chain,
+                validate_certificates=False, **common))
+        self._sessions = cachetools.TTLCache(maxsize=max_sessions, ttl=session_timeout)
+        self._handshakes = cachetools.LRUCache(maxsize=defines.DTLS_MAX_HANDSHAKES)
+        self._received = asyncio.Queue()
+        self._udp = None
+        self._task = None
+
+    def _open(self, sock: socket.socket):
+        sock.setblocking(False)
+        self._udp = UDPTransport(sock, self.loop)
+        self._task = self.loop.create_task(self._read_loop())
+
+    async def listen(self, host: str, port: int = defines.COAPS_PORT):
+        """
+        Accept handshakes.
+
+        :param host: the local address
+        :param port: the local port
+        :raise CoAPException: if neither pre-shared keys nor a certificate chain were given
+        """
+        if self._server is None:
+            raise errors.CoAPException("A DTLS server needs psk_store or certificate_chain")
+        addrinfo = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+        sock = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addrinfo[4])
+        self._open(sock)
+
+    def session(self, address: Tuple[str, int]) -> Optional[Session]:
+        """
+        Return the established session with a peer.
+
+        :param address: the (host, port) of the peer
+        :return: the session, None if there is none
+        """
+        return self._sessions.get((str(address[0]), address[1]), None)
+
+    async def connect(self, address: Tuple[str, int]) -> Session:
+        """
+        Return the established session with a peer, starting a handshake if needed.
+
+        :param address: the (host, port) of the peer
+        :return: the session
+        :raise CoAPException: if the handshake fails or times out
+        """
+        address = (str(address[0]), address[1])
+        session = self._sessions.get(address, None)
+        if session is not None:
+            return session
+        session = self._handshakes.get(address, None)
+        if session is None or session.established is None:
+            if self._udp is None:
+                addrinfo = socket.getaddrinfo(address[0], address[1], type=socket.SOCK_DGRAM)[0]
+                self._open(socket.socket(addrinfo[0], socket.SOCK_DGRAM))
+            session = Session(address, self._client.wrap_buffers(self.server_hostname), self.loop.create_future())
+            session.buffer.setmtu(self.mtu)
+            self._handshakes[address] = session
+            self._handshake(session)
+        deadline = self.loop.time() + self.handshake_timeout
+        timeout = defines.DTLS_RETRANSMIT_TIMEOUT
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(session.established), timeout)
+                return session
+            except asyncio.TimeoutError:
+                if self.loop.time() >= deadline:
+                    if self._handshakes.get(address, None) is session:
+                        del self._handshakes[address]
+                    raise errors.CoAPException("DTLS handshake with {0}:{1} timed out".format(*address))
+                # mbedtls retransmits the last flight once its timer expired
+                self._handshake(session)
+                timeout *= 2
+
+    async def _read_loop(self):
+        while True:
+            try:
+                data, address = await self._udp.recvfrom()
+            except (OSError, ValueError):
+                return
+            self._datagram(data, (address[0], address[1]))
+
+    def _datagram(self, data: bytes, address: Tuple[str, int]):
+        session = self._sessions.get(address, None)
+        if session is not None and not _client_hello(data):
+            # refresh the idle timeout
+            self._sessions[address] = session
+            self._read(session, data)
+            return
+        session = self._handshakes.get(address, None)
+        if session is None:
+            if self._server is None or not _client_hello(data):
+                return
+            session = Session(address, self._server.wrap_buffers())
+            session.buffer.setmtu(self.mtu)
+            session.buffer.setcookieparam("{0}:{1}".format(*address).encode("utf-8"))
+            self._handshakes[address] = session
+        session.buffer.receive_from_network(data)
+        self._handshake(session)
+
+    def _handshake(self, session: Session):
+        buffer = session.buffer
+        try:
+            while buffer._handshake_state is not tls.HandshakeStep.HANDSHAKE_OVER:
+                try:
+                    buffer.do_handshake()
+                except tls.WantWriteError:
+                    self._flush(session)
+                except tls.WantReadError:
+                    break
+        except tls.HelloVerifyRequest:
+            self._flush(session)
+            # the cookie secret belongs to the buffer, which is reset but kept for the second ClientHello
+            buffer._reset()
+            buffer.setcookieparam("{0}:{1}".format(*session.address).encode("utf-8"))
+            return
+        except TLSError as e:
+            self._flush(session)
+            logger.warning("dtls_handshake_failed", peer=session.address, error=str(e))
+            if self._handshakes.get(session.address, None) is session:
+                del self._handshakes[session.address]
+            if session.established is not None and not session.established.done():
+                session.established.set_exception(errors.CoAPException("DTLS handshake with {0}:{1} failed: {2}"
+                                                                       .format(*session.address, e)))
+            return
+        self._flush(session)
+        if buffer._handshake_state is tls.HandshakeStep.HANDSHAKE_OVER:
+            if self._handshakes.get(session.address, None) is session:
+                del self._handshakes[session.address]
+            self._sessions[session.address] = session
+            logger.debug("dtls_established", peer=session.address, cipher=buffer.cipher())
+            if session.established is not None and not session.established.done():
+                session.established.set_result(session)
+            # the first records may have arrived together with the last flight
+            self._read(session, b"")
+
+    def _read(self, session: Session, data: bytes):
+        try:
+            if data:
+                session.buffer.receive_from_network(data)
+            while True:
+                record = session.buffer.read(defines.RECEIVING_BUFFER)
+                if not record:
+                    break
+                self._received.put_nowait((record, session.address))
+        except tls.WantReadError:
+            pass
+        except TLSError as e:
+            # e.g. a close_notify alert
+            logger.debug("dtls_closed", peer=session.address, error=str(e))
+            self._sessions.pop(session.address, None)
+
+    def _flush(self, session: Session) -> int:
+        data = session.buffer.peek_outgoing(defines.BERT_MAX_SIZE)
+        if not data:
+            return 0
+        session.buffer.consume_outgoing(len(data))
+        for datagram in _records(data, self.mtu):
+            self._udp.sendto(datagram, session.address)
+        return len(data)
+
+    async def recvfrom(self):
+        return await self._received.get()
+
+    async def sendto(self, data: bytes, address: Tuple) -> int:
+        session = await self.connect(address)
+        try:
+            session.buffer.write(data)
+        except TLSError as e:
+            raise errors.CoAPException("DTLS write to {0}:{1} failed: {2}".format(*session.address, e))
+        session.written += len(data)
+        session.sent += self._flush(session)
+        return len(data)
+
+    def close(self):
+        for session in list(self._sessions.values()):
+            try:
+                session.buffer.shutdown()
+                self._flush(session)
+            except TLSError:  # pragma: no cover
+                pass
+        self._sessions.clear()
+        self._handshakes.clear()
+        if self._task is not None:
+            self._task.cancel()
+        if self._udp is not None:
+            self._udp.close()
@@ -0,0 +1,318 @@
+import asyncio
+import collections
+import random
+from typing import Tuple, Optional, Dict
+
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.utilities import errors
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class _VirtualSelector(object):
+    """
+    Selector that, instead of sleeping until the next timer, moves the virtual clock forward.
+    """
+
+    def __init__(self, selector, loop: "VirtualClockLoop"):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # nothing is scheduled: only real I/O, e.g. call_soon_threadsafe, can wake the loop
+            return self._selector.select(None)
+        self._loop.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose time is virtual: when no callback is ready the clock jumps to the next timer, so sleeps,
+    timeouts and retransmissions take no real time.
+
+    Only the code that reads the time from the loop follows the virtual clock. time.time() and time.monotonic() keep
+    returning the real time.
+    """
+
+    def __init__(self, start: float = 0.0):
+        """
+        Initialize the loop.
+
+        :param start: the initial virtual time, in seconds
+        """
+        super().__init__()
+        self._now = start
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        """
+        Move the virtual clock forward.
+
+        :param seconds: the time to skip
+        """
+        self._now += seconds
+
+
+def run(coroutine, start: float = 0.0):
+    """
+    Run a coroutine on a new VirtualClockLoop, like asyncio.run().
+
+    :param coroutine: the coroutine
+    :param start: the initial virtual time
+    :return: the result of the coroutine
+    """
+    loop = VirtualClockLoop(start)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+class LinkConditions(object):
+    """
+    Impairments applied to the datagrams sent on a link.
+    """
+    __slots__ = ("loss", "duplication", "reordering", "latency", "jitter", "bandwidth")
+
+    def __init__(self, loss: float = 0.0, duplication: float = 0.0, reordering: float = 0.0, latency: float = 0.0,
+                 jitter: float = 0.0, bandwidth: Optional[float] = None):
+        """
+        Initialize the conditions.
+
+        :param loss: the probability that a datagram is dropped
+        :param duplication: the probability that a datagram is delivered twice
+        :param reordering: the probability that a datagram is held back and overtaken by the following ones
+        :param latency: the propagation delay, in seconds
+        :param jitter: the maximum random delay added to the latency, in seconds
+        :param bandwidth: the capacity of the link in bytes per second, None for unlimited
+        """
+        self.loss = loss
+        self.duplication = duplication
+        self.reordering = reordering
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+
+
+class SimulatedNetwork(object):
+    """
+    In-memory network connecting SimulatedTransport endpoints.
+
+    Every impairment is drawn from a random generator seeded at creation, and deliveries are scheduled on the event
+    loop. On a VirtualClockLoop a run is therefore reproducible and takes no real time for the simulated delays.
+    The retransmission timeouts of CoAP are randomized with the random module: seed it too for identical runs.
+    """
+
+    def __init__(self, seed: int = 0, loop: asyncio.AbstractEventLoop = None, **conditions):
+        """
+        Initialize the network.
+
+        :param seed: the seed of the impairments
+        :param loop: the event loop, the current one if None
+        :param conditions: the default LinkConditions of every link, e.g. loss=0.1, latency=0.05
+        """
+        self._random = random.Random(seed)
+        self._loop = loop
+        self.conditions = LinkConditions(**conditions)
+        self._links = {}
+        self._endpoints = {}
+        self._busy_until = {}
+        self._groups = {}
+        self.counters = collections.Counter()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def endpoint(self, address: Tuple[str, int]) -> "SimulatedTransport":
+        """
+        Attach an endpoint to the network.
+
+        :param address: the (host, port) of the endpoint, the host being an IP address
+        :return: the transport of the endpoint
+        :raise CoAPException: if the address is already in use
+        """
+        address = (str(address[0]), address[1])
+        if address in self._endpoints:
+            raise errors.CoAPException("Address {0}:{1} already in use".format(*address))
+        transport = SimulatedTransport(self, address)
+        self._endpoints[address] = transport
+        return transport
+
+    def detach(self, address: Tuple[str, int]):
+        """
+        Remove an endpoint. The datagrams addressed to it are lost.
+
+        :param address: the (host, port) of the endpoint
+        """
+        self._endpoints.pop((str(address[0]), address[1]), None)
+
+    def set_link(self, source: Tuple[str, int], destination: Tuple[str, int], **conditions):
+        """
+        Set the conditions of the link from an endpoint to another, overriding the defaults of the network.
+
+        :param source: the (host, port) of the sender
+        :param destination: the (host, port) of the receiver
+        :param conditions: the LinkConditions of the link
+        """
+        self._links[(str(source[0]), source[1]), (str(destination[0]), destination[1])] = LinkConditions(**conditions)
+
+    def join(self, group: str, address: Tuple[str, int]):
+        """
+        Add an endpoint to a multicast group. The datagrams sent to (group, port) are delivered to every member
+        listening on that port, each copy going through its own link.
+
+        :param group: the IP address of the group
+        :param address: the (host, port) of the endpoint
+        """
+        self._groups.setdefault(str(group), set()).add((str(address[0]), address[1]))
+
+    def leave(self, group: str, address: Tuple[str, int]):
+        """
+        Remove an endpoint from a multicast group.
+
+        :param group: the IP address of the group
+        :param address: the (host, port) of the endpoint
+        """
+        self._groups.get(str(group), set()).discard((str(address[0]), address[1]))
+
+    def transmit(self, source: Tuple[str, int], destination: Tuple, data: bytes):
+        """
+        Send a datagram through the network.
+
+        :param source: the (host, port) of the sender
+        :param destination: the (host, port) of the receiver, or of a multicast group
+        :param data: the datagram
+        """
+        destination = (str(destination[0]), destination[1])
+        self.counters["sent"] += 1
+        self.counters["bytes"] += len(data)
+        now = self.loop.time()
+        departure = now
+        link = self._links.get((source, destination), self.conditions)
+        if link.bandwidth:
+            departure = max(now, self._busy_until.get(source, now)) + len(data) / link.bandwidth
+            self._busy_until[source] = departure
+        members = self._groups.get(destination[0], None)
+        if members is None:
+            self._forward(source, destination, destination, data, departure - now)
+            return
+        for member in sorted(members):
+            if member[1] == destination[1] and member != source:
+                self._forward(source, member, destination, data, departure - now)
+
+    def _forward(self, source: Tuple[str, int], receiver: Tuple[str, int], destination: Tuple[str, int],
+                 data: bytes, queueing: float):
+        link = self._links.get((source, receiver), self.conditions)
+        if self._random.random() < link.loss:
+            self.counters["lost"] += 1
+            return
+        copies = 1
+        if self._random.random() < link.duplication:
+            self.counters["duplicated"] += 1
+            copies = 2
+        for _ in range(copies):
+            delay = queueing + link.latency + self._random.random() * link.jitter
+            if self._random.random() < link.reordering:
+                self.counters["reordered"] += 1
+                delay += link.latency + link.jitter + self._random.random() * (link.latency + link.jitter + 0.01)
+            self.loop.call_later(delay, self._deliver, source, receiver, destination, data)
+
+    def _deliver(self, source: Tuple[str, int], receiver: Tuple[str, int], destination: Tuple[str, int],
+                 data: bytes):
+        transport = self._endpoints.get(receiver, None)
+        if transport is None:
+            self.counters["unreachable"] += 1
+            return
+        self.counters["delivered"] += 1
+        transport.receive(data, source, destination)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the counters of the network.
+
+        :return: a dict with the datagrams sent, lost, duplicated, reordered, delivered and unreachable
+        """
+        return {name: self.counters[name] for name in ("sent", "bytes", "lost", "duplicated", "reordered",
+                                                        "delivered", "unreachable")}
+
+
+class SimulatedTransport(Transport):
+    """
+    Endpoint of a SimulatedNetwork.
+    """
+
+    def __init__(self, network: SimulatedNetwork, address: Tuple[str, int]):
+        """
+        Initialize the transport. Use SimulatedNetwork.endpoint() instead.
+
+        :param network: the network
+        :param address: the (host, port) of the endpoint
+        """
+        self.network = network
+        self.address = address
+        self._received = collections.deque()
+        self._waiters = collections.deque()
+
+    def receive(self, data: bytes, source: Tuple[str, int], destination: Tuple[str, int] = None):
+        """
+        Called by the network when a datagram arrives.
+
+        :param data: the datagram
+        :param source: the (host, port) of the sender
+        :param destination: the (host, port) the datagram was sent to, the endpoint or a multicast group
+        """
+        item = (data, source, destination or self.address)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(item)
+                return
+        self._received.append(item)
+
+    def _next(self) -> "asyncio.Future":
+        fut = self.network.loop.create_future()
+        if self._received:
+            fut.set_result(self._received.popleft())
+        else:
+            self._waiters.append(fut)
+        return fut
+
+    async def recvfrom(self):
+        data, source, _ = await self._next()
+        return data, source
+
+    async def recvmsg(self):
+        return await self._next()
+
+    def sendto(self, data: bytes, address: Tuple) -> "asyncio.Future":
+        self.network.transmit(self.address, address, data)
+        fut = self.network.loop.create_future()
+        fut.set_result(len(data))
+        return fut
+
+    def close(self):
+        self.network.detach(self.address)
+        while self._waiters:
+            self._waiters.popleft().cancel()
@@ -0,0 +1,287 @@
+import asyncio
+import os
+from typing import Tuple, Optional
+
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.utilities import defines, errors, events
+from aiocoapthon.utilities.stream_serializer import StreamSerializer
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+# room left in a message for the header and the options of a BERT block
+_BERT_OVERHEAD = 256
+
+
+def _uint(value: bytes) -> int:
+    return int.from_bytes(value, 'big')
+
+
+def _encode_uint(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, 'big')
+
+
+class Connection(object):
+    """
+    A CoAP over TCP connection with a peer, and the capabilities the peer announced in its CSM.
+    """
+
+    def __init__(self, transport: "TCPTransport", reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 address: Tuple[str, int]):
+        """
+        Initialize the connection and send our CSM, which must be the first message on the stream.
+
+        :param transport: the transport owning the connection
+        :param reader: the input stream
+        :param writer: the output stream
+        :param address: the (host, port) of the peer
+        """
+        self.address = address
+        self.max_message_size = defines.TCP_DEFAULT_MAX_MESSAGE_SIZE
+        self.block_wise = False
+        self.csm = asyncio.Event()
+        self._transport = transport
+        self._reader = reader
+        self._writer = writer
+        self._mid = 0
+        options = [(defines.CSMOption.MAX_MESSAGE_SIZE, _encode_uint(transport.max_message_size))]
+        if transport.block_wise:
+            options.append((defines.CSMOption.BLOCK_WISE_TRANSFER, b""))
+        self.write(StreamSerializer.signal(defines.Signal.CSM, options=options))
+        self._task = transport.loop.create_task(self._read_loop())
+
+    def write(self, frame: bytes):
+        """
+        Send a frame.
+
+        :param frame: the frame
+        """
+        self._writer.write(frame)
+
+    def next_mid(self) -> int:
+        """
+        Return the Message ID given to the next incoming message, which has none on the stream.
+
+        :return: the mid
+        """
+        self._mid = (self._mid + 1) % defines.MID_SPACE_SIZE
+        return self._mid
+
+    async def _read_loop(self):
+        try:
+            while True:
+                frame = await StreamSerializer.read(self._reader, self._transport.max_message_size)
+                code = StreamSerializer.code(frame)
+                if code >= defines.Signal.CSM:
+                    self._signal(frame)
+                elif code != defines.Code.EMPTY:
+                    # Empty messages are only keep-alives (RFC 8323, Section 3.4)
+                    self._transport.deliver(StreamSerializer.unframe(frame, self.next_mid()), self.address)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            return
+        except errors.CoAPException as e:
+            logger.warning("tcp_abort", peer=self.address, error=e.msg)
+            self.write(StreamSerializer.signal(defines.Signal.ABORT, payload=e.msg.encode("utf-8")))
+        self._transport.forget(self)
+        self._writer.close()
+
+    def _signal(self, frame: bytes):
+        code, token, options, payload = StreamSerializer.parse_signal(frame)
+        logger.debug("tcp_signal", peer=self.address, code=code, options=options)
+        if code == defines.Signal.CSM:
+            for number, value in options:
+                if number == defines.CSMOption.MAX_MESSAGE_SIZE:
+                    self.max_message_size = _uint(value)
+                elif number == defines.CSMOption.BLOCK_WISE_TRANSFER:
+                    self.block_wise = True
+            self.csm.set()
+        elif code == defines.Signal.PING:
+            custody = [(number, value) for number, value in options if number == defines.PingOption.CUSTODY]
+            self.write(StreamSerializer.signal(defines.Signal.PONG, token, custody))
+        elif code == defines.Signal.PONG:
+            self._transport.pong(token)
+        elif code in (defines.Signal.RELEASE, defines.Signal.ABORT):
+            raise asyncio.IncompleteReadError(b"", None)
+
+    def close(self, release: bool = True):
+        """
+        Close the connection.
+
+        :param release: True, to send a Release message first
+        """
+        if release and not self._writer.is_closing():
+            self.write(StreamSerializer.signal(defines.Signal.RELEASE))
+        self._task.cancel()
+        self._writer.close()
+
+
+class TCPTransport(Transport):
+    """
+    CoAP over TCP (RFC 8323) on asyncio streams, for the same layer stack used on UDP.
+
+    Incoming frames are turned into Non-confirmable messages with a Message ID local to the connection, and
+    outgoing messages are framed without Type and Message ID. The stream is reliable: Confirmable messages are not
+    retransmitted, a Confirmable response (e.g. a notification) is acknowledged by the transport as soon as it is
+    written, and empty ACK and RST messages are not sent. Connections to new peers are opened on the first message.
+    """
+    reliable = True
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None, max_message_size: int = defines.TCP_MAX_MESSAGE_SIZE,
+                 block_wise: bool = True, bert_max_size: int = defines.BERT_MAX_SIZE):
+        """
+        Initialize the transport.
+
+        :param loop: the event loop
+        :param max_message_size: the largest message we accept, announced in our CSM
+        :param block_wise: True, to announce support for block-wise transfers, including BERT, in our CSM
+        :param bert_max_size: the largest BERT block we send
+        """
+        self.loop = loop or asyncio.get_event_loop()
+        self.max_message_size = max_message_size
+        self.block_wise = block_wise
+        self.bert_max_size = bert_max_size
+        self._server = None
+        self._connections = {}
+        self._connecting = {}
+        self._received = asyncio.Queue()
+        self._pings = {}
+
+    async def listen(self, host: str, port: int):
+        """
+        Accept connections.
+
+        :param host: the local address
+        :param port: the local port
+        """
+        self._server = await asyncio.start_server(self._accept, host, port)
+
+    def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        host, port = writer.get_extra_info("peername")[:2]
+        self._connections[(host, port)] = Connection(self, reader, writer, (host, port))
+
+    async def connect(self, address: Tuple[str, int]) -> Connection:
+        """
+        Return the connection with a peer, opening it if needed.
+
+        :param address: the (host, port) of the peer
+        :return: the connection
+        """
+        address = (str(address[0]), address[1])
+        connection = self._connections.get(address, None)
+        if connection is not None:
+            return connection
+        pending = self._connecting.get(address, None)
+        if pending is None:
+            pending = self.loop.create_task(asyncio.open_connection(*address))
+            self._connecting[address] = pending
+        try:
+            reader, writer = await asyncio.shield(pending)
+        finally:
+            self._connecting.pop(address, None)
+        connection = self._connections.get(address, None)
+        if connection is None:
+            connection = Connection(self, reader, writer, address)
+            self._connections[address] = connection
+        return connection
+
+    def connection(self, address: Tuple[str, int]) -> Optional[Connection]:
+        """
+        Return the open connection with a peer.
+
+        :param address: the (host, port) of the peer
+        :return: the connection, None if there is none
+        """
+        return self._connections.get((str(address[0]), address[1]), None)
+
+    def bert_size(self, address: Tuple) -> int:
+        """
+        Return how many bytes a BERT block exchanged with a peer may carry. BERT is used only when both endpoints
+        announced the Block-Wise-Transfer capability, and the blocks fit the Max-Message-Size of the peer.
+
+        :param address: the (host, port) of the peer
+        :return: a multiple of BERT_UNIT, 0 if BERT cannot be used
+        """
+        connection = self.connection(address)
+        if not self.block_wise or connection is None or not connection.block_wise:
+            return 0
+        size = min(self.bert_max_size, connection.max_message_size - _BERT_OVERHEAD)
+        return max(0, size) // defines.BERT_UNIT * defines.BERT_UNIT
+
+    def forget(self, connection: Connection):
+        """
+        Called when a connection ends.
+
+        :param connection: the connection
+        """
+        if self._connections.get(connection.address, None) is connection:
+            del self._connections[connection.address]
+
+    def deliver(self, data: bytes, address: Tuple[str, int]):
+        """
+        Queue a message for the protocol.
+
+        :param data: the message, in UDP format
+        :param address: the (host, port) of the peer
+        """
+        self._received.put_nowait((data, address))
+
+    def pong(self, token: bytes):
+        """
+        Called when a Pong arrives.
+
+        :param token: the token of the Pong
+        """
+        fut = self._pings.pop(token, None)
+        if fut is not None and not fut.done():
+            fut.set_result(self.loop.time())
+
+    async def ping(self, address: Tuple[str, int], timeout: float = defines.TCP_PING_TIMEOUT) -> float:
+        """
+        Check that a peer is alive with a Ping signal.
+
+        :param address: the (host, port) of the peer
+        :param timeout: how long to wait for the Pong
+        :return: the round-trip time, in seconds
+        :raise TimeoutError: if no Pong arrives in time
+        """
+        connection = await self.connect(address)
+        token = os.urandom(4)
+        fut = self.loop.create_future()
+        self._pings[token] = fut
+        start = self.loop.time()
+        connection.write(StreamSerializer.signal(defines.Signal.PING, token))
+        try:
+            return await asyncio.wait_for(fut, timeout) - start
+        finally:
+            self._pings.pop(token, None)
+
+    async def recvfrom(self):
+        return await self._received.get()
+
+    async def sendto(self, data: bytes, address: Tuple) -> int:
+        message_type = (data[0] >> 4) & 0x03
+        if data[1] == defines.Code.EMPTY and message_type != defines.Type.CON:
+            # ACK and RST have no meaning on a reliable stream
+            return 0
+        connection = await self.connect(address)
+        if data[1] != defines.Code.EMPTY:
+            frame = StreamSerializer.frame(data)
+            if len(frame) > connection.max_message_size:
+                raise errors.CoAPException("Message of {0} bytes exceeds the maximum message size of {1}:{2}"
+                                           .format(len(frame), *connection.address))
+            connection.write(frame)
+        if message_type == defines.Type.CON and data[1] >= defines.Code.CREATED:
+            # delivered by the stream: acknowledge it as the peer would on UDP
+            ack = bytes([(defines.VERSION << 6) | (defines.Type.ACK << 4), defines.Code.EMPTY, data[2], data[3]])
+            self.deliver(ack, connection.address)
+        return len(data)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self._connections.values()):
+            connection.close()
+        self._connections.clear()
@@ -0,0 +1,105 @@
+import asyncio
+import ipaddress
+import socket
+import struct
+import sys
+from typing import Tuple
+
+from aiocoapthon.transport.base import Transport
+from aiocoapthon.utilities import defines
+
+__author__ = 'Giacomo Tanganelli'
+
+# not exported by the socket module before Python 3.13, the value is part of the Linux ABI
+IP_PKTINFO = getattr(socket, "IP_PKTINFO", 8 if sys.platform.startswith("linux") else None)
+
+# struct in_pktinfo: interface index, local address, destination address of the header
+_PKTINFO = struct.Struct("=i4s4s")
+
+
+class UDPTransport(Transport):
+    """
+    Transport over a non-blocking UDP socket, driven by the readiness callbacks of the event loop.
+    """
+
+    def __init__(self, sock: socket.socket, loop: asyncio.AbstractEventLoop, pktinfo: bool = False):
+        """
+        Initialize the transport.
+
+        :param sock: the non-blocking socket
+        :param loop: the event loop
+        :param pktinfo: True, to ask the kernel for the destination address of the datagrams (IPv4 only), which
+            recvmsg() returns. Used by sockets that joined a multicast group.
+        """
+        self.socket = sock
+        self._loop = loop
+        self._pktinfo = pktinfo and IP_PKTINFO is not None and sock.family == socket.AF_INET
+        if self._pktinfo:
+            sock.setsockopt(socket.IPPROTO_IP, IP_PKTINFO, 1)
+
+    def recvfrom(self, fut=None, registed=False):
+        fd = self.socket.fileno()
+        if fut is None:
+            fut = self._loop.create_future()
+        if registed:
+            try:
+                self._loop.remove_reader(fd)
+            except ValueError:  # pragma: no cover
+                return
+        try:
+            data, addr = self.socket.recvfrom(defines.RECEIVING_BUFFER)
+        except (BlockingIOError, InterruptedError):
+            self._loop.add_reader(fd, self.recvfrom, fut, True)
+        else:
+            fut.set_result((data, addr))
+        return fut
+
+    def _recvmsg(self, fut, registed=False):
+        fd = self.socket.fileno()
+        if registed:
+            try:
+                self._loop.remove_reader(fd)
+            except ValueError:  # pragma: no cover
+                return
+        try:
+            data, ancdata, _, addr = self.socket.recvmsg(defines.RECEIVING_BUFFER, socket.CMSG_SPACE(_PKTINFO.size))
+        except (BlockingIOError, InterruptedError):
+            self._loop.add_reader(fd, self._recvmsg, fut, True)
+            return
+        destination = None
+        for level, kind, value in ancdata:
+            if level == socket.IPPROTO_IP and kind == IP_PKTINFO and len(value) >= _PKTINFO.size:
+                _, _, address = _PKTINFO.unpack_from(value)
+                destination = (str(ipaddress.IPv4Address(address)), self.socket.getsockname()[1])
+        if not fut.done():
+            fut.set_result((data, addr, destination))
+
+    async def recvmsg(self):
+        if not self._pktinfo:
+            return await super().recvmsg()
+        fut = self._loop.create_future()
+        self._recvmsg(fut)
+        return await fut
+
+    def sendto(self, data: bytes, address: Tuple, fut=None, registed=False):
+        fd = self.socket.fileno()
+        if fut is None:
+            fut = self._loop.create_future()
+        if registed:  # pragma: no cover
+            try:
+                self._loop.remove_writer(fd)
+            except ValueError:
+                return
+        try:
+            n = self.socket.sendto(data, address)
+        except (BlockingIOError, InterruptedError):  # pragma: no cover
+            self._loop.add_writer(fd, self.sendto, data, address, fut, True)
+        else:
+            fut.set_result(n)
+        return fut
+
+    def close(self):
+        if self.socket.fileno() >= 0:
+            # a new socket may get the same descriptor, which must not inherit the reader
+            self._loop.remove_reader(self.socket.fileno())
+        self.socket.close()
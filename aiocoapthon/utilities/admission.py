@@ -0,0 +1,116 @@
+import collections
+import time
+from typing import Optional, Tuple, Callable
+
+import cachetools
+
+from aiocoapthon.utilities import defines
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at a constant rate up to its burst size.
+    """
+    __slots__ = ("tokens", "timestamp")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.timestamp = now
+
+    def consume(self, rate: float, burst: float, now: float) -> bool:
+        """
+        Refill the bucket and try to take a token.
+
+        :param rate: the tokens added per second
+        :param burst: the capacity of the bucket
+        :param now: the current time
+        :return: True, if a token was available
+        """
+        self.tokens = min(burst, self.tokens + (now - self.timestamp) * rate)
+        self.timestamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class AdmissionControl(object):
+    """
+    Decide whether an incoming request is handled, before it is deserialized.
+
+    Every peer owns a token bucket that limits its request rate, and the number of requests handled concurrently by
+    the endpoint is capped. Requests above the limits are shed: the caller answers CON requests with
+    5.03 Service Unavailable and drops NON ones.
+    """
+    RATE_LIMITED = "rate_limited"
+    OVERLOADED = "overloaded"
+
+    def __init__(self, rate: float = defines.ADMISSION_RATE, burst: float = defines.ADMISSION_BURST,
+                 max_in_flight: int = defines.ADMISSION_MAX_IN_FLIGHT,
+                 max_peers: int = defines.ADMISSION_MAX_PEERS, retry_after: int = defines.ADMISSION_RETRY_AFTER,
+                 timer: Callable[[], float] = time.monotonic):
+        """
+        Initialize the admission control.
+
+        :param rate: the requests per second allowed to every peer
+        :param burst: the number of requests a peer can send at once
+        :param max_in_flight: the maximum number of requests handled concurrently
+        :param max_peers: the number of peers whose bucket is tracked
+        :param retry_after: the Max-Age, in seconds, of the 5.03 responses
+        :param timer: the clock used to refill the buckets
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self._timer = timer
+        self._buckets = cachetools.LRUCache(maxsize=max_peers)
+        self._in_flight = 0
+        self.shed = collections.Counter()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Return the number of requests being handled.
+
+        :return: the number of admitted requests not yet released
+        """
+        return self._in_flight
+
+    def admit(self, peer: Tuple) -> Optional[str]:
+        """
+        Check if a request from a peer can be handled. An admitted request must be released once handled.
+
+        :param peer: the (host, port) of the peer
+        :return: None if the request is admitted, the reason for shedding it otherwise
+        """
+        if self._in_flight >= self.max_in_flight:
+            self.shed[self.OVERLOADED] += 1
+            return self.OVERLOADED
+        now = self._timer()
+        key = peer[:2]
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+        if not bucket.consume(self.rate, self.burst, now):
+            self.shed[self.RATE_LIMITED] += 1
+            return self.RATE_LIMITED
+        self._in_flight += 1
+        return None
+
+    def release(self):
+        """
+        Release an admitted request.
+        """
+        self._in_flight -= 1
+
+    def stats(self) -> dict:
+        """
+        Return the statistics of the admission control.
+
+        :return: a dict with the statistics
+        """
+        return {"in_flight": self._in_flight, "peers": len(self._buckets), "shed": dict(self.shed)}
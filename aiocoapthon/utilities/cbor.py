@@ -0,0 +1,175 @@
+import struct
+from typing import Union, Tuple, Iterator
+
+from aiocoapthon.utilities import errors
+
+__author__ = 'Giacomo Tanganelli'
+
+# major types (RFC 8949, Section 3.1)
+_UNSIGNED = 0
+_NEGATIVE = 1
+_BYTES = 2
+_TEXT = 3
+_ARRAY = 4
+_MAP = 5
+
+_SIMPLE = 7
+
+_FALSE = 0xF4
+_TRUE = 0xF5
+_NULL = 0xF6
+_HALF = 0xF9
+_SINGLE = 0xFA
+_DOUBLE = 0xFB
+
+
+def _head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([(major << 5) | value])
+    elif value < 0x100:
+        return bytes([(major << 5) | 24, value])
+    elif value < 0x10000:
+        return bytes([(major << 5) | 25]) + value.to_bytes(2, 'big')
+    elif value < 0x100000000:
+        return bytes([(major << 5) | 26]) + value.to_bytes(4, 'big')
+    elif value < 0x10000000000000000:
+        return bytes([(major << 5) | 27]) + value.to_bytes(8, 'big')
+    raise errors.CoAPException("Integer too large for CBOR")
+
+
+def dumps(value: Union[int, float, bytes, str, list, tuple, dict, bool, None]) -> bytes:
+    """
+    Encode a value in CBOR, with the definite-length encodings only. Integers, floats, byte and text strings, arrays,
+    maps, booleans and None are supported. Floats take 4 bytes when that loses no precision, 8 otherwise.
+
+    :param value: the value
+    :return: the encoded value
+    """
+    if value is None:
+        return bytes([_NULL])
+    elif isinstance(value, bool):
+        return bytes([_TRUE if value else _FALSE])
+    elif isinstance(value, int):
+        if value >= 0:
+            return _head(_UNSIGNED, value)
+        return _head(_NEGATIVE, -1 - value)
+    elif isinstance(value, float):
+        single = struct.pack(">f", value)
+        if struct.unpack(">f", single)[0] == value or value != value:
+            return bytes([_SINGLE]) + single
+        return bytes([_DOUBLE]) + struct.pack(">d", value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return _head(_BYTES, len(value)) + bytes(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        return _head(_TEXT, len(data)) + data
+    elif isinstance(value, (list, tuple)):
+        return _head(_ARRAY, len(value)) + b"".join(dumps(item) for item in value)
+    elif isinstance(value, dict):
+        return _head(_MAP, len(value)) + b"".join(dumps(k) + dumps(v) for k, v in value.items())
+    raise errors.CoAPException("Cannot encode {0} in CBOR".format(type(value).__name__))
+
+
+def _argument(data: bytes, offset: int) -> Tuple[int, int, int]:
+    if offset >= len(data):
+        raise errors.CoAPException("CBOR data ended prematurely")
+    major = data[offset] >> 5
+    info = data[offset] & 0x1F
+    offset += 1
+    if info < 24:
+        return major, info, offset
+    if info > 27:
+        raise errors.CoAPException("Indefinite or reserved CBOR length")
+    size = 1 << (info - 24)
+    if offset + size > len(data):
+        raise errors.CoAPException("CBOR data ended prematurely")
+    return major, int.from_bytes(data[offset:offset + size], 'big'), offset + size
+
+
+_SIMPLE_VALUES = {_FALSE: False, _TRUE: True, _NULL: None}
+_FLOATS = {_HALF: (">e", 2), _SINGLE: (">f", 4), _DOUBLE: (">d", 8)}
+
+
+def _decode(data: memoryview, offset: int):
+    initial = data[offset] if offset < len(data) else None
+    if initial in _SIMPLE_VALUES:
+        return _SIMPLE_VALUES[initial], offset + 1
+    if initial in _FLOATS:
+        fmt, size = _FLOATS[initial]
+        if offset + 1 + size > len(data):
+            raise errors.CoAPException("CBOR data ended prematurely")
+        return struct.unpack_from(fmt, data, offset + 1)[0], offset + 1 + size
+    major, value, offset = _argument(data, offset)
+    if major == _UNSIGNED:
+        return value, offset
+    elif major == _NEGATIVE:
+        return -1 - value, offset
+    elif major in (_BYTES, _TEXT):
+        if offset + value > len(data):
+            raise errors.CoAPException("CBOR data ended prematurely")
+        item = data[offset:offset + value]
+        if major == _TEXT:
+            try:
+                item = str(item, "utf-8")
+            except UnicodeDecodeError:
+                raise errors.CoAPException("Invalid CBOR text string")
+        else:
+            item = bytes(item)
+        return item, offset + value
+    elif major == _ARRAY:
+        items = []
+        for _ in range(value):
+            item, offset = _decode(data, offset)
+            items.append(item)
+        return items, offset
+    elif major == _MAP:
+        items = {}
+        for _ in range(value):
+            key, offset = _decode(data, offset)
+            items[key], offset = _decode(data, offset)
+        return items, offset
+    raise errors.CoAPException("Unsupported CBOR major type {0}".format(major))
+
+
+def loads(data: Union[bytes, memoryview]):
+    """
+    Decode a CBOR item encoded as dumps does. A memoryview is decoded in place, only strings are copied.
+
+    :param data: the encoded item
+    :return: the value
+    :raise CoAPException: if the data is malformed, or has trailing bytes
+    """
+    data = memoryview(data)
+    value, offset = _decode(data, 0)
+    if offset != len(data):
+        raise errors.CoAPException("Trailing bytes after the CBOR item")
+    return value
+
+
+def iterloads(data: Union[bytes, memoryview]) -> Iterator:
+    """
+    Decode the items of a CBOR array one at a time, so that a large array is never held decoded at once.
+
+    :param data: the encoded array
+    :return: an iterator on the items
+    :raise CoAPException: if the data is not an array, or is malformed
+    """
+    data = memoryview(data)
+    major, count, offset = _argument(data, 0)
+    if major != _ARRAY:
+        raise errors.CoAPException("CBOR item is not an array")
+    for _ in range(count):
+        item, offset = _decode(data, offset)
+        yield item
+    if offset != len(data):
+        raise errors.CoAPException("Trailing bytes after the CBOR item")
+
+
+def array_header(count: int) -> bytes:
+    """
+    Return the head of an array of count items, which follow it encoded one after the other.
+
+    :param count: the number of items
+    :return: the encoded head
+    """
+    return _head(_ARRAY, count)
@@ -0,0 +1,372 @@
+import base64
+import json
+from typing import Iterable, Iterator, Union, Dict, List, Tuple
+
+from aiocoapthon.utilities import cbor, defines, errors
+
+__author__ = 'Giacomo Tanganelli'
+
+# SenML labels and their integer keys in the CBOR representation (RFC 8428, Section 6)
+SENML_LABELS = {"bver": -1, "bn": -2, "bt": -3, "bu": -4, "bv": -5, "bs": -6,
+                "n": 0, "u": 1, "v": 2, "vs": 3, "vb": 4, "s": 5, "t": 6, "ut": 7, "vd": 8}
+_SENML_NAMES = {key: label for label, key in SENML_LABELS.items()}
+
+
+class Codec(object):
+    """
+    Base class of the codecs, which turn the payload of a Content-Format into Python values and back.
+    """
+    content_type = None
+
+    def encode(self, value) -> bytes:
+        """
+        Encode a value.
+
+        :param value: the value
+        :return: the payload
+        :raise CoAPException: if the value cannot be encoded
+        """
+        return b"".join(self.iterencode(value))
+
+    def iterencode(self, value) -> Iterator[bytes]:
+        """
+        Encode a value in chunks, which can be written out while the rest of the value is encoded.
+
+        :param value: the value
+        :return: an iterator on the chunks of the payload
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def decode(self, data: memoryview):
+        """
+        Decode a payload.
+
+        :param data: the payload
+        :return: the value
+        :raise CoAPException: if the payload is malformed
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def iterdecode(self, data: memoryview) -> Iterator:
+        """
+        Decode the items of a payload holding a sequence, one at a time.
+
+        :param data: the payload
+        :return: an iterator on the items
+        :raise CoAPException: if the payload is malformed
+        """
+        return iter(self.decode(data))
+
+
+class TextCodec(Codec):
+    """
+    text/plain; charset=utf-8
+    """
+    content_type = defines.ContentType.TEXT_PLAIN
+
+    def iterencode(self, value: str) -> Iterator[bytes]:
+        yield str(value).encode("utf-8")
+
+    def decode(self, data: memoryview) -> str:
+        try:
+            return str(data, "utf-8")
+        except UnicodeDecodeError:
+            raise errors.CoAPException("Invalid UTF-8 payload")
+
+
+class JSONCodec(Codec):
+    """
+    application/json
+    """
+    content_type = defines.ContentType.application_json
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def iterencode(self, value) -> Iterator[bytes]:
+        for chunk in self._encoder.iterencode(value):
+            yield chunk.encode("utf-8")
+
+    def decode(self, data: memoryview):
+        try:
+            return json.loads(str(data, "utf-8"))
+        except ValueError:
+            raise errors.CoAPException("Malformed JSON payload")
+
+
+class CBORCodec(Codec):
+    """
+    application/cbor
+    """
+    content_type = defines.ContentType.application_cbor
+
+    def encode(self, value) -> bytes:
+        return cbor.dumps(value)
+
+    def iterencode(self, value) -> Iterator[bytes]:
+        yield cbor.dumps(value)
+
+    def decode(self, data: memoryview):
+        return cbor.loads(data)
+
+    def iterdecode(self, data: memoryview) -> Iterator:
+        return cbor.iterloads(data)
+
+
+class SenMLJSONCodec(Codec):
+    """
+    application/senml+json (RFC 8428). A pack is a list of records, dicts keyed by the SenML labels. Data values
+    (vd) are bytes in Python and base64url strings on the wire.
+    """
+    content_type = defines.ContentType.application_senml_json
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+        self._decoder = json.JSONDecoder()
+
+    @staticmethod
+    def _record(record: dict) -> dict:
+        vd = record.get("vd", None)
+        if isinstance(vd, (bytes, bytearray)):
+            record = dict(record)
+            record["vd"] = base64.urlsafe_b64encode(vd).rstrip(b"=").decode("ascii")
+        return record
+
+    @staticmethod
+    def _value(record) -> dict:
+        if not isinstance(record, dict):
+            raise errors.CoAPException("SenML record is not an object")
+        vd = record.get("vd", None)
+        if isinstance(vd, str):
+            try:
+                record["vd"] = base64.urlsafe_b64decode(vd + "=" * (-len(vd) % 4))
+            except ValueError:
+                raise errors.CoAPException("Malformed SenML data value")
+        return record
+
+    def iterencode(self, value: Iterable[dict]) -> Iterator[bytes]:
+        separator = b"["
+        for record in value:
+            yield separator + self._encoder.encode(self._record(record)).encode("utf-8")
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+
+    def decode(self, data: memoryview) -> List[dict]:
+        return list(self.iterdecode(data))
+
+    def iterdecode(self, data: memoryview) -> Iterator[dict]:
+        try:
+            text = str(data, "utf-8")
+        except UnicodeDecodeError:
+            raise errors.CoAPException("Malformed SenML pack")
+        offset = _skip(text, 0)
+        if text[offset:offset + 1] != "[":
+            raise errors.CoAPException("Malformed SenML pack")
+        offset = _skip(text, offset + 1)
+        if text[offset:offset + 1] == "]":
+            offset += 1
+        else:
+            while True:
+                try:
+                    record, offset = self._decoder.raw_decode(text, offset)
+                except ValueError:
+                    raise errors.CoAPException("Malformed SenML pack")
+                yield self._value(record)
+                offset = _skip(text, offset)
+                if text[offset:offset + 1] == "]":
+                    offset += 1
+                    break
+                if text[offset:offset + 1] != ",":
+                    raise errors.CoAPException("Malformed SenML pack")
+                offset = _skip(text, offset + 1)
+        if _skip(text, offset) != len(text):
+            raise errors.CoAPException("Malformed SenML pack")
+
+
+def _skip(text: str, offset: int) -> int:
+    while offset < len(text) and text[offset] in " \t\n\r":
+        offset += 1
+    return offset
+
+
+class SenMLCBORCodec(Codec):
+    """
+    application/senml+cbor (RFC 8428). The same records as SenML JSON, with the labels replaced by their integer keys.
+    """
+    content_type = defines.ContentType.application_senml_cbor
+
+    def iterencode(self, value: Iterable[dict]) -> Iterator[bytes]:
+        if not hasattr(value, "__len__"):
+            # the count heads the array: a generator of records is encoded before it is known
+            records = [self._record(record) for record in value]
+            yield cbor.array_header(len(records))
+            yield from records
+            return
+        yield cbor.array_header(len(value))
+        for record in value:
+            yield self._record(record)
+
+    @staticmethod
+    def _record(record: dict) -> bytes:
+        return cbor.dumps({SENML_LABELS.get(label, label): v for label, v in record.items()})
+
+    def decode(self, data: memoryview) -> List[dict]:
+        return list(self.iterdecode(data))
+
+    def iterdecode(self, data: memoryview) -> Iterator[dict]:
+        for record in cbor.iterloads(data):
+            if not isinstance(record, dict):
+                raise errors.CoAPException("SenML record is not a map")
+            yield {_SENML_NAMES.get(key, key): v for key, v in record.items()}
+
+
+class LinkFormatCodec(Codec):
+    """
+    application/link-format (RFC 6690). A value is a list of (target, attributes) tuples, an attribute without a
+    value maps to None.
+    """
+    content_type = defines.ContentType.application_link_format
+
+    def iterencode(self, value: Iterable[Tuple[str, Dict[str, Union[str, int, None]]]]) -> Iterator[bytes]:
+        separator = ""
+        for target, attributes in value:
+            link = [separator, "<", target, ">"]
+            for name, v in attributes.items():
+                if v is None:
+                    link.append(";{0}".format(name))
+                elif isinstance(v, int) and not isinstance(v, bool):
+                    link.append(";{0}={1}".format(name, v))
+                else:
+                    link.append(";{0}=\"{1}\"".format(name, str(v).replace("\\", "\\\\").replace("\"", "\\\"")))
+            yield "".join(link).encode("utf-8")
+            separator = ","
+
+    def decode(self, data: memoryview) -> List[Tuple[str, Dict[str, Union[str, int, None]]]]:
+        return list(self.iterdecode(data))
+
+    def iterdecode(self, data: memoryview) -> Iterator[Tuple[str, Dict[str, Union[str, int, None]]]]:
+        try:
+            text = str(data, "utf-8")
+        except UnicodeDecodeError:
+            raise errors.CoAPException("Malformed link-format payload")
+        offset = _skip(text, 0)
+        while offset < len(text):
+            if text[offset] != "<":
+                raise errors.CoAPException("Malformed link-format payload")
+            end = text.find(">", offset)
+            if end < 0:
+                raise errors.CoAPException("Malformed link-format payload")
+            target = text[offset + 1:end]
+            attributes = {}
+            offset = end + 1
+            while offset < len(text) and text[offset] == ";":
+                offset += 1
+                end = offset
+                while end < len(text) and text[end] not in "=;,":
+                    end += 1
+                name = text[offset:end].strip()
+                offset = end
+                if offset < len(text) and text[offset] == "=":
+                    v, offset = _attribute(text, offset + 1)
+                else:
+                    v = None
+                attributes[name] = v
+            yield target, attributes
+            offset = _skip(text, offset)
+            if offset < len(text):
+                if text[offset] != ",":
+                    raise errors.CoAPException("Malformed link-format payload")
+                offset = _skip(text, offset + 1)
+
+
+def _attribute(text: str, offset: int) -> Tuple[Union[str, int], int]:
+    if text[offset:offset + 1] == "\"":
+        chunks = []
+        offset += 1
+        while offset < len(text) and text[offset] != "\"":
+            if text[offset] == "\\":
+                offset += 1
+            chunks.append(text[offset:offset + 1])
+            offset += 1
+        if offset >= len(text):
+            raise errors.CoAPException("Malformed link-format payload")
+        return "".join(chunks), offset + 1
+    end = offset
+    while end < len(text) and text[end] not in ";,":
+        end += 1
+    v = text[offset:end]
+    return (int(v) if v.isdigit() else v), end
+
+
+_codecs = {}
+
+
+def register(codec: Codec):
+    """
+    Register a codec, replacing the one of the same Content-Format.
+
+    :param codec: the codec
+    """
+    _codecs[int(codec.content_type)] = codec
+
+
+def get(content_type: Union[defines.ContentType, int]) -> Codec:
+    """
+    Return the codec of a Content-Format.
+
+    :param content_type: the Content-Format
+    :return: the codec
+    :raise CoAPException: if no codec is registered for it
+    """
+    codec = _codecs.get(int(content_type), None)
+    if codec is None:
+        raise errors.CoAPException("No codec for Content-Format {0}".format(int(content_type)))
+    return codec
+
+
+def encode(value, content_type: Union[defines.ContentType, int]) -> bytes:
+    """
+    Encode a value in a Content-Format.
+
+    :param value: the value
+    :param content_type: the Content-Format
+    :return: the payload
+    """
+    return get(content_type).encode(value)
+
+
+def iterencode(value, content_type: Union[defines.ContentType, int]) -> Iterator[bytes]:
+    """
+    Encode a value in a Content-Format, in chunks.
+
+    :param value: the value
+    :param content_type: the Content-Format
+    :return: an iterator on the chunks of the payload
+    """
+    return get(content_type).iterencode(value)
+
+
+def decode(data: Union[bytes, memoryview], content_type: Union[defines.ContentType, int]):
+    """
+    Decode a payload of a Content-Format.
+
+    :param data: the payload, a memoryview is decoded without copying it first
+    :param content_type: the Content-Format
+    :return: the value
+    """
+    return get(content_type).decode(memoryview(data))
+
+
+def iterdecode(data: Union[bytes, memoryview], content_type: Union[defines.ContentType, int]) -> Iterator:
+    """
+    Decode the items of a payload of a Content-Format one at a time, e.g. the records of a large SenML pack.
+
+    :param data: the payload, a memoryview is decoded without copying it first
+    :param content_type: the Content-Format
+    :return: an iterator on the items
+    """
+    return get(content_type).iterdecode(memoryview(data))
+
+
+for _codec in (TextCodec(), JSONCodec(), CBORCodec(), SenMLJSONCodec(), SenMLCBORCodec(), LinkFormatCodec()):
+    register(_codec)
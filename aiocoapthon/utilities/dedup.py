@@ -0,0 +1,100 @@
+import collections
+import time
+from typing import Optional, Tuple, Callable
+
+from aiocoapthon.utilities import defines
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class DeduplicationCache(object):
+    """
+    Store the serialized reply sent to each received request, keyed by (peer, MID), so that a retransmitted
+    request can be answered by sending the same bytes again without going through the layers.
+    """
+
+    def __init__(self, lifetime: float = defines.EXCHANGE_LIFETIME,
+                 max_bytes: int = defines.DEDUPLICATION_CACHE_BYTES, timer: Callable[[], float] = time.monotonic):
+        """
+        Initialize the cache.
+
+        :param lifetime: how long a reply is kept
+        :param max_bytes: the memory budget, as the sum of the length of the stored replies
+        :param timer: the clock used to expire the replies
+        """
+        self._lifetime = lifetime
+        self._max_bytes = max_bytes
+        self._timer = timer
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(peer: Tuple, mid: int) -> Tuple[str, int, int]:
+        host, port = peer[:2]
+        return str(host).lower(), port, mid
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (timestamp, _, raw) = next(iter(self._entries.items()))
+            if now - timestamp < self._lifetime:
+                break
+            del self._entries[key]
+            self._size -= len(raw)
+            self.expired += 1
+
+    def store(self, peer: Tuple, mid: int, raw: bytes, token: Optional[bytes] = None):
+        """
+        Store the reply sent to a request, replacing the previous one.
+
+        :param peer: the (host, port) of the peer that sent the request
+        :param mid: the MID of the request
+        :param raw: the serialized reply
+        :param token: the token of the request
+        """
+        if len(raw) > self._max_bytes:  # pragma: no cover
+            return
+        now = self._timer()
+        self._expire(now)
+        key = self._key(peer, mid)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old[2])
+        self._entries[key] = (now, token or b"", raw)
+        self._size += len(raw)
+        while self._size > self._max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evicted += 1
+
+    def get(self, peer: Tuple, mid: int, token: Optional[bytes] = None) -> Optional[bytes]:
+        """
+        Return the reply sent to a request. A request reusing the MID with a different token is not a duplicate.
+
+        :param peer: the (host, port) of the peer that sent the request
+        :param mid: the MID of the request
+        :param token: the token of the request
+        :return: the serialized reply or None if not present
+        """
+        self._expire(self._timer())
+        entry = self._entries.get(self._key(peer, mid), None)
+        if entry is None or entry[1] != (token or b""):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def stats(self) -> dict:
+        """
+        Return the statistics of the cache.
+
+        :return: a dict with the statistics
+        """
+        return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self._max_bytes,
+                "hits": self.hits, "misses": self.misses, "expired": self.expired, "evicted": self.evicted}
+
+    def __len__(self):
+        return len(self._entries)
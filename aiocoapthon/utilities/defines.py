@@ -23,6 +23,12 @@ MAX_RTT = (2 * MAX_LATENCY) + PROCESSING_DELAY
 
 EXCHANGE_LIFETIME = MAX_TRANSMIT_SPAN + (2 * MAX_LATENCY) + PROCESSING_DELAY
 
+# RFC 7252, Section 8.2: time within which a server answers a multicast request, at a random point
+DEFAULT_LEISURE = 5
+
+# how long a multicast client collects responses: the leisure of the servers plus a round trip
+MULTICAST_WINDOW = DEFAULT_LEISURE + ACK_TIMEOUT
+
 DISCOVERY_URL = "/.well-known/core"
 
 ALL_COAP_NODES = "224.0.1.187"
@@ -37,6 +43,15 @@ MAX_LOST_NOTIFICATION = 2
 
 BLOCKWISE_SIZE = 1024
 
+# RFC 8323, Section 6: SZX=7 (decoded as a size of 2048) means BERT on reliable transports. A BERT block carries one
+# or more units of 1024 bytes, and NUM counts units. Use Message.bert_block to set it.
+BERT = 2048
+BERT_UNIT = 1024
+BERT_MAX_SIZE = 64 * 1024
+
+# OSCORE (RFC 8613): the size of the replay window of a recipient context, in sequence numbers
+OSCORE_REPLAY_WINDOW = 32
+
 VERSION = 1
 # One byte which indicates indicates the end of options and the start of the payload.
 PAYLOAD_MARKER = 0xFF
@@ -51,6 +66,62 @@ OBSERVING_JITTER = 5
 
 RECEIVING_BUFFER = 4096
 
+MAX_IN_FLIGHT = 64
+
+TOKEN_LENGTH = 4
+
+# the rest of a token is random: with the default length, 2 random bytes keep tokens unpredictable
+TOKEN_SEQUENCE_LENGTH = 2
+
+MID_SPACE_SIZE = 65536
+
+MID_SPACE_MAX_PEERS = 65536
+
+DEDUPLICATION_CACHE_BYTES = 4 * 1024 * 1024
+
+ADMISSION_RATE = 500
+ADMISSION_BURST = 1000
+ADMISSION_MAX_IN_FLIGHT = 1024
+ADMISSION_MAX_PEERS = 10000
+ADMISSION_RETRY_AFTER = 5
+
+POOL_SIZE = 4096
+
+METRICS_HTTP_PORT = 9683
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_LOOP_LAG_INTERVAL = 1.0
+
+TRACE_SAMPLE_RATE = 0.01
+TRACE_BUFFER_RECORDS = 65536
+
+# RFC 8323: CoAP over TCP
+TCP_DEFAULT_MAX_MESSAGE_SIZE = 1152  # assumed for the peer until its CSM arrives
+TCP_MAX_MESSAGE_SIZE = 1024 * 1024  # advertised in our CSM
+TCP_PING_TIMEOUT = 10
+
+# DTLS (RFC 6347), the transport of coaps URIs
+COAPS_PORT = 5684
+DTLS_MAX_SESSIONS = 32768  # established sessions, about 50 KiB each
+DTLS_SESSION_TIMEOUT = 3600  # idle sessions are dropped after this many seconds
+DTLS_MAX_HANDSHAKES = 1024  # handshakes in progress, including those waiting for the cookie
+DTLS_HANDSHAKE_TIMEOUT = 60
+DTLS_RETRANSMIT_TIMEOUT = 1  # doubled at every retransmission of a flight
+DTLS_MTU = 1280
+
+# Resource Directory (RFC 9176): registration lifetimes, in seconds
+RD_DEFAULT_LIFETIME = 90000
+RD_MAX_LIFETIME = 4294967295
+
+# Persistence of the observe relations and of the resources, see CoAPServer
+PERSISTENCE_SNAPSHOT_INTERVAL = 30  # seconds between the periodic snapshots
+OBSERVE_RESTORE_BATCH = 256  # restored relations rebuilt at each pass of the Max-Age notifier
+OBSERVE_RESTORE_INTERVAL = 1  # seconds between those passes, until all the relations are rebuilt
+
+WATCHDOG_LAG_THRESHOLD = 1.0
+WATCHDOG_INTERVAL = 0.25
+WATCHDOG_TASKS_INTERVAL = 5.0
+
 
 class Origin(enum.IntEnum):
     LOCAL = 0
@@ -81,6 +152,7 @@ class OptionRegistry(enum.IntEnum):
     OBSERVE = 6
     URI_PORT = 7
     LOCATION_PATH = 8
+    OSCORE = 9
     URI_PATH = 11
     CONTENT_TYPE = 12
     MAX_AGE = 14
@@ -190,6 +262,7 @@ OptionRegistry.URI_PORT.format = OptionType.INTEGER
 OptionRegistry.URI_PORT.default = 5683
 OptionRegistry.LOCATION_PATH.format = OptionType.STRING
 OptionRegistry.LOCATION_PATH.repeatable = True
+OptionRegistry.OSCORE.format = OptionType.OPAQUE
 OptionRegistry.URI_PATH.format = OptionType.STRING
 OptionRegistry.URI_PATH.repeatable = True
 OptionRegistry.CONTENT_TYPE.format = OptionType.INTEGER
@@ -223,6 +296,10 @@ class Code(enum.IntEnum):
     POST = 2
     PUT = 3
     DELETE = 4
+    # RFC 8132
+    FETCH = 5
+    PATCH = 6
+    IPATCH = 7
 
     CREATED = 65
     DELETED = 66
@@ -232,14 +309,18 @@ class Code(enum.IntEnum):
     CONTINUE = 95
 
     BAD_REQUEST = 128
+    UNAUTHORIZED = 129
+    BAD_OPTION = 130
     FORBIDDEN = 131
     NOT_FOUND = 132
     METHOD_NOT_ALLOWED = 133
     NOT_ACCEPTABLE = 134
     REQUEST_ENTITY_INCOMPLETE = 136
+    CONFLICT = 137
     PRECONDITION_FAILED = 140
     REQUEST_ENTITY_TOO_LARGE = 141
     UNSUPPORTED_CONTENT_FORMAT = 143
+    UNPROCESSABLE_ENTITY = 150
 
     INTERNAL_SERVER_ERROR = 160
     NOT_IMPLEMENTED = 161
@@ -252,6 +333,48 @@ class Code(enum.IntEnum):
         return self.value >= 128
 
 
+class Signal(enum.IntEnum):
+    """
+    Signaling codes of CoAP over reliable transports (RFC 8323, Section 5), class 7.
+    """
+    CSM = 225
+    PING = 226
+    PONG = 227
+    RELEASE = 228
+    ABORT = 229
+
+
+class CSMOption(enum.IntEnum):
+    """
+    Options of the Capabilities and Settings Message (RFC 8323, Section 5.3). The option numbers of the signaling
+    messages are specific to each signal, hence one enum per signal.
+    """
+    MAX_MESSAGE_SIZE = 2
+    BLOCK_WISE_TRANSFER = 4
+
+
+class PingOption(enum.IntEnum):
+    """
+    Options of the Ping and Pong messages (RFC 8323, Section 5.4).
+    """
+    CUSTODY = 2
+
+
+class ReleaseOption(enum.IntEnum):
+    """
+    Options of the Release message (RFC 8323, Section 5.5).
+    """
+    ALTERNATIVE_ADDRESS = 2
+    HOLD_OFF = 4
+
+
+class AbortOption(enum.IntEnum):
+    """
+    Options of the Abort message (RFC 8323, Section 5.6).
+    """
+    BAD_CSM_OPTION = 2
+
+
 class ContentType(enum.IntEnum):
     TEXT_PLAIN = 0
     application_link_format = 40
@@ -259,6 +382,8 @@ class ContentType(enum.IntEnum):
     application_octet_stream = 42
     application_exi = 47
     application_json = 50
+    application_json_patch_json = 51
+    application_merge_patch_json = 52
     application_cbor = 60
     application_senml_json = 110
     application_senml_cbor = 112
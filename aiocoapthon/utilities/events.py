@@ -0,0 +1,153 @@
+import json
+import logging
+import sys
+from typing import Dict, Union
+
+__author__ = 'Giacomo Tanganelli'
+
+ROOT = "aiocoapthon"
+
+_subsystems = {}
+
+# report the caller of debug(), info(), ... rather than this module, where logging supports it (Python 3.8)
+_STACKLEVEL = {"stacklevel": 3} if sys.version_info >= (3, 8) else {}
+
+
+class Event(object):
+    """
+    A structured log event. The fields are formatted only when a handler renders the record, so events below the
+    level of their logger cost only the level check.
+    """
+    __slots__ = ("name", "fields")
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+
+    def __str__(self):
+        if not self.fields:
+            return self.name
+        return self.name + " " + " ".join("{0}={1}".format(key, value) for key, value in self.fields.items())
+
+
+class EventLogger(object):
+    """
+    Logger emitting structured events. The records carry the event name and fields in the "event" and "fields"
+    attributes, for handlers that want them as data.
+    """
+    __slots__ = ("subsystem", "_logger")
+
+    def __init__(self, name: str):
+        """
+        Initialize the logger.
+
+        :param name: the name of the underlying logging.Logger, usually the module name
+        """
+        self.subsystem = name[len(ROOT) + 1:] if name.startswith(ROOT + ".") else name
+        self._logger = logging.getLogger(name)
+
+    def enabled(self, level: int) -> bool:
+        """
+        Check if events of a level are emitted, to guard the code that computes expensive fields.
+
+        :param level: the logging level
+        :return: True, if the events are emitted
+        """
+        return self._logger.isEnabledFor(level)
+
+    def _emit(self, level: int, event: str, fields: dict, exc_info=None):
+        self._logger.log(level, Event(event, fields), exc_info=exc_info, extra={"event": event, "fields": fields},
+                         **_STACKLEVEL)
+
+    def debug(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        """
+        Log an error event with the exception being handled.
+        """
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name: str) -> EventLogger:
+    """
+    Return the event logger of a module, registering its subsystem.
+
+    :param name: the module name
+    :return: the event logger
+    """
+    logger = EventLogger(name)
+    _subsystems[logger.subsystem] = logger
+    return logger
+
+
+def parse_level(level: Union[int, str]) -> int:
+    """
+    Convert a level name such as "DEBUG" to its number.
+
+    :param level: the level, as a number or a name
+    :return: the level number
+    :raise ValueError: if the level is unknown
+    """
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(level.strip().upper())
+    if not isinstance(value, int):
+        raise ValueError("Unknown level {0}".format(level.strip()))
+    return value
+
+
+def set_level(subsystem: str, level: Union[int, str]):
+    """
+    Change at runtime the level of a subsystem. A subsystem is a logger name relative to the package, so "layers"
+    changes every layer that has no level of its own and "" changes the whole package.
+
+    :param subsystem: the subsystem, e.g. "protocol.coap_protocol" or "layers"
+    :param level: the level, as a number or a name such as "DEBUG"
+    :raise ValueError: if the level is unknown
+    """
+    logging.getLogger(ROOT + "." + subsystem if subsystem else ROOT).setLevel(parse_level(level))
+
+
+def levels() -> Dict[str, str]:
+    """
+    Return the effective level of every registered subsystem.
+
+    :return: a dict subsystem -> level name
+    """
+    return {subsystem: logging.getLevelName(logger._logger.getEffectiveLevel())
+            for subsystem, logger in sorted(_subsystems.items())}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Render records as one JSON object per line. The fields of an event are under "fields", so that they never
+    overwrite the keys of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {"time": record.created, "level": record.levelname, "logger": record.name}
+        event = getattr(record, "event", None)
+        if event is not None:
+            data["event"] = event
+            data["fields"] = {key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+                              for key, value in record.fields.items()}
+        else:
+            data["message"] = record.getMessage()
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data)
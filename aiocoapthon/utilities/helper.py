@@ -36,7 +36,12 @@ class Helper(object):  # pragma: no cover
             if m == 1:
                 del request.mid
                 del request.block2
-                request.block2 = (num + 1, 0, size)
+                if size == defines.BERT:
+                    # NUM counts the units carried by the BERT block
+                    num += len(response.payload) // defines.BERT_UNIT
+                    request.bert_block(defines.OptionRegistry.BLOCK2, num, 0)
+                else:
+                    request.block2 = (num + 1, 0, size)
                 transaction = await self.send_request(request)
                 response = await self.receive_response(transaction, timeout)
                 if response is None:
@@ -51,17 +56,25 @@ class Helper(object):  # pragma: no cover
         start = 0
         while isinstance(response, Response) and response.block1 is not None:
             num, m, size = response.block1
-            start += size
+            # a BERT block carries as many units as the one just acknowledged
+            length = len(request.payload) if size == defines.BERT else size
+            start += length
             remaining_payload = payload[start:]
-            if len(remaining_payload) > size:
+            if not remaining_payload:
+                # the only block was the last one
+                break
+            if len(remaining_payload) > length:
                 m = 1
             else:
                 m = 0
-            num += 1
+            num += length // defines.BERT_UNIT if size == defines.BERT else 1
             del request.mid
             del request.block1
-            request.block1 = (num, m, size)
-            request.payload = remaining_payload[:size]
+            if size == defines.BERT:
+                request.bert_block(defines.OptionRegistry.BLOCK1, num, m)
+            else:
+                request.block1 = (num, m, size)
+            request.payload = remaining_payload[:length]
             transaction = await self.send_request(request)
             response = await self.receive_response(transaction, timeout)
 
@@ -105,6 +118,13 @@ class Helper(object):  # pragma: no cover
     async def delete(self, request, callback, timeout):
         return await self.get(request, callback, timeout)
 
+    async def fetch(self, request, callback, timeout):
+        # the payload goes in Block1 and the result comes in Block2, the follow-up blocks repeat the payload
+        return await self.put(request, callback, timeout)
+
+    async def patch(self, request, callback, timeout):
+        return await self.put(request, callback, timeout)
+
     async def observe(self, request, callback=None, queue=None, stop=None, timeout=None, **kwargs):  # pragma: no cover
         transaction = await self.send_request(request)
         response = await self.receive_response(transaction, timeout)
@@ -0,0 +1,363 @@
+import asyncio
+import math
+from typing import Tuple, Callable, Dict, Optional, Union, List
+
+from aiocoapthon.utilities import defines, events
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """
+    Base class of the metrics. A metric holds one value for each combination of label values.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        """
+        Initialize the metric.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _labels(self, values: Tuple, extra: str = "") -> str:
+        pairs = ["{0}=\"{1}\"".format(name, _escape(value)) for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(pairs) + "}"
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """
+        Return the samples of the metric.
+
+        :return: a list of (name suffix, labels, value)
+        """
+        return [("", self._labels(labels), value) for labels, value in sorted(self._values.items())]
+
+    def value(self, *labels):
+        """
+        Return the current value for the given label values.
+
+        :return: the value, or None if never set
+        """
+        return self._values.get(labels, None)
+
+    def remove(self, *labels):
+        """
+        Drop the series of the given label values, e.g. of a resource that no longer exists.
+        """
+        self._values.pop(labels, None)
+
+    def render(self) -> str:
+        """
+        Render the metric in the Prometheus text format.
+
+        :return: the text
+        """
+        lines = ["# HELP {0} {1}".format(self.name, self.documentation.replace("\n", " ")),
+                 "# TYPE {0} {1}".format(self.name, self.kind)]
+        for suffix, labels, value in self.samples():
+            lines.append("{0}{1}{2} {3}".format(self.name, suffix, labels, _format(value)))
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value.
+    """
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        """
+        Increase the counter.
+
+        :param labels: the label values
+        :param amount: the increment
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down. A gauge can also be computed on collection by a function, returning either a
+    number or a dict label values -> number.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 function: Callable[[], Union[float, Dict[Tuple, float]]] = None):
+        """
+        Initialize the gauge.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        :param function: the function computing the value on collection
+        """
+        super().__init__(name, documentation, labels)
+        self._function = function
+
+    def set(self, value: float, *labels):
+        """
+        Set the gauge.
+
+        :param value: the value
+        :param labels: the label values
+        """
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        """
+        Increase the gauge.
+
+        :param labels: the label values
+        :param amount: the increment
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        """
+        Decrease the gauge.
+
+        :param labels: the label values
+        :param amount: the decrement
+        """
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def collect(self):
+        """
+        Refresh the value from the function, if any.
+        """
+        if self._function is None:
+            return
+        value = self._function()
+        if isinstance(value, dict):
+            self._values = dict(value)
+        else:
+            self._values = {(): value}
+
+    def value(self, *labels):
+        self.collect()
+        return super().value(*labels)
+
+    def samples(self):
+        self.collect()
+        return super().samples()
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over cumulative buckets.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = defines.METRICS_LATENCY_BUCKETS):
+        """
+        Initialize the histogram.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        :param buckets: the upper bounds of the buckets
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        """
+        Record a value.
+
+        :param value: the observed value
+        :param labels: the label values
+        """
+        entry = self._values.get(labels, None)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = entry[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def value(self, *labels):
+        """
+        Return the number of observations and their sum for the given label values.
+
+        :return: (count, sum), or None if nothing was observed
+        """
+        entry = self._values.get(labels, None)
+        if entry is None:
+            return None
+        return entry[2], entry[1]
+
+    def samples(self):
+        ret = []
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                ret.append(("_bucket", self._labels(labels, "le=\"{0}\"".format(_format(bound))), cumulative))
+            ret.append(("_bucket", self._labels(labels, "le=\"+Inf\""), count))
+            ret.append(("_sum", self._labels(labels), total))
+            ret.append(("_count", self._labels(labels), count))
+        return ret
+
+
+class MetricsRegistry(object):
+    """
+    Collection of metrics rendered together.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        """
+        Register a counter, or return the one already registered with the same name.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        :return: the counter
+        """
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+              function: Callable[[], Union[float, Dict[Tuple, float]]] = None) -> Gauge:
+        """
+        Register a gauge, or return the one already registered with the same name.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        :param function: the function computing the value on collection
+        :return: the gauge
+        """
+        return self._register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = defines.METRICS_LATENCY_BUCKETS) -> Histogram:
+        """
+        Register a histogram, or return the one already registered with the same name.
+
+        :param name: the metric name
+        :param documentation: the help text
+        :param labels: the label names
+        :param buckets: the upper bounds of the buckets
+        :return: the histogram
+        """
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        """
+        Return a metric by name.
+
+        :param name: the metric name
+        :return: the metric or None
+        """
+        return self._metrics.get(name, None)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+
+        :return: the text
+        """
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+class MetricsExporter(object):
+    """
+    Minimal HTTP server exposing a registry in the Prometheus text format at /metrics.
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = defines.METRICS_HTTP_PORT):
+        """
+        Initialize the exporter.
+
+        :param registry: the registry to expose
+        :param host: the address to listen on
+        :param port: the port to listen on
+        """
+        self._registry = registry
+        self._host = host
+        self._port = port
+        self._server = None
+
+    @property
+    def port(self) -> int:
+        """
+        Return the port the exporter listens on, useful when started on port 0.
+
+        :return: the port
+        """
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self):
+        """
+        Start listening.
+        """
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+
+    def stop(self):
+        """
+        Stop listening.
+        """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status = "200 OK"
+                body = self._registry.render().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+            writer.write("HTTP/1.1 {0}\r\nContent-Type: {1}\r\nContent-Length: {2}\r\nConnection: close\r\n\r\n"
+                         .format(status, defines.METRICS_CONTENT_TYPE, len(body)).encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):  # pragma: no cover
+            logger.debug("metrics_connection_closed")
+        finally:
+            writer.close()
@@ -0,0 +1,285 @@
+import hashlib
+import hmac
+from typing import Optional, Tuple
+
+from aiocoapthon.utilities import cbor, defines, errors
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESCCM
+except ImportError:  # pragma: no cover
+    AESCCM = None
+    InvalidTag = None
+
+__author__ = 'Giacomo Tanganelli'
+
+# AES-CCM-16-64-128 (RFC 8152, Section 10.2), the mandatory AEAD algorithm of OSCORE
+AES_CCM_16_64_128 = 10
+_KEY_LENGTH = 16
+_NONCE_LENGTH = 13
+_TAG_LENGTH = 8
+
+# the largest Partial IV is 5 bytes long
+MAX_SEQUENCE_NUMBER = (1 << 40) - 1
+
+# [ "Encrypt0", h'', external_aad ], without its last item
+_ENC_STRUCTURE = bytes([0x83]) + cbor.dumps("Encrypt0") + cbor.dumps(b"")
+# aad_array = [ oscore_version: 1, algorithms, request_kid, request_piv, options: h'' ]
+_AAD_ARRAY = bytes([0x85]) + cbor.dumps(1)
+_NO_OPTIONS = cbor.dumps(b"")
+
+
+def hkdf(salt: bytes, secret: bytes, info: bytes, length: int) -> bytes:
+    """
+    HKDF with SHA-256 (RFC 5869).
+
+    :param salt: the salt, an empty salt stands for a string of zeros
+    :param secret: the input keying material
+    :param info: the context information
+    :param length: the length of the output keying material
+    :return: the output keying material
+    """
+    prk = hmac.new(salt or bytes(hashlib.sha256().digest_size), secret, hashlib.sha256).digest()
+    okm = b""
+    block = b""
+    counter = 1
+    while len(okm) < length:
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        okm += block
+        counter += 1
+    return okm[:length]
+
+
+def partial_iv(sequence_number: int) -> bytes:
+    """
+    Encode a sequence number as a Partial IV, in the fewest bytes.
+
+    :param sequence_number: the sequence number
+    :return: the Partial IV
+    """
+    return sequence_number.to_bytes(max(1, (sequence_number.bit_length() + 7) // 8), 'big')
+
+
+def encode_option(piv: Optional[bytes] = None, kid: Optional[bytes] = None,
+                  kid_context: Optional[bytes] = None) -> bytes:
+    """
+    Encode the value of the OSCORE option (RFC 8613, Section 6.1).
+
+    :param piv: the Partial IV, None to omit it
+    :param kid: the key identifier, None to omit it
+    :param kid_context: the key identifier context, None to omit it
+    :return: the option value, empty if all the fields are omitted
+    """
+    flags = 0
+    value = b""
+    if piv is not None:
+        flags |= len(piv)
+        value += piv
+    if kid_context is not None:
+        flags |= 0x10
+        value += bytes([len(kid_context)]) + kid_context
+    if kid is not None:
+        flags |= 0x08
+        value += kid
+    if flags == 0:
+        return b""
+    return bytes([flags]) + value
+
+
+def decode_option(value: bytes) -> Tuple[Optional[bytes], Optional[bytes], Optional[bytes]]:
+    """
+    Decode the value of the OSCORE option.
+
+    :param value: the option value
+    :return: (Partial IV, kid, kid context), None for the omitted fields
+    :raise CoAPException: if the option is malformed
+    """
+    if not value:
+        return None, None, None
+    flags = value[0]
+    n = flags & 0x07
+    if flags & 0xE0 or n > 5:
+        raise errors.CoAPException("Malformed OSCORE option")
+    data = value[1:]
+    if len(data) < n:
+        raise errors.CoAPException("Malformed OSCORE option")
+    piv = data[:n] if n else None
+    data = data[n:]
+    kid_context = None
+    if flags & 0x10:
+        if not data or len(data) < 1 + data[0]:
+            raise errors.CoAPException("Malformed OSCORE option")
+        kid_context = data[1:1 + data[0]]
+        data = data[1 + data[0]:]
+    kid = None
+    if flags & 0x08:
+        kid = data
+    elif data:
+        raise errors.CoAPException("Malformed OSCORE option")
+    return piv, kid, kid_context
+
+
+class ReplayWindow(object):
+    """
+    Sliding replay window of a recipient context (RFC 8613, Section 7.4), kept as a bitmap. Bit i is set if the
+    sequence number highest - i was received.
+    """
+    __slots__ = ("size", "_highest", "_bitmap")
+
+    def __init__(self, size: int = defines.OSCORE_REPLAY_WINDOW):
+        """
+        Initialize the window.
+
+        :param size: the number of sequence numbers tracked below the highest received
+        """
+        self.size = size
+        self._highest = -1
+        self._bitmap = 0
+
+    def check(self, sequence_number: int) -> bool:
+        """
+        Check that a sequence number was not received yet and is not too old.
+
+        :param sequence_number: the sequence number
+        :return: True, if the message must be processed
+        """
+        if sequence_number > self._highest:
+            return True
+        offset = self._highest - sequence_number
+        if offset >= self.size:
+            return False
+        return not (self._bitmap >> offset) & 1
+
+    def accept(self, sequence_number: int):
+        """
+        Record a sequence number, after the message was verified.
+
+        :param sequence_number: the sequence number
+        """
+        if sequence_number > self._highest:
+            shift = sequence_number - self._highest
+            self._bitmap = ((self._bitmap << shift) | 1) & ((1 << self.size) - 1)
+            self._highest = sequence_number
+        else:
+            self._bitmap |= 1 << (self._highest - sequence_number)
+
+
+class SecurityContext(object):
+    """
+    OSCORE security context (RFC 8613, Section 3) shared by two endpoints. The sender and recipient keys and the
+    Common IV are derived once, and the AEAD cipher objects are kept for the life of the context.
+    """
+
+    def __init__(self, master_secret: bytes, sender_id: bytes, recipient_id: bytes, master_salt: bytes = b"",
+                 id_context: Optional[bytes] = None, alg: int = AES_CCM_16_64_128,
+                 replay_window: int = defines.OSCORE_REPLAY_WINDOW):
+        """
+        Derive a security context.
+
+        :param master_secret: the Master Secret
+        :param sender_id: our Sender ID, the Recipient ID of the peer
+        :param recipient_id: our Recipient ID, the Sender ID of the peer
+        :param master_salt: the Master Salt
+        :param id_context: the ID Context, None if absent
+        :param alg: the AEAD algorithm, only AES-CCM-16-64-128 is supported
+        :param replay_window: the size of the replay window
+        :raise CoAPException: if the algorithm is not supported or the cryptography package is missing
+        """
+        if alg != AES_CCM_16_64_128:
+            raise errors.CoAPException("Unsupported AEAD algorithm {0}".format(alg))
+        if AESCCM is None:  # pragma: no cover
+            raise errors.CoAPException("OSCORE requires the cryptography package")
+        if max(len(sender_id), len(recipient_id)) > _NONCE_LENGTH - 6:
+            raise errors.CoAPException("Sender and Recipient IDs are at most {0} bytes".format(_NONCE_LENGTH - 6))
+        self.sender_id = sender_id
+        self.recipient_id = recipient_id
+        self.id_context = id_context
+        self.alg = alg
+        self.sender_key = self._derive(master_secret, master_salt, sender_id, "Key", _KEY_LENGTH)
+        self.recipient_key = self._derive(master_secret, master_salt, recipient_id, "Key", _KEY_LENGTH)
+        self.common_iv = self._derive(master_secret, master_salt, b"", "IV", _NONCE_LENGTH)
+        self.sequence_number = 0
+        self.replay = ReplayWindow(replay_window)
+        self._sender = AESCCM(self.sender_key, tag_length=_TAG_LENGTH)
+        self._recipient = AESCCM(self.recipient_key, tag_length=_TAG_LENGTH)
+        self._algorithms = cbor.dumps([alg])
+        # the nonce is the Common IV xor the ID_PIV part xor the padded Partial IV, only the last one varies
+        iv = int.from_bytes(self.common_iv, 'big')
+        self._sender_nonce = iv ^ self._id_part(sender_id)
+        self._recipient_nonce = iv ^ self._id_part(recipient_id)
+
+    def _derive(self, master_secret: bytes, master_salt: bytes, identifier: bytes, kind: str, length: int) -> bytes:
+        info = cbor.dumps([identifier, self.id_context, self.alg, kind, length])
+        return hkdf(master_salt, master_secret, info, length)
+
+    @staticmethod
+    def _id_part(identifier: bytes) -> int:
+        return (len(identifier) << (8 * (_NONCE_LENGTH - 1))) | (int.from_bytes(identifier, 'big') << 40)
+
+    def next_piv(self) -> bytes:
+        """
+        Consume a sequence number of the sender.
+
+        :return: the Partial IV
+        :raise CoAPException: if the sequence numbers are exhausted, and the context must be renewed
+        """
+        if self.sequence_number > MAX_SEQUENCE_NUMBER:
+            raise errors.CoAPException("OSCORE sequence numbers exhausted")
+        piv = partial_iv(self.sequence_number)
+        self.sequence_number += 1
+        return piv
+
+    def sender_nonce(self, piv: bytes) -> bytes:
+        """
+        Return the nonce of a Partial IV generated by us.
+
+        :param piv: the Partial IV
+        :return: the AEAD nonce
+        """
+        return (self._sender_nonce ^ int.from_bytes(piv, 'big')).to_bytes(_NONCE_LENGTH, 'big')
+
+    def recipient_nonce(self, piv: bytes) -> bytes:
+        """
+        Return the nonce of a Partial IV generated by the peer.
+
+        :param piv: the Partial IV
+        :return: the AEAD nonce
+        """
+        return (self._recipient_nonce ^ int.from_bytes(piv, 'big')).to_bytes(_NONCE_LENGTH, 'big')
+
+    def aad(self, request_kid: bytes, request_piv: bytes) -> bytes:
+        """
+        Return the Additional Authenticated Data, the same for a request and its responses.
+
+        :param request_kid: the Sender ID of the client
+        :param request_piv: the Partial IV of the request
+        :return: the encoded Enc_structure
+        """
+        external = _AAD_ARRAY + self._algorithms + cbor.dumps(request_kid) + cbor.dumps(request_piv) + _NO_OPTIONS
+        return _ENC_STRUCTURE + cbor.dumps(external)
+
+    def encrypt(self, nonce: bytes, plaintext: bytes, aad: bytes) -> bytes:
+        """
+        Encrypt with the Sender Key.
+
+        :param nonce: the AEAD nonce
+        :param plaintext: the plaintext
+        :param aad: the Additional Authenticated Data
+        :return: the ciphertext, including the tag
+        """
+        return self._sender.encrypt(nonce, plaintext, aad)
+
+    def decrypt(self, nonce: bytes, ciphertext: bytes, aad: bytes) -> bytes:
+        """
+        Decrypt with the Recipient Key.
+
+        :param nonce: the AEAD nonce
+        :param ciphertext: the ciphertext, including the tag
+        :param aad: the Additional Authenticated Data
+        :return: the plaintext
+        :raise CoAPException: if the message cannot be authenticated
+        """
+        try:
+            return self._recipient.decrypt(nonce, ciphertext, aad)
+        except (InvalidTag, ValueError):
+            raise errors.CoAPException("OSCORE decryption failed")
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+from typing import Optional, Tuple, List
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class RelationRecord(object):
+    """
+    An observe relation of a server, as it is stored.
+    """
+    __slots__ = ("host", "port", "token", "path", "query", "code", "payload", "msgtype", "content_type", "sequence",
+                 "timestamp")
+
+    def __init__(self, host: str, port: int, token: bytes, path: str, query: Optional[str], code: int,
+                 payload: Optional[bytes], msgtype: int, content_type: Optional[int], sequence: Optional[int],
+                 timestamp: float):
+        """
+        Data structure to store an observe relation.
+
+        :param host: the address of the observer
+        :param port: the port of the observer
+        :param token: the token of the registration
+        :param path: the path of the observed resource
+        :param query: the Uri-Query of the registration, None if absent
+        :param code: the method of the registration, GET or FETCH
+        :param payload: the payload of a FETCH registration
+        :param msgtype: the type of the registration, CON or NON
+        :param content_type: the Content-Format of the notifications
+        :param sequence: the Observe value of the last notification
+        :param timestamp: the time of the last notification, from time.time()
+        """
+        self.host = host
+        self.port = port
+        self.token = token
+        self.path = path
+        self.query = query
+        self.code = code
+        self.payload = payload
+        self.msgtype = msgtype
+        self.content_type = content_type
+        self.sequence = sequence
+        self.timestamp = timestamp
+
+    def astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class ResourceRecord(object):
+    """
+    A resource of a server, as it is stored.
+    """
+    __slots__ = ("path", "payload", "content_type", "etag", "observe_count")
+
+    def __init__(self, path: str, payload: Optional[bytes], content_type: Optional[int], etag: Optional[bytes],
+                 observe_count: int):
+        """
+        Data structure to store a resource.
+
+        :param path: the path of the resource
+        :param payload: the payload
+        :param content_type: the Content-Format of the payload
+        :param etag: the ETag
+        :param observe_count: the Observe counter
+        """
+        self.path = path
+        self.payload = payload
+        self.content_type = content_type
+        self.etag = etag
+        self.observe_count = observe_count
+
+    def astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class Store(object):
+    """
+    Base class of the persistence backends of CoAPServer, which keep the latest snapshot of the observe relations and
+    of the resource tree across restarts. The periodic snapshots are saved from another thread.
+    """
+
+    def save(self, relations: List[RelationRecord], resources: List[ResourceRecord]):
+        """
+        Replace the stored snapshot.
+
+        :param relations: the observe relations
+        :param resources: the resources
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def load(self) -> Tuple[List[RelationRecord], List[ResourceRecord]]:
+        """
+        Read the stored snapshot.
+
+        :return: the observe relations and the resources, empty if nothing was saved
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def close(self):
+        """
+        Release the backend.
+        """
+        pass
+
+
+class SQLiteStore(Store):
+    """
+    Store the snapshot in an SQLite database. A snapshot is written in a single transaction, so a crash while saving
+    leaves the previous one. The connection is shared by the threads which save, under a lock.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the database, creating it if needed.
+
+        :param path: the database file, or ":memory:"
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS relations (host TEXT, port INTEGER, token BLOB, path TEXT, "
+                         "query TEXT, code INTEGER, payload BLOB, msgtype INTEGER, content_type INTEGER, "
+                         "sequence INTEGER, timestamp REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS resources (path TEXT PRIMARY KEY, payload BLOB, "
+                         "content_type INTEGER, etag BLOB, observe_count INTEGER)")
+        self._db.commit()
+
+    def save(self, relations: List[RelationRecord], resources: List[ResourceRecord]):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM relations")
+            self._db.execute("DELETE FROM resources")
+            self._db.executemany("INSERT INTO relations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (record.astuple() for record in relations))
+            self._db.executemany("INSERT INTO resources VALUES (?, ?, ?, ?, ?)",
+                                 (record.astuple() for record in resources))
+
+    def load(self) -> Tuple[List[RelationRecord], List[ResourceRecord]]:
+        with self._lock:
+            relations = [RelationRecord(*row) for row in self._db.execute("SELECT * FROM relations ORDER BY rowid")]
+            # parents before their children
+            resources = [ResourceRecord(*row) for row in self._db.execute("SELECT * FROM resources ORDER BY path")]
+        return relations, resources
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,176 @@
+from typing import Optional
+
+from aiocoapthon.utilities import defines, errors
+
+__author__ = 'Giacomo Tanganelli'
+
+_pools = {}
+_poisoned = {}
+
+
+class ObjectPool(object):
+    """
+    Free list of released instances of a class.
+
+    Recycled instances are returned by the __new__ of the pooled class, so the usual __init__ resets their state.
+    In debug mode released instances are switched to a poisoned subclass until they are acquired again, so that any
+    use after release raises a CoAPException.
+    """
+
+    def __init__(self, cls: type, maxsize: int = defines.POOL_SIZE, debug: bool = False):
+        """
+        Initialize the pool.
+
+        :param cls: the pooled class
+        :param maxsize: the maximum number of free instances kept
+        :param debug: True, to poison released instances
+        """
+        self._cls = cls
+        self._maxsize = maxsize
+        self._debug = debug
+        self.poisoned = _poison(cls) if debug else None
+        self._free = []
+        self._free_ids = set()
+        self.allocated = 0
+        self.reused = 0
+        self.released = 0
+        self.dropped = 0
+
+    def acquire(self):
+        """
+        Return a free instance, or a new one if the pool is empty. The instance must still be initialized.
+
+        :return: the instance
+        """
+        if self._free:
+            obj = self._free.pop()
+            self._free_ids.discard(id(obj))
+            if self._debug:
+                object.__setattr__(obj, "__class__", self._cls)
+            self.reused += 1
+            return obj
+        self.allocated += 1
+        return object.__new__(self._cls)
+
+    def release(self, obj):
+        """
+        Give back an instance that is no longer used.
+
+        :param obj: the instance
+        :raise CoAPException: in debug mode, if the instance was already released
+        """
+        if id(obj) in self._free_ids:
+            if self._debug:
+                raise errors.CoAPException("{0} released twice".format(self._cls.__name__))
+            return
+        if len(self._free) >= self._maxsize:
+            self.dropped += 1
+            return
+        if self._debug:
+            object.__setattr__(obj, "__class__", self.poisoned)
+        self._free.append(obj)
+        self._free_ids.add(id(obj))
+        self.released += 1
+
+    def stats(self) -> dict:
+        """
+        Return the statistics of the pool.
+
+        :return: a dict with the statistics
+        """
+        return {"free": len(self._free), "allocated": self.allocated, "reused": self.reused,
+                "released": self.released, "dropped": self.dropped}
+
+
+def _poison(cls: type) -> type:
+    def fail(self, *args, **kwargs):
+        raise errors.CoAPException("{0} used after release".format(cls.__name__))
+
+    return type("Released" + cls.__name__, (cls,), {"__slots__": (), "__getattribute__": fail,
+                                                    "__setattr__": fail, "__delattr__": fail})
+
+
+def new(cls: type):
+    """
+    Allocate an instance of a class, from its pool if pooling is enabled. Used by the __new__ of pooled classes.
+
+    :param cls: the class
+    :return: the uninitialized instance
+    """
+    pool = _pools.get(cls, None)
+    if pool is None:
+        return object.__new__(cls)
+    return pool.acquire()
+
+
+def release(obj):
+    """
+    Give back an object to the pool of its class, if any.
+
+    :param obj: the object
+    """
+    cls = type(obj)
+    pool = _pools.get(cls, None) or _poisoned.get(cls, None)
+    if pool is not None:
+        pool.release(obj)
+
+
+def release_transaction(transaction):
+    """
+    Give back a transaction, its messages and their options, once the exchange lifetime is over.
+
+    :param transaction: the transaction
+    """
+    for message in (transaction.request, transaction.response):
+        if message is not None:
+            for option in message.options:
+                release(option)
+            release(message)
+    release(transaction)
+
+
+def enable(maxsize: int = defines.POOL_SIZE, debug: bool = False):
+    """
+    Enable the pooling of messages, options and transactions.
+    Applications must not keep references to the messages of a server exchange after EXCHANGE_LIFETIME.
+
+    :param maxsize: the maximum number of free instances kept for each class
+    :param debug: True, to make any use of a released object raise a CoAPException
+    """
+    from aiocoapthon.messages.message import Message
+    from aiocoapthon.messages.options import Option
+    from aiocoapthon.messages.request import Request
+    from aiocoapthon.messages.response import Response
+    from aiocoapthon.utilities.transaction import Transaction
+    for cls in (Message, Request, Response, Option, Transaction):
+        _pools[cls] = ObjectPool(cls, maxsize, debug)
+        if debug:
+            _poisoned[_pools[cls].poisoned] = _pools[cls]
+
+
+def disable():
+    """
+    Disable pooling and drop the free instances.
+    """
+    _pools.clear()
+    _poisoned.clear()
+
+
+def enabled() -> bool:
+    """
+    Check if pooling is enabled.
+
+    :return: True, if pooling is enabled
+    """
+    return len(_pools) > 0
+
+
+def stats() -> Optional[dict]:
+    """
+    Return the statistics of the pools.
+
+    :return: a dict class name -> statistics, or None if pooling is disabled
+    """
+    if not _pools:
+        return None
+    return {cls.__name__: pool.stats() for cls, pool in _pools.items()}
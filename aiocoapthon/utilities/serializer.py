@@ -81,6 +81,53 @@ class Serializer(object):
                 data = data[length:]
         return data, ret
 
+    @classmethod
+    def parse_header(cls, datagram: bytes) -> Optional[Tuple[int, int, int, bytes]]:
+        """
+        Read the fixed header and the token of a datagram, without decoding options and payload.
+
+        :param datagram: the incoming udp message
+        :return: (type, code, mid, token), or None if the header is malformed
+        """
+        if len(datagram) < 4:
+            return None
+        vttkl = datagram[0]
+        tkl = vttkl & 0x0F
+        if (vttkl >> 6) != defines.VERSION or tkl > 8 or len(datagram) < 4 + tkl:
+            return None
+        return (vttkl >> 4) & 0x03, datagram[1], (datagram[2] << 8) | datagram[3], datagram[4:4 + tkl]
+
+    @classmethod
+    def is_empty(cls, datagram: bytes, header: Tuple[int, int, int, bytes]) -> bool:
+        """
+        Check if a datagram is an Empty message, that is a bare header with code 0.00.
+
+        :param datagram: the incoming udp message
+        :param header: the header returned by parse_header
+        :return: True, if the message can be built from the header alone
+        """
+        return header[1] == defines.Code.EMPTY and len(datagram) == 4 + len(header[3])
+
+    @classmethod
+    def deserialize_empty(cls, header: Tuple[int, int, int, bytes],
+                          source: Optional[Tuple[str, int]] = None) -> Message:
+        """
+        Build an Empty message from its header.
+
+        :param header: the header returned by parse_header
+        :param source: the source address and port (ip, port)
+        :return: the message
+        """
+        message_type, _, mid, token = header
+        message = Message()
+        message.code = defines.Code.EMPTY
+        if source is not None:
+            message.source = source
+        message.type = message_type
+        message.mid = mid
+        message.token = token if token else None
+        return message
+
     @classmethod
     async def deserialize(cls, datagram: bytes,
                           source: Optional[Tuple[str, int]]=None,
@@ -198,6 +245,27 @@ class Serializer(object):
             lastoptionnumber = option.number
         return data, fmt
 
+    @classmethod
+    def encode_options(cls, options: List[Option]) -> bytes:
+        """
+        Encode options alone, e.g. the inner options of an OSCORE message.
+
+        :param options: the options
+        :return: the options in the message format, sorted by number
+        """
+        data, _ = cls._serialize_options(options)
+        return b"".join(data)
+
+    @classmethod
+    def decode_options(cls, data: bytes) -> Tuple[bytes, List[Option]]:
+        """
+        Decode options up to the payload marker or the end of data.
+
+        :param data: the encoded options, possibly followed by the payload marker and the payload
+        :return: (the remaining data, the options)
+        """
+        return cls._deserialize_options(data)
+
     @classmethod
     async def serialize(cls, message: Union[Request, Response, Message], source: Optional[Tuple[str, int]] = None,
                         destination: Optional[Tuple[str, int]] = None) -> ctypes.Array:
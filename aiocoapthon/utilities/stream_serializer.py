@@ -0,0 +1,156 @@
+import asyncio
+from typing import Tuple, List, Iterable
+
+from aiocoapthon.utilities import defines, errors
+from aiocoapthon.utilities.serializer import Serializer
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class StreamSerializer(Serializer):
+    """
+    Framing of CoAP messages over reliable byte streams (RFC 8323, Section 3.2).
+
+    A frame carries Len, TKL, Code, Token, Options and Payload: there is no Version, Type or Message ID, since the
+    stream already provides reliability and ordering. Options and payload are encoded as in UDP datagrams, so frames
+    and datagrams are converted into each other without decoding the options.
+    """
+
+    @classmethod
+    def _length_header(cls, tkl: int, length: int) -> bytes:
+        if length < 13:
+            return bytes([(length << 4) | tkl])
+        elif length < 269:
+            return bytes([(13 << 4) | tkl, length - 13])
+        elif length < 65805:
+            return bytes([(14 << 4) | tkl]) + (length - 269).to_bytes(2, 'big')
+        else:
+            return bytes([(15 << 4) | tkl]) + (length - 65805).to_bytes(4, 'big')
+
+    @classmethod
+    def _split(cls, frame: bytes) -> Tuple[int, bytes, bytes]:
+        """
+        Split a frame into code, token and options with payload.
+
+        :param frame: the frame
+        :return: (code, token, body)
+        """
+        if not frame:
+            raise errors.CoAPException("Empty frame")
+        nibble = frame[0] >> 4
+        tkl = frame[0] & 0x0F
+        offset = 1 + {13: 1, 14: 2, 15: 4}.get(nibble, 0)
+        if tkl > 8 or len(frame) < offset + 1 + tkl:
+            raise errors.CoAPException("Malformed frame")
+        return frame[offset], frame[offset + 1:offset + 1 + tkl], frame[offset + 1 + tkl:]
+
+    @classmethod
+    def frame(cls, datagram: bytes) -> bytes:
+        """
+        Convert a serialized UDP message into a frame, dropping Version, Type and Message ID.
+
+        :param datagram: the message, as produced by Serializer
+        :return: the frame
+        """
+        tkl = datagram[0] & 0x0F
+        body = datagram[4 + tkl:]
+        return cls._length_header(tkl, len(body)) + datagram[1:2] + datagram[4:4 + tkl] + body
+
+    @classmethod
+    def unframe(cls, frame: bytes, mid: int, message_type: defines.Type = defines.Type.NON) -> bytes:
+        """
+        Convert a frame into a UDP message that the Serializer can decode.
+
+        :param frame: the frame
+        :param mid: the Message ID to give to the message
+        :param message_type: the type to give to the message
+        :return: the message
+        """
+        code, token, body = cls._split(frame)
+        header = bytes([(defines.VERSION << 6) | (message_type << 4) | len(token), code, (mid >> 8) & 0xFF,
+                        mid & 0xFF])
+        return header + token + body
+
+    @classmethod
+    def signal(cls, code: defines.Signal, token: bytes = b"", options: Iterable[Tuple[int, bytes]] = (),
+               payload: bytes = b"") -> bytes:
+        """
+        Build a signaling message.
+
+        :param code: the signal
+        :param token: the token
+        :param options: the (number, value) of the options, the numbers being those of the signal
+        :param payload: the diagnostic payload
+        :return: the frame
+        """
+        body = []
+        last = 0
+        for number, value in sorted(options, key=lambda o: o[0]):
+            delta, extended_delta, _ = cls._write_extended_value(number - last)
+            length, extended_length, _ = cls._write_extended_value(len(value))
+            body.append(bytes([(delta << 4) | length]) + extended_delta + extended_length + value)
+            last = number
+        if payload:
+            body.append(bytes([defines.PAYLOAD_MARKER]) + payload)
+        body = b"".join(body)
+        return cls._length_header(len(token), len(body)) + bytes([code]) + token + body
+
+    @classmethod
+    def parse_signal(cls, frame: bytes) -> Tuple[int, bytes, List[Tuple[int, bytes]], bytes]:
+        """
+        Decode a frame keeping the option numbers as they are, as needed by signaling messages.
+
+        :param frame: the frame
+        :return: (code, token, options as (number, value), payload)
+        """
+        code, token, data = cls._split(frame)
+        options = []
+        number = 0
+        while data and data[0] != defines.PAYLOAD_MARKER:
+            delta = data[0] >> 4
+            length = data[0] & 0x0F
+            data, delta = cls._read_extended_value(delta, data[1:])
+            data, length = cls._read_extended_value(length, data)
+            number += delta
+            options.append((number, data[:length]))
+            data = data[length:]
+        return code, token, options, data[1:]
+
+    @classmethod
+    def code(cls, frame: bytes) -> int:
+        """
+        Return the code of a frame.
+
+        :param frame: the frame
+        :return: the code
+        """
+        return cls._split(frame)[0]
+
+    @classmethod
+    async def read(cls, reader: asyncio.StreamReader, max_size: int = defines.TCP_MAX_MESSAGE_SIZE) -> bytes:
+        """
+        Read the next frame from a stream.
+
+        :param reader: the stream
+        :param max_size: the largest frame accepted
+        :return: the frame
+        :raise CoAPException: if the frame is larger than max_size
+        :raise IncompleteReadError: if the stream ends
+        """
+        first = await reader.readexactly(1)
+        nibble = first[0] >> 4
+        tkl = first[0] & 0x0F
+        if nibble < 13:
+            extended, length = b"", nibble
+        elif nibble == 13:
+            extended = await reader.readexactly(1)
+            length = extended[0] + 13
+        elif nibble == 14:
+            extended = await reader.readexactly(2)
+            length = int.from_bytes(extended, 'big') + 269
+        else:
+            extended = await reader.readexactly(4)
+            length = int.from_bytes(extended, 'big') + 65805
+        if length + tkl + 1 > max_size:
+            raise errors.CoAPException("Frame of {0} bytes exceeds the maximum message size".format(length))
+        return first + extended + await reader.readexactly(1 + tkl + length)
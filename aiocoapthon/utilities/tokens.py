@@ -0,0 +1,94 @@
+import os
+
+from aiocoapthon.utilities import defines, errors
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class TokenAllocator(object):
+    """
+    Allocate tokens that are unique among the outstanding exchanges of an endpoint.
+
+    Every token starts with a sequence number, which guarantees that consecutive tokens never collide, and is
+    completed with random bytes, which keeps tokens unpredictable for off-path attackers (RFC 7252, Section 5.3.1).
+    Tokens stay reserved until they are released, so that the token of a live observation is never handed out again.
+    """
+
+    def __init__(self, length: int = defines.TOKEN_LENGTH):
+        """
+        Initialize the allocator.
+
+        :param length: the length of the tokens in bytes, between 1 and 8
+        """
+        if not isinstance(length, int) or not 1 <= length <= 8:
+            raise errors.CoAPException("Token length must be between 1 and 8 bytes")
+        self._length = length
+        self._sequence_length = min(length, defines.TOKEN_SEQUENCE_LENGTH)
+        self._random_length = length - self._sequence_length
+        self._modulo = 1 << (8 * self._sequence_length)
+        self._sequence = int.from_bytes(os.urandom(self._sequence_length), 'big')
+        self._in_use = {}
+
+    @property
+    def length(self) -> int:
+        """
+        Return the length of the allocated tokens.
+
+        :return: the token length in bytes
+        """
+        return self._length
+
+    @property
+    def observing(self) -> int:
+        """
+        Return the number of tokens reserved by live observations.
+
+        :return: the number of observe tokens
+        """
+        return sum(1 for observe in self._in_use.values() if observe)
+
+    def allocate(self, observe: bool = False) -> bytes:
+        """
+        Reserve a new token.
+
+        :param observe: True, if the token identifies an observation
+        :return: the token
+        :raise CoAPException: if every token is in use
+        """
+        if self._random_length == 0 and len(self._in_use) >= self._modulo:  # pragma: no cover
+            raise errors.CoAPException("Token space exhausted")
+        while True:
+            self._sequence = (self._sequence + 1) % self._modulo
+            token = self._sequence.to_bytes(self._sequence_length, 'big') + os.urandom(self._random_length)
+            if token not in self._in_use:
+                self._in_use[token] = observe
+                return token
+
+    def release(self, token: bytes):
+        """
+        Release a token once its exchange, or its observation, is completed.
+
+        :param token: the token
+        """
+        self._in_use.pop(token, None)
+
+    def in_use(self, token: bytes) -> bool:
+        """
+        Check if a token is reserved.
+
+        :param token: the token
+        :return: True, if the token is in use
+        """
+        return token in self._in_use
+
+    def is_observe(self, token: bytes) -> bool:
+        """
+        Check if a token is reserved by an observation.
+
+        :param token: the token
+        :return: True, if the token identifies a live observation
+        """
+        return self._in_use.get(token, False)
+
+    def __len__(self):
+        return len(self._in_use)
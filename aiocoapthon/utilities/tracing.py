@@ -0,0 +1,230 @@
+import contextvars
+import random
+import struct
+import time
+from typing import Optional, List, Tuple, Callable
+
+from aiocoapthon.utilities import defines
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class Span(object):
+    """
+    A timed step of a trace. Times are in nanoseconds from time.perf_counter_ns().
+    """
+    __slots__ = ("trace_id", "span_id", "name", "start", "end")
+
+    def __init__(self, trace_id: int, span_id: int, name: str, start: int):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.name = name
+        self.start = start
+        self.end = 0
+
+
+class SpanListener(object):
+    """
+    Interface notified of the spans of the sampled traces.
+    """
+
+    def span_start(self, span: Span):
+        """
+        Called when a span starts.
+
+        :param span: the span
+        """
+
+    def span_end(self, span: Span):
+        """
+        Called when a span ends.
+
+        :param span: the span, with its end time set
+        """
+
+
+class Trace(object):
+    """
+    The spans recorded while handling one datagram.
+    """
+    __slots__ = ("trace_id", "_listeners", "_next_span")
+
+    def __init__(self, trace_id: int, listeners: List[SpanListener]):
+        self.trace_id = trace_id
+        self._listeners = listeners
+        self._next_span = 0
+
+    def start(self, name: str) -> Span:
+        """
+        Start a span.
+
+        :param name: the name of the step
+        :return: the span, to be passed to end
+        """
+        self._next_span += 1
+        span = Span(self.trace_id, self._next_span, name, time.perf_counter_ns())
+        for listener in self._listeners:
+            listener.span_start(span)
+        return span
+
+    def end(self, span: Span):
+        """
+        End a span.
+
+        :param span: the span returned by start
+        """
+        span.end = time.perf_counter_ns()
+        for listener in self._listeners:
+            listener.span_end(span)
+
+
+class _NullTrace(object):
+    """
+    Trace of the datagrams that are not sampled: every call is a no-op.
+    """
+    __slots__ = ()
+    trace_id = 0
+
+    def start(self, name: str) -> None:
+        return None
+
+    def end(self, span: Optional[Span]):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+_current = contextvars.ContextVar("coap_trace", default=NULL_TRACE)
+
+
+def current():
+    """
+    Return the trace of the datagram handled by the running task.
+
+    :return: the trace, or NULL_TRACE if the datagram is not sampled
+    """
+    return _current.get()
+
+
+class Tracer(object):
+    """
+    Sample the handled datagrams and notify the listeners of their spans.
+    """
+
+    def __init__(self, sample_rate: float = defines.TRACE_SAMPLE_RATE, listeners: List[SpanListener] = None,
+                 sampler: Callable[[], float] = random.random):
+        """
+        Initialize the tracer.
+
+        :param sample_rate: the fraction of datagrams traced, between 0 and 1
+        :param listeners: the span listeners
+        :param sampler: the function returning a random number in [0, 1)
+        """
+        self.sample_rate = sample_rate
+        self._listeners = list(listeners or [])
+        self._sampler = sampler
+        self._next_trace = 0
+
+    def add_listener(self, listener: SpanListener):
+        """
+        Add a span listener.
+
+        :param listener: the listener
+        """
+        self._listeners.append(listener)
+
+    def begin(self):
+        """
+        Decide if the datagram handled by the running task is traced, and make its trace current.
+
+        :return: the trace, or NULL_TRACE if the datagram is not sampled
+        """
+        if not self._listeners or self._sampler() >= self.sample_rate:
+            return NULL_TRACE
+        self._next_trace = (self._next_trace + 1) & 0xFFFFFFFFFFFFFFFF
+        trace = Trace(self._next_trace, self._listeners)
+        _current.set(trace)
+        return trace
+
+
+class RingBufferExporter(SpanListener):
+    """
+    Keep the last ended spans as fixed-size binary records in a preallocated ring buffer.
+
+    A record is (trace id u64, span id u16, name index u16, start ns u64, duration ns u32), little endian. A dump is
+    a header (magic, version, number of names, number of records), the name table (u8 length + UTF-8 name) and the
+    records from the oldest to the newest.
+    """
+    RECORD = struct.Struct("<QHHQI")
+    HEADER = struct.Struct("<4sBHI")
+    MAGIC = b"CTRC"
+    VERSION = 1
+
+    def __init__(self, capacity: int = defines.TRACE_BUFFER_RECORDS):
+        """
+        Initialize the exporter.
+
+        :param capacity: the number of records kept
+        """
+        self._capacity = capacity
+        self._buffer = bytearray(capacity * self.RECORD.size)
+        self._names = {}
+        self._position = 0
+        self._count = 0
+
+    def span_end(self, span: Span):
+        name = self._names.get(span.name, None)
+        if name is None:
+            name = self._names[span.name] = len(self._names)
+        self.RECORD.pack_into(self._buffer, self._position * self.RECORD.size, span.trace_id,
+                              span.span_id & 0xFFFF, name, span.start, min(span.end - span.start, 0xFFFFFFFF))
+        self._position = (self._position + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def dump(self, path: str = None) -> bytes:
+        """
+        Return the content of the buffer, and optionally write it to a file.
+
+        :param path: the file to write
+        :return: the binary dump
+        """
+        size = self.RECORD.size
+        if self._count < self._capacity:
+            records = bytes(self._buffer[:self._count * size])
+        else:
+            records = bytes(self._buffer[self._position * size:]) + bytes(self._buffer[:self._position * size])
+        names = b"".join(bytes([len(encoded)]) + encoded for encoded in
+                         (name.encode("utf-8")[:255] for name in self._names))
+        data = self.HEADER.pack(self.MAGIC, self.VERSION, len(self._names), self._count) + names + records
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+        return data
+
+    @classmethod
+    def decode(cls, data: bytes) -> List[Tuple[int, int, str, int, int]]:
+        """
+        Decode a dump.
+
+        :param data: the binary dump
+        :return: the records as (trace id, span id, name, start ns, duration ns)
+        """
+        magic, version, name_count, count = cls.HEADER.unpack_from(data, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:  # pragma: no cover
+            raise ValueError("Not a trace dump")
+        offset = cls.HEADER.size
+        names = []
+        for _ in range(name_count):
+            length = data[offset]
+            names.append(data[offset + 1:offset + 1 + length].decode("utf-8"))
+            offset += 1 + length
+        ret = []
+        for _ in range(count):
+            trace_id, span_id, name, start, duration = cls.RECORD.unpack_from(data, offset)
+            ret.append((trace_id, span_id, names[name], start, duration))
+            offset += cls.RECORD.size
+        return ret
@@ -7,6 +7,7 @@ from aiocoapthon.messages.message import Message
 from aiocoapthon.messages.request import Request
 from aiocoapthon.messages.response import Response
 from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import pool
 
 __author__ = 'Giacomo Tanganelli'
 
@@ -14,7 +15,15 @@ __author__ = 'Giacomo Tanganelli'
 class Transaction(object):
     """
     Transaction object to bind together a request, a response and a resource.
+    The synchronization primitives are created on first use, since most exchanges never wait on them.
     """
+    __slots__ = ("_response", "_request", "_resource", "_timestamp", "_completed", "_block_transfer",
+                 "notification", "notification_not_acknowledged", "_separate_task", "_retransmit_task",
+                 "automatic_separate_task", "_send_separate", "_retransmit_stop", "_lock", "_response_wait",
+                 "cacheHit", "cached_element", "recyclable")
+
+    def __new__(cls, *args, **kwargs):
+        return pool.new(cls)
 
     def __init__(self, request: Union[Request, Message] = None, response: Response = None,
                  resource: Resource = None, timestamp: time.time = None):
@@ -37,14 +46,49 @@ class Transaction(object):
 
         self._separate_task = None
         self._retransmit_task = None
-        self.send_separate = asyncio.Event()
+        self.automatic_separate_task = None
+        self._send_separate = None
         self._retransmit_stop = False
 
-        self.lock = asyncio.Lock()
-        self.response_wait = asyncio.Condition()
+        self._lock = None
+        self._response_wait = None
 
         self.cacheHit = False
         self.cached_element = None
+        self.recyclable = False
+
+    @property
+    def send_separate(self) -> asyncio.Event:
+        """
+        Return the event set when the separate ACK must be sent.
+
+        :return: the event
+        """
+        if self._send_separate is None:
+            self._send_separate = asyncio.Event()
+        return self._send_separate
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """
+        Return the lock of the transaction.
+
+        :return: the lock
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def response_wait(self) -> asyncio.Condition:
+        """
+        Return the condition notified when a response is received.
+
+        :return: the condition
+        """
+        if self._response_wait is None:
+            self._response_wait = asyncio.Condition()
+        return self._response_wait
 
     @property
     def retransmit_stop(self) -> bool:
@@ -1,3 +1,4 @@
+import ipaddress
 import random
 
 from typing import Tuple, List, Optional
@@ -61,12 +62,15 @@ def parse_blockwise(value: int) -> Tuple[int, int, int]:
 
 
 def str_append_hash(*args):
-    """ Convert each argument to a lower case string, appended, then hash """
-    ret_hash = ""
+    """ Convert each argument to a lower case string (bytes to hex), appended with a separator, then hash """
+    ret_hash = []
     for i in args:
-        ret_hash += str(i).lower()
+        if isinstance(i, bytes):
+            ret_hash.append(i.hex())
+        else:
+            ret_hash.append(str(i).lower())
 
-    return hash(ret_hash)
+    return hash("|".join(ret_hash))
 
 
 class Tree(object):
@@ -99,6 +103,21 @@ class Tree(object):
         del self.tree[key]
 
 
+def is_multicast(address: Optional[tuple]) -> bool:
+    """
+    Check whether a destination is a multicast group.
+
+    :param address: the (host, port), or None
+    :return: True, if the host is a multicast address, False for a hostname
+    """
+    if address is None:
+        return False
+    try:
+        return ipaddress.ip_address(address[0]).is_multicast
+    except ValueError:
+        return False
+
+
 def parse_uri_query(q: str) -> Optional[Tuple[str, str]]:
     tmp = q.split("=")
     if len(tmp) == 2:
@@ -111,6 +130,8 @@ def generate_random_hex(size):
 
 
 class CoAPPayload(object):
+    __slots__ = ("_payload",)
+
     def __init__(self, payload: bytes = None):
         self._payload = payload
 
@@ -157,6 +178,19 @@ class CoAPPayload(object):
     def raw(self) -> bytes:
         return self._payload
 
+    @property
+    def view(self) -> memoryview:
+        """
+        Return a read-only view on the payload, which slices and decodes without copying it.
+
+        :return: the view, empty if there is no payload
+        """
+        view = memoryview(self._payload if self._payload is not None else b"")
+        if view.readonly:
+            return view
+        # memoryview.toreadonly() is 3.8+, a copy keeps a bytearray payload read-only on 3.7
+        return view.toreadonly() if hasattr(view, "toreadonly") else memoryview(bytes(view))
+
     def __eq__(self, other):
         return self._payload == other.raw
 
@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+from typing import Tuple, Callable
+
+from aiocoapthon.utilities import defines, events
+
+__author__ = 'Giacomo Tanganelli'
+
+logger = events.get_logger(__name__)
+
+
+class LoopWatchdog(object):
+    """
+    Watch an event loop for stalls.
+
+    A coroutine on the loop beats at a fixed interval and measures how late it wakes up. The outstanding tasks of the
+    watched coroutines are counted less often, since that walks all the tasks of the loop. A thread checks the beats:
+    when the loop misses them for longer than the threshold, it captures the stack of the loop thread while the loop is
+    still blocked and emits a "loop_stall" event.
+    """
+
+    def __init__(self, threshold: float = defines.WATCHDOG_LAG_THRESHOLD,
+                 interval: float = defines.WATCHDOG_INTERVAL,
+                 tasks_interval: float = defines.WATCHDOG_TASKS_INTERVAL,
+                 coroutines: Tuple[str, ...] = ("_handler", "_retransmit"),
+                 timer: Callable[[], float] = time.monotonic):
+        """
+        Initialize the watchdog.
+
+        :param threshold: the lag, in seconds, that is reported as a stall
+        :param interval: the interval, in seconds, between two beats
+        :param tasks_interval: the interval, in seconds, between two counts of the tasks
+        :param coroutines: the names of the coroutines whose tasks are counted
+        :param timer: the clock
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.tasks_interval = tasks_interval
+        self._coroutines = coroutines
+        self._timer = timer
+        self._loop = None
+        self._loop_thread = None
+        self._beat = None
+        self._counted = None
+        self._reported = None
+        self._beater = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall = None
+        self.tasks = collections.Counter()
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """
+        Start watching a loop. Must be called from the loop thread.
+
+        :param loop: the loop, the running one if None
+        """
+        if self._beater is not None:
+            return
+        self._loop = loop or asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = self._timer()
+        self._stop.clear()
+        self._beater = self._loop.create_task(self._run())
+        self._thread = threading.Thread(target=self._watch, name="coap-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching.
+        """
+        self._stop.set()
+        if self._beater is not None:
+            self._beater.cancel()
+            self._beater = None
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.interval * 2)
+        self._thread = None
+
+    async def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._beat = self._timer()
+                await asyncio.sleep(self.interval)
+                self.lag = max(0.0, self._timer() - self._beat - self.interval)
+                self.max_lag = max(self.max_lag, self.lag)
+                if self._counted is None or self._timer() - self._counted >= self.tasks_interval:
+                    self._count_tasks()
+        except asyncio.CancelledError:
+            logger.debug("watchdog_cancelled")
+
+    def _count_tasks(self):
+        counter = collections.Counter()
+        for task in asyncio.all_tasks(self._loop):
+            # Task.get_coro() is only available from Python 3.8
+            coroutine = task.get_coro() if hasattr(task, "get_coro") else task._coro
+            name = getattr(coroutine, "__name__", None)
+            if name in self._coroutines:
+                counter[name] += 1
+        self.tasks = counter
+        self._counted = self._timer()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            lag = self._timer() - beat - self.interval
+            if lag > self.threshold and self._reported != beat:
+                self._reported = beat
+                self._report(lag)
+
+    def _report(self, lag: float):
+        frame = sys._current_frames().get(self._loop_thread, None)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        self.stalls += 1
+        self.last_stall = {"lag": lag, "timestamp": time.time(), "tasks": dict(self.tasks), "stack": stack}
+        logger.warning("loop_stall", lag=round(lag, 3), tasks=dict(self.tasks), stack="".join(stack))
+
+    def stats(self) -> dict:
+        """
+        Return the statistics of the watchdog.
+
+        :return: a dict with the last and maximum lag, the number of stalls, the outstanding tasks and the last stall
+        """
+        if self._loop is not None and threading.get_ident() == self._loop_thread:
+            self._count_tasks()
+        return {"lag": self.lag, "max_lag": self.max_lag, "stalls": self.stalls, "tasks": dict(self.tasks),
+                "last_stall": self.last_stall}
@@ -0,0 +1,120 @@
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Dict, Optional
+
+from benchmarks import bert, blockwise, codecs, common, dtls, load, logging_cost, lossy, memory, observe, \
+    oscore, persistence, pooling, rd, serializer
+
+__author__ = 'Giacomo Tanganelli'
+
+# suite -> (run function, full parameters, quick parameters)
+SUITES = {
+    "load": (load.run, {"requests": 2000, "concurrency": 16}, {"requests": 200, "concurrency": 4}),
+    "observe": (observe.run, {"observers": 100, "rounds": 20}, {"observers": 10, "rounds": 3}),
+    "blockwise": (blockwise.run, {"size": 64 * 1024, "transfers": 20}, {"size": 8 * 1024, "transfers": 3}),
+    "serializer": (serializer.run, {"count": 20000}, {"count": 1000}),
+    "memory": (memory.run, {"transactions": 100000, "relations": 100000}, {"transactions": 2000, "relations": 2000}),
+    "pooling": (pooling.run, {"count": 50000}, {"count": 2000}),
+    "logging": (logging_cost.run, {"count": 100000}, {"count": 2000}),
+    "bert": (bert.run, {"size": 4 * 1024 * 1024, "transfers": 5}, {"size": 256 * 1024, "transfers": 2}),
+    "oscore": (oscore.run, {"requests": 2000, "concurrency": 16, "count": 20000},
+               {"requests": 200, "concurrency": 4, "count": 1000}),
+    "dtls": (dtls.run, {"handshakes": 500, "requests": 2000, "concurrency": 16},
+             {"handshakes": 20, "requests": 200, "concurrency": 4}),
+    "codecs": (codecs.run, {"records": 1000, "count": 200}, {"records": 100, "count": 10}),
+    "rd": (rd.run, {"registrations": 10000, "lookups": 200}, {"registrations": 500, "lookups": 20}),
+    "persistence": (persistence.run, {"relations": 1024, "resources": 100}, {"relations": 200, "resources": 10}),
+    "lossy": (lossy.run, {"requests": 200}, {"requests": 20, "losses": (0.0, 0.2)}),
+}
+
+NETWORK = ("load", "observe", "blockwise", "bert", "oscore", "dtls")
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(suites=tuple(SUITES), quick: bool = False, port: int = common.PORT) -> dict:
+    """
+    Run benchmark suites.
+
+    :param suites: the names of the suites, among SUITES
+    :param quick: True, to run with small sizes, e.g. as a smoke test
+    :param port: the port of the loopback server of the network suites
+    :return: a JSON-serializable dict with the environment and the results of each suite
+    """
+    results = {}
+    for name in suites:
+        function, full, small = SUITES[name]
+        params = dict(small if quick else full)
+        if name in NETWORK:
+            params["port"] = port
+        results[name] = function(**params)
+    meta = {"timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(), "commit": _commit(),
+            "python": sys.version.split()[0], "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "quick": quick}
+    return {"meta": meta, "results": results}
+
+
+def _flatten(data, prefix: str = "") -> Dict[str, float]:
+    ret = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            ret.update(_flatten(value, prefix + "." + key if prefix else key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        ret[prefix] = data
+    return ret
+
+
+def compare(baseline: dict, current: dict) -> Dict[str, dict]:
+    """
+    Compare the numeric results of two runs.
+
+    :param baseline: the output of a previous run
+    :param current: the output of this run
+    :return: a dict metric path -> {"baseline", "current", "change"}, change being relative (0.1 = +10%)
+    """
+    old = _flatten(baseline.get("results", {}))
+    new = _flatten(current.get("results", {}))
+    ret = {}
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] if old[key] else None
+        ret[key] = {"baseline": old[key], "current": new[key], "change": change}
+    return ret
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Run the benchmark suites and print the results as JSON")
+    parser.add_argument("suites", nargs="*", metavar="suite",
+                        help="suites to run, among {0} (default: all)".format(", ".join(SUITES)))
+    parser.add_argument("-q", "--quick", action="store_true", help="use small sizes")
+    parser.add_argument("-p", "--port", type=int, default=common.PORT, help="port of the loopback server")
+    parser.add_argument("-o", "--output", help="write the results to this file instead of stdout")
+    parser.add_argument("-c", "--compare", metavar="BASELINE", help="add the comparison with a previous output")
+    args = parser.parse_args()
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error("unknown suite: {0}".format(", ".join(unknown)))
+    result = run(args.suites or tuple(SUITES), args.quick, args.port)
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(json.load(f), result)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
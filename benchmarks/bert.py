@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport.tcp import TCPTransport
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.admission import AdmissionControl
+from benchmarks import common
+from benchmarks.blockwise import LargeResource
+
+__author__ = 'Giacomo Tanganelli'
+
+
+async def _transfers(size: int, transfers: int, bert: bool, timeout: float, port: int) -> dict:
+    loop = asyncio.get_event_loop()
+    resource = LargeResource(size)
+    payload = "y" * size
+    server_transport = TCPTransport(block_wise=bert)
+    await server_transport.listen(common.HOST, port)
+    admission = AdmissionControl(rate=1e9, burst=1e9, max_in_flight=1 << 30)
+    server = CoAPServer(common.HOST, port, admission=admission, transport=server_transport)
+    server.add_resource("large/", resource)
+    task = loop.create_task(server.create_server())
+    client = CoAPClient(common.HOST, port, transport=TCPTransport(block_wise=bert))
+    client.start_receiver()
+    ret = {"size": size, "transfers": transfers}
+    try:
+        # open the connection and exchange the CSMs before measuring
+        await client.get("/large", timeout=timeout)
+        ret["block_size"] = server_transport.bert_size(next(iter(server_transport._connections))) or \
+            defines.MAX_PAYLOAD
+        for name in ("get", "put"):
+            samples = []
+            failed = 0
+            sent = server.metrics.get("coap_messages_sent_total")
+            before = sum(sent.value("NON", code) or 0 for code in ("2.05", "2.31", "2.04"))
+            start = time.perf_counter()
+            for _ in range(transfers):
+                if name == "get":
+                    response = await common.timed(client.get("/large", timeout=timeout), samples)
+                    ok = response is not None and len(response.payload) == size
+                else:
+                    response = await common.timed(client.put("/large", payload, timeout=timeout), samples)
+                    ok = response is not None and response.code == defines.Code.CHANGED
+                if not ok:
+                    failed += 1
+            elapsed = time.perf_counter() - start
+            after = sum(sent.value("NON", code) or 0 for code in ("2.05", "2.31", "2.04"))
+            result = {"failed": failed, "bytes_per_second": size * transfers / elapsed,
+                      "exchanges_per_transfer": (after - before) / transfers}
+            result.update(common.latency_summary(samples))
+            ret[name] = result
+    finally:
+        client.stop()
+        server.stop()
+        task.cancel()
+        await asyncio.sleep(0)
+    return ret
+
+
+def run(size: int = 4 * 1024 * 1024, transfers: int = 5, timeout: float = 30, port: int = common.PORT) -> dict:
+    """
+    Measure multi-megabyte block-wise transfers over TCP, with blocks of 1024 bytes and with BERT blocks.
+
+    :param size: the payload size, in bytes
+    :param transfers: the number of transfers in each direction
+    :param timeout: the timeout of each block
+    :param port: the port of the server
+    :return: a dict "block" / "bert" -> the results of the GET and PUT transfers
+    """
+    return {"block": asyncio.run(_transfers(size, transfers, False, timeout, port)),
+            "bert": asyncio.run(_transfers(size, transfers, True, timeout, port))}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Block-wise transfers over TCP, with and without BERT")
+    parser.add_argument("-s", "--size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("-t", "--transfers", type=int, default=5)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.transfers, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import defines
+from benchmarks import common
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class LargeResource(Resource):
+    def __init__(self, size: int, name="LargeResource"):
+        super().__init__(name, observable=False)
+        self.payload = "x" * size
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        response.payload = self.payload
+        return self, response
+
+    async def handle_put(self, request: "Request", response: "Response"):
+        self.payload = str(request.payload)
+        return self, response
+
+
+async def _transfers(size: int, transfers: int, timeout: float, port: int) -> dict:
+    resource = LargeResource(size)
+    payload = "y" * size
+    ret = {"size": size, "transfers": transfers, "blocks_per_transfer": -(-size // defines.MAX_PAYLOAD)}
+    async with common.Server({"large/": resource}, port=port):
+        client = CoAPClient(common.HOST, port)
+        client.start_receiver()
+        try:
+            for name in ("get", "put"):
+                samples = []
+                failed = 0
+                start = time.perf_counter()
+                for _ in range(transfers):
+                    if name == "get":
+                        response = await common.timed(client.get("/large", timeout=timeout), samples)
+                        ok = response is not None and len(response.payload) == size
+                    else:
+                        response = await common.timed(client.put("/large", payload, timeout=timeout), samples)
+                        ok = response is not None and response.code == defines.Code.CHANGED
+                    if not ok:
+                        failed += 1
+                elapsed = time.perf_counter() - start
+                result = {"failed": failed, "bytes_per_second": size * transfers / elapsed}
+                result.update(common.latency_summary(samples))
+                ret[name] = result
+        finally:
+            client.stop()
+    return ret
+
+
+def run(size: int = 64 * 1024, transfers: int = 20, timeout: float = 10, port: int = common.PORT) -> dict:
+    """
+    Measure block-wise transfers of a large payload: GET with Block2 and PUT with Block1.
+
+    :param size: the payload size, in bytes
+    :param transfers: the number of transfers in each direction
+    :param timeout: the timeout of each block
+    :param port: the port of the server
+    :return: a dict with the results of the GET and PUT transfers
+    """
+    return asyncio.run(_transfers(size, transfers, timeout, port))
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Block-wise transfer of large payloads on loopback")
+    parser.add_argument("-s", "--size", type=int, default=64 * 1024)
+    parser.add_argument("-t", "--transfers", type=int, default=20)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.transfers, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import time
+
+from aiocoapthon.messages.response import Response
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import content_formats, defines
+
+__author__ = 'Giacomo Tanganelli'
+
+_FORMATS = (("senml_json", defines.ContentType.application_senml_json),
+            ("senml_cbor", defines.ContentType.application_senml_cbor))
+
+
+def _pack(records: int) -> list:
+    pack = [{"bn": "urn:dev:ow:10e2073a01080063:", "bt": 1.276020076001e+09, "bu": "Cel"}]
+    pack.extend({"n": "sensor{0}".format(i), "v": 20.0 + i / 8, "t": i} for i in range(records))
+    return pack
+
+
+def run(records: int = 1000, count: int = 200) -> dict:
+    """
+    Measure the SenML codecs on a large pack, and the rendering of an unchanged resource, which reuses its encoding.
+
+    :param records: the records in the pack
+    :param count: the number of iterations of each operation
+    :return: a dict Content-Format -> bytes and microseconds per operation
+    """
+    pack = _pack(records)
+    ret = {"records": records, "iterations": count}
+    for name, content_type in _FORMATS:
+        data = content_formats.encode(pack, content_type)
+        start = time.perf_counter()
+        for _ in range(count):
+            content_formats.encode(pack, content_type)
+        encode = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            content_formats.decode(data, content_type)
+        decode = (time.perf_counter() - start) / count
+        # the first record of a pack, without decoding the others
+        start = time.perf_counter()
+        for _ in range(count):
+            next(content_formats.iterdecode(data, content_type))
+        first = (time.perf_counter() - start) / count
+        resource = Resource("senml")
+        resource.value = pack
+        start = time.perf_counter()
+        for _ in range(count):
+            resource.render(Response(), content_type)
+        render = (time.perf_counter() - start) / count
+        ret[name] = {"bytes": len(data), "encode_us": encode * 1e6, "decode_us": decode * 1e6,
+                     "first_record_us": first * 1e6, "cached_render_us": render * 1e6}
+    return ret
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Content-Format codec microbenchmarks")
+    parser.add_argument("-r", "--records", type=int, default=1000)
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.records, args.iterations), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
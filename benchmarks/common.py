@@ -0,0 +1,82 @@
+import asyncio
+import math
+import statistics
+import time
+from typing import List, Dict, Optional
+
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.utilities.admission import AdmissionControl
+
+__author__ = 'Giacomo Tanganelli'
+
+HOST = "127.0.0.1"
+PORT = 5783
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Return a percentile of the samples, with the nearest-rank method.
+
+    :param samples: the samples
+    :param q: the percentile, between 0 and 100
+    :return: the value, or 0 if there are no samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latencies measured in seconds.
+
+    :param samples: the latencies
+    :return: a dict with the mean, p50, p99 and max latency in milliseconds
+    """
+    if not samples:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {"mean_ms": statistics.mean(samples) * 1000, "p50_ms": percentile(samples, 50) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000, "max_ms": max(samples) * 1000}
+
+
+class Server(object):
+    """
+    Benchmark server on loopback. The admission control is disabled, so that the load generator is never shed.
+    """
+
+    def __init__(self, resources: Dict[str, Resource], host: str = HOST, port: int = PORT):
+        self._resources = resources
+        self._host = host
+        self._port = port
+        self.server = None
+        self._task = None
+
+    async def __aenter__(self) -> CoAPServer:
+        admission = AdmissionControl(rate=1e9, burst=1e9, max_in_flight=1 << 30)
+        self.server = CoAPServer(self._host, self._port, admission=admission)
+        for path, resource in self._resources.items():
+            self.server.add_resource(path, resource)
+        self._task = asyncio.get_event_loop().create_task(self.server.create_server())
+        return self.server
+
+    async def __aexit__(self, *args):
+        self.server.stop()
+        self._task.cancel()
+        await asyncio.sleep(0)
+
+
+async def timed(coroutine, samples: List[float]) -> Optional[object]:
+    """
+    Await a coroutine and append its duration to the samples.
+
+    :param coroutine: the coroutine
+    :param samples: the list of durations, in seconds
+    :return: the result of the coroutine
+    """
+    start = time.perf_counter()
+    ret = await coroutine
+    samples.append(time.perf_counter() - start)
+    return ret
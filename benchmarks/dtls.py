@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport.dtls import DTLSTransport
+from aiocoapthon.utilities.admission import AdmissionControl
+from benchmarks import common
+from benchmarks.load import BenchResource, _worker
+
+__author__ = 'Giacomo Tanganelli'
+
+PSK = ("bench", b"0123456789abcdef")
+
+
+async def _handshakes(handshakes: int, port: int) -> dict:
+    server_transport = DTLSTransport(psk_store={PSK[0]: PSK[1]})
+    await server_transport.listen(common.HOST, port)
+    samples = []
+    try:
+        start = time.perf_counter()
+        for _ in range(handshakes):
+            # a new endpoint each time, as a fleet of devices would
+            client_transport = DTLSTransport(psk=PSK)
+            try:
+                await common.timed(client_transport.connect((common.HOST, port)), samples)
+            finally:
+                client_transport.close()
+        elapsed = time.perf_counter() - start
+    finally:
+        server_transport.close()
+    ret = {"handshakes": handshakes, "handshakes_per_second": handshakes / elapsed}
+    ret.update(common.latency_summary(samples))
+    return ret
+
+
+async def _exchanges(requests: int, concurrency: int, secure: bool, timeout: float, port: int) -> dict:
+    loop = asyncio.get_event_loop()
+    admission = AdmissionControl(rate=1e9, burst=1e9, max_in_flight=1 << 30)
+    server_transport = client_transport = None
+    if secure:
+        server_transport = DTLSTransport(psk_store={PSK[0]: PSK[1]})
+        await server_transport.listen(common.HOST, port)
+        client_transport = DTLSTransport(psk=PSK)
+    server = CoAPServer(common.HOST, port, admission=admission, transport=server_transport)
+    server.add_resource("bench/", BenchResource())
+    task = loop.create_task(server.create_server())
+    client = CoAPClient(common.HOST, port, max_in_flight=concurrency, transport=client_transport)
+    client.start_receiver()
+    samples = []
+    ret = {"requests": requests, "concurrency": concurrency}
+    try:
+        if secure:
+            # the handshake is measured on its own
+            await client_transport.connect((common.HOST, port))
+        share = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+        start = time.perf_counter()
+        failed = await asyncio.gather(*[_worker(client, "con_get", n, timeout, samples) for n in share if n])
+        elapsed = time.perf_counter() - start
+        ret.update({"failed": sum(failed), "requests_per_second": requests / elapsed})
+        if secure:
+            session = client_transport.session((common.HOST, port))
+            ret["overhead_bytes_per_message"] = (session.sent - session.written) / requests
+    finally:
+        client.stop()
+        server.stop()
+        task.cancel()
+        await asyncio.sleep(0)
+    ret.update(common.latency_summary(samples))
+    return ret
+
+
+def run(handshakes: int = 500, requests: int = 2000, concurrency: int = 16, timeout: float = 10,
+        port: int = common.PORT) -> dict:
+    """
+    Measure DTLS on loopback: the rate of PSK handshakes, and CON GETs over plain UDP and over an established
+    DTLS session, with the bytes DTLS adds to each message.
+
+    :param handshakes: the number of handshakes, each from a new client endpoint
+    :param requests: the number of GETs of each exchange run
+    :param concurrency: the number of GETs outstanding at the same time
+    :param timeout: the timeout of each GET
+    :param port: the port of the server
+    :return: a dict with the results of "handshake", "udp" and "dtls"
+    """
+    return {"handshake": asyncio.run(_handshakes(handshakes, port)),
+            "udp": asyncio.run(_exchanges(requests, concurrency, False, timeout, port)),
+            "dtls": asyncio.run(_exchanges(requests, concurrency, True, timeout, port))}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="DTLS handshakes and exchanges compared with plain UDP")
+    parser.add_argument("-H", "--handshakes", type=int, default=500)
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.handshakes, args.requests, args.concurrency, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
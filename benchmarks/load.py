@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.utilities import defines
+from benchmarks import common
+
+__author__ = 'Giacomo Tanganelli'
+
+SCENARIOS = ("con_get", "non_get", "con_put", "non_put")
+
+
+class BenchResource(Resource):
+    def __init__(self, name="BenchResource"):
+        super().__init__(name, observable=False)
+        self.payload = "21.5"
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        response.payload = self.payload
+        return self, response
+
+    async def handle_put(self, request: "Request", response: "Response"):
+        self.payload = str(request.payload)
+        return self, response
+
+
+async def _worker(client: CoAPClient, scenario: str, count: int, timeout: float, samples: List[float]) -> int:
+    failed = 0
+    for i in range(count):
+        if scenario == "con_get":
+            coroutine = client.get("/bench", timeout=timeout)
+        elif scenario == "non_get":
+            coroutine = client.get_non("/bench", timeout=timeout)
+        elif scenario == "con_put":
+            coroutine = client.put("/bench", str(i), timeout=timeout)
+        else:
+            coroutine = client.put_non("/bench", str(i), timeout=timeout)
+        response = await common.timed(coroutine, samples)
+        if response is None or response.code not in (defines.Code.CONTENT, defines.Code.CHANGED):
+            failed += 1
+    return failed
+
+
+async def _scenario(scenario: str, requests: int, concurrency: int, timeout: float, port: int) -> dict:
+    async with common.Server({"bench/": BenchResource()}, port=port):
+        client = CoAPClient(common.HOST, port, max_in_flight=concurrency)
+        client.start_receiver()
+        samples = []
+        try:
+            share = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+            start = time.perf_counter()
+            failed = await asyncio.gather(*[_worker(client, scenario, n, timeout, samples) for n in share if n])
+            elapsed = time.perf_counter() - start
+        finally:
+            client.stop()
+    ret = {"requests": requests, "concurrency": concurrency, "failed": sum(failed),
+           "requests_per_second": requests / elapsed}
+    ret.update(common.latency_summary(samples))
+    return ret
+
+
+def run(requests: int = 2000, concurrency: int = 16, scenarios=SCENARIOS, timeout: float = 10,
+        port: int = common.PORT) -> dict:
+    """
+    Measure the request throughput and latency of a server on loopback, for CON and NON GET and PUT.
+
+    :param requests: the number of requests of each scenario
+    :param concurrency: the number of requests outstanding at the same time
+    :param scenarios: the scenarios to run, among SCENARIOS
+    :param timeout: the timeout of each request
+    :param port: the port of the server
+    :return: a dict scenario -> results
+    """
+    return {scenario: asyncio.run(_scenario(scenario, requests, concurrency, timeout, port))
+            for scenario in scenarios}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Request throughput and latency on loopback")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.concurrency, args.scenario or SCENARIOS, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
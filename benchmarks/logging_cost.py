@@ -0,0 +1,96 @@
+import argparse
+import logging
+import time
+
+from aiocoapthon.messages.request import Request
+from aiocoapthon.utilities import defines, events
+
+__author__ = 'Giacomo Tanganelli'
+
+# Debug statements run for every request handled by a server, as in the protocol and the message layer
+_STATEMENTS = ("handle_datagram", "receive_request", "handle_message", "send_response")
+
+
+class _FormattingHandler(logging.Handler):
+    """
+    Handler that formats the records and discards them, to measure the cost of enabled logging without I/O.
+    """
+
+    def emit(self, record):
+        self.format(record)
+
+
+def _request() -> Request:
+    request = Request()
+    request.type = defines.Type.CON
+    request.code = defines.Code.GET
+    request.mid = 1
+    request.token = b"\x01\x02\x03\x04"
+    request.source = ("127.0.0.1", 5683)
+    request.uri_path = "sensors/temperature"
+    request.accept = defines.ContentType.TEXT_PLAIN
+    return request
+
+
+def _eager(logger: logging.Logger, message: Request, count: int):
+    for _ in range(count):
+        for name in _STATEMENTS:
+            logger.debug(f"{name} - {message}")
+
+
+def _lazy(logger: events.EventLogger, message: Request, count: int):
+    for _ in range(count):
+        for name in _STATEMENTS:
+            logger.debug(name, message=message)
+
+
+def _measure(function, logger, message: Request, count: int) -> float:
+    start = time.process_time()
+    function(logger, message, count)
+    return (time.process_time() - start) / count * 1e9
+
+
+def run(count: int = 100000) -> dict:
+    """
+    Measure the CPU time spent in the debug statements of the request path, per message.
+
+    :param count: the number of messages
+    :return: a dict mode -> nanoseconds per message, with DEBUG disabled and enabled
+    """
+    name = "aiocoapthon.benchmarks.logging_cost"
+    plain = logging.getLogger(name + ".eager")
+    structured = events.EventLogger(name + ".lazy")
+    root = logging.getLogger(name)
+    handler = _FormattingHandler()
+    root.addHandler(handler)
+    root.propagate = False
+    message = _request()
+    ret = {"messages": count, "statements_per_message": len(_STATEMENTS)}
+    try:
+        root.setLevel(logging.INFO)
+        ret["eager_disabled_ns"] = _measure(_eager, plain, message, count)
+        ret["lazy_disabled_ns"] = _measure(_lazy, structured, message, count)
+        root.setLevel(logging.DEBUG)
+        enabled = max(1, count // 10)
+        ret["eager_enabled_ns"] = _measure(_eager, plain, message, enabled)
+        ret["lazy_enabled_ns"] = _measure(_lazy, structured, message, enabled)
+    finally:
+        root.removeHandler(handler)
+        root.propagate = True
+        root.setLevel(logging.NOTSET)
+    return ret
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="CPU cost of the debug logging of the request path, per message")
+    parser.add_argument("-n", "--messages", type=int, default=100000)
+    args = parser.parse_args()
+    result = run(args.messages)
+    print("{0} debug statements per message".format(result["statements_per_message"]))
+    for mode in ("eager", "lazy"):
+        print("{0}: {1:.0f} ns/message with DEBUG off, {2:.0f} ns/message with DEBUG on".format(
+            mode, result[mode + "_disabled_ns"], result[mode + "_enabled_ns"]))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
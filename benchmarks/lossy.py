@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport import simulated
+from aiocoapthon.utilities import defines
+from benchmarks import common
+from benchmarks.load import BenchResource
+
+__author__ = 'Giacomo Tanganelli'
+
+SERVER = ("10.0.0.1", 5683)
+CLIENT = ("10.0.0.2", 40000)
+
+
+async def _exchanges(requests: int, seed: int, timeout: float, conditions: dict) -> dict:
+    loop = asyncio.get_event_loop()
+    network = simulated.SimulatedNetwork(seed=seed, **conditions)
+    server = CoAPServer(SERVER[0], SERVER[1], transport=network.endpoint(SERVER))
+    server.add_resource("bench/", BenchResource())
+    loop.create_task(server.create_server())
+    client = CoAPClient(SERVER[0], SERVER[1], transport=network.endpoint(CLIENT))
+    client.start_receiver()
+    samples = []
+    failed = 0
+    start = loop.time()
+    try:
+        for _ in range(requests):
+            begin = loop.time()
+            response = await client.get("/bench", timeout=timeout)
+            if response is None or response.code != defines.Code.CONTENT:
+                failed += 1
+            else:
+                samples.append(loop.time() - begin)
+    finally:
+        client.stop()
+        server.stop()
+    ret = {"requests": requests, "failed": failed, "simulated_s": loop.time() - start,
+           "retransmissions": client.metrics.get("coap_retransmissions_total").value() or 0,
+           "network": network.stats()}
+    ret.update(common.latency_summary(samples))
+    return ret
+
+
+def run(requests: int = 200, losses=(0.0, 0.05, 0.1, 0.2, 0.3), latency: float = 0.05, jitter: float = 0.01,
+        seed: int = 0, timeout: float = defines.EXCHANGE_LIFETIME) -> dict:
+    """
+    Run sequential CON GETs over a simulated lossy network with a virtual clock. Latencies are in simulated time.
+
+    :param requests: the number of requests at each loss rate
+    :param losses: the loss rates
+    :param latency: the one-way latency, in seconds
+    :param jitter: the maximum random delay added to the latency, in seconds
+    :param seed: the seed of the network and of the retransmission timeouts
+    :param timeout: the timeout of each request, in simulated seconds
+    :return: a dict loss rate -> results, including the real time taken by the simulation
+    """
+    ret = {}
+    for loss in losses:
+        random.seed(seed)
+        conditions = {"loss": loss, "latency": latency, "jitter": jitter}
+        start = time.perf_counter()
+        result = simulated.run(_exchanges(requests, seed, timeout, conditions))
+        result["real_s"] = time.perf_counter() - start
+        ret[str(loss)] = result
+    return ret
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="CON requests over a simulated lossy network")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-l", "--loss", type=float, action="append")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    losses = args.loss or (0.0, 0.05, 0.1, 0.2, 0.3)
+    print(json.dumps(run(args.requests, losses, args.latency, seed=args.seed), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
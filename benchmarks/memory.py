@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+import cachetools
+
+from aiocoapthon.layers.observelayer import ObserveLayer
+from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.transaction import Transaction
+
+__author__ = 'Giacomo Tanganelli'
+
+
+def _peer(i: int):
+    return "10.{0}.{1}.{2}".format((i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF), 5683
+
+
+def _transaction(i: int, observe: bool = False) -> Transaction:
+    request = Request()
+    request.type = defines.Type.CON
+    request.code = defines.Code.GET
+    request.mid = i & 0xFFFF
+    request.token = i.to_bytes(4, 'big')
+    request.uri_path = "sensors/temperature"
+    request.source = _peer(i)
+    if observe:
+        request.observe = 0
+    response = Response()
+    response.type = defines.Type.ACK
+    response.code = defines.Code.CONTENT
+    response.mid = request.mid
+    response.token = request.token
+    response.destination = request.source
+    response.payload = "21.5"
+    return Transaction(request=request, response=response, timestamp=0)
+
+
+def _measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    alive = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del alive
+    return after - before
+
+
+async def _observe(count: int) -> ObserveLayer:
+    layer = ObserveLayer()
+    layer._relations = cachetools.LFUCache(maxsize=count)
+    for i in range(count):
+        await layer.receive_request(_transaction(i, observe=True))
+    return layer
+
+
+def run(transactions: int = 100000, relations: int = 100000) -> dict:
+    """
+    Measure the memory held by live transactions and by observe relations.
+
+    :param transactions: the number of live transactions
+    :param relations: the number of observe relations
+    :return: a dict with the bytes per transaction and per relation
+    """
+    transaction_bytes = _measure(lambda: [_transaction(i) for i in range(transactions)])
+    relation_bytes = _measure(lambda: asyncio.run(_observe(relations)))
+    return {"transactions": transactions, "bytes_per_transaction": transaction_bytes / transactions,
+            "relations": relations, "bytes_per_relation": relation_bytes / relations}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Memory used by transactions and observe relations")
+    parser.add_argument("-t", "--transactions", type=int, default=100000)
+    parser.add_argument("-r", "--relations", type=int, default=100000)
+    args = parser.parse_args()
+    result = run(args.transactions, args.relations)
+    print("{0} transactions: {1:.0f} bytes each".format(result["transactions"], result["bytes_per_transaction"]))
+    print("{0} observe relations: {1:.0f} bytes each".format(result["relations"], result["bytes_per_relation"]))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
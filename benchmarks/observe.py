@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.resources.resource import Resource
+from benchmarks import common
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class CounterResource(Resource):
+    def __init__(self, name="CounterResource"):
+        super().__init__(name)
+        self.value = 0
+
+    async def handle_get(self, request: "Request", response: "Response"):
+        response.payload = str(self.value)
+        return self, response
+
+    async def change(self):
+        self.value += 1
+        self.observe_count += 1
+        await self.notify()
+
+
+async def _fanout(observers: int, rounds: int, timeout: float, port: int) -> dict:
+    resource = CounterResource()
+    async with common.Server({"counter/": resource}, port=port):
+        clients = [CoAPClient(common.HOST, port) for _ in range(observers)]
+        queues = [asyncio.Queue() for _ in range(observers)]
+        stop = asyncio.Event()
+        tasks = []
+        try:
+            start = time.perf_counter()
+            for client, queue in zip(clients, queues):
+                client.start_receiver()
+                tasks.append(asyncio.get_event_loop().create_task(
+                    client.observe("/counter", queue=queue, stop=stop, timeout=timeout)))
+            for queue in queues:
+                await asyncio.wait_for(queue.get(), timeout)
+            registration = time.perf_counter() - start
+
+            fanout = []
+            latencies = []
+            lost = 0
+            for _ in range(rounds):
+                start = time.perf_counter()
+                await resource.change()
+                for queue in queues:
+                    try:
+                        await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        lost += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+                fanout.append(time.perf_counter() - start)
+        finally:
+            stop.set()
+            for task in tasks:
+                task.cancel()
+            for client in clients:
+                client.stop()
+    ret = {"observers": observers, "rounds": rounds, "lost": lost, "registration_s": registration,
+           "notifications_per_second": (observers * rounds - lost) / sum(fanout),
+           "fanout": common.latency_summary(fanout)}
+    ret.update(common.latency_summary(latencies))
+    return ret
+
+
+def run(observers: int = 100, rounds: int = 20, timeout: float = 10, port: int = common.PORT) -> dict:
+    """
+    Measure the delivery of notifications to many observers of the same resource.
+    The latencies go from the change of the resource to the reception of each notification, the fan-out times to
+    the reception of the last one.
+
+    :param observers: the number of observers, each with its own client
+    :param rounds: the number of changes of the resource
+    :param timeout: the timeout of each notification
+    :param port: the port of the server
+    :return: a dict with the results
+    """
+    return asyncio.run(_fanout(observers, rounds, timeout, port))
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Observe notification fan-out on loopback")
+    parser.add_argument("-o", "--observers", type=int, default=100)
+    parser.add_argument("-r", "--rounds", type=int, default=20)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.observers, args.rounds, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
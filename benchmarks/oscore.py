@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.client.coap_client import CoAPClient
+from aiocoapthon.layers.oscorelayer import OSCORELayer
+from aiocoapthon.messages.request import Request
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.oscore import SecurityContext
+from aiocoapthon.utilities.transaction import Transaction
+from benchmarks import common
+from benchmarks.load import BenchResource, _worker
+
+__author__ = 'Giacomo Tanganelli'
+
+SECRET = bytes.fromhex("0102030405060708090a0b0c0d0e0f10")
+SALT = bytes.fromhex("9e7ca92223786340")
+
+
+def _contexts():
+    return SecurityContext(SECRET, b"", b"\x01", SALT), SecurityContext(SECRET, b"\x01", b"", SALT)
+
+
+async def _protection(count: int, size: int) -> dict:
+    client_context, server_context = _contexts()
+    client, server = OSCORELayer(), OSCORELayer()
+    client.add_context(client_context, (common.HOST, common.PORT))
+    server.add_context(server_context)
+    start = time.perf_counter()
+    for i in range(count):
+        request = Request()
+        request.type = defines.Type.CON
+        request.mid = i % defines.MID_SPACE_SIZE
+        request.token = b"\x01\x02"
+        request.destination = (common.HOST, common.PORT)
+        request.code = defines.Code.PUT
+        request.uri_path = "bench"
+        request.payload = "x" * size
+        protected = await client.send_request(request)
+        protected.source = (common.HOST, 40000)
+        await server.receive_request(Transaction(request=protected))
+    elapsed = time.perf_counter() - start
+    return {"count": count, "payload": size, "requests_per_second": count / elapsed}
+
+
+async def _exchanges(requests: int, concurrency: int, secure: bool, timeout: float, port: int) -> dict:
+    async with common.Server({"bench/": BenchResource()}, port=port) as server:
+        client = CoAPClient(common.HOST, port, max_in_flight=concurrency)
+        if secure:
+            client_context, server_context = _contexts()
+            server.add_security_context(server_context)
+            client.add_security_context(client_context, (common.HOST, port))
+        client.start_receiver()
+        samples = []
+        try:
+            share = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+            start = time.perf_counter()
+            failed = await asyncio.gather(*[_worker(client, "con_get", n, timeout, samples) for n in share if n])
+            elapsed = time.perf_counter() - start
+        finally:
+            client.stop()
+    ret = {"requests": requests, "concurrency": concurrency, "failed": sum(failed),
+           "requests_per_second": requests / elapsed}
+    ret.update(common.latency_summary(samples))
+    return ret
+
+
+def run(requests: int = 2000, concurrency: int = 16, count: int = 20000, size: int = 64, timeout: float = 10,
+        port: int = common.PORT) -> dict:
+    """
+    Measure the cost of OSCORE: protection and verification of requests alone, and CON GETs on loopback with and
+    without OSCORE.
+
+    :param requests: the number of GETs of each exchange run
+    :param concurrency: the number of GETs outstanding at the same time
+    :param count: the number of requests protected and verified
+    :param size: the payload of the protected requests, in bytes
+    :param timeout: the timeout of each GET
+    :param port: the port of the server
+    :return: a dict with the results of "protection", "plain" and "oscore"
+    """
+    return {"protection": asyncio.run(_protection(count, size)),
+            "plain": asyncio.run(_exchanges(requests, concurrency, False, timeout, port)),
+            "oscore": asyncio.run(_exchanges(requests, concurrency, True, timeout, port))}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="OSCORE protection and exchanges compared with plain CoAP")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-p", "--port", type=int, default=common.PORT)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.concurrency, port=args.port), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from aiocoapthon.resources.resource import Resource
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport.simulated import SimulatedNetwork
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.persistence import SQLiteStore, RelationRecord, ResourceRecord
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class _Sensor(Resource):
+    def __init__(self, name="sensor"):
+        super().__init__(name, observable=True, allow_children=_Sensor)
+        self.payload = "0"
+
+
+def _records(relations: int, resources: int):
+    now = time.time()
+    relation_records = [RelationRecord("10.{0}.{1}.{2}".format(i >> 16 & 255, i >> 8 & 255, i & 255), 5683,
+                                       i.to_bytes(4, "big"), "/sensors/{0}".format(i % resources), None,
+                                       int(defines.Code.GET), None, int(defines.Type.NON), 0, 2, now)
+                        for i in range(relations)]
+    resource_records = [ResourceRecord("/sensors", b"", None, None, 2)]
+    resource_records.extend(ResourceRecord("/sensors/{0}".format(i), b"21.5", 0, None, 2) for i in range(resources))
+    return relation_records, resource_records
+
+
+async def _measure(relations: int, resources: int, path: str) -> dict:
+    relation_records, resource_records = _records(relations, resources)
+    store = SQLiteStore(path)
+    start = time.perf_counter()
+    store.save(relation_records, resource_records)
+    save = time.perf_counter() - start
+    store.close()
+
+    network = SimulatedNetwork()
+    server = CoAPServer("10.0.0.1", 5683, transport=network.endpoint(("10.0.0.1", 5683)), store=SQLiteStore(path))
+    server.add_resource("sensors/", _Sensor())
+    start = time.perf_counter()
+    server.restore()
+    restore = time.perf_counter() - start
+
+    # the first change of a resource rebuilds the relations of its observers only
+    resource = server._requestLayer.get_resource("/sensors/0")
+    start = time.perf_counter()
+    notified = await server._observeLayer.notify(resource)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(1, resources):
+        await server._observeLayer.notify(server._requestLayer.get_resource("/sensors/{0}".format(i)))
+    rebuild = time.perf_counter() - start
+    start = time.perf_counter()
+    server.snapshot()
+    snapshot = time.perf_counter() - start
+    server.stop()
+    return {"relations": relations, "resources": resources, "save_ms": save * 1e3, "restore_ms": restore * 1e3,
+            "first_notify_ms": first * 1e3, "first_notify_observers": len(notified),
+            "notify_all_resources_ms": rebuild * 1e3, "snapshot_ms": snapshot * 1e3}
+
+
+def run(relations: int = defines.TRANSACTION_LIST_MAX_SIZE, resources: int = 100) -> dict:
+    """
+    Measure a warm restart: the time to restore a snapshot before the server accepts requests, then to rebuild the
+    relations of the first resource which changes, and of the others.
+
+    :param relations: the observe relations in the snapshot, at most the relations the ObserveLayer keeps
+    :param resources: the resources, created again as children of one resource
+    :return: a dict with milliseconds per operation
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(_measure(relations, resources, os.path.join(directory, "server.db")))
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Warm restart benchmark")
+    parser.add_argument("-n", "--relations", type=int, default=defines.TRANSACTION_LIST_MAX_SIZE)
+    parser.add_argument("-r", "--resources", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.relations, args.resources), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
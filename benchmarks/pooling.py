@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import collections
+import gc
+import time
+
+from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
+from aiocoapthon.utilities import defines, pool
+from aiocoapthon.utilities.serializer import Serializer
+from aiocoapthon.utilities.transaction import Transaction
+
+__author__ = 'Giacomo Tanganelli'
+
+
+class _GCTimer(object):
+    """
+    Collect the number and the duration of the garbage collector runs.
+    """
+
+    def __init__(self):
+        self.collections = 0
+        self.pause = 0.0
+        self.max_pause = 0.0
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            elapsed = time.perf_counter() - self._start
+            self.collections += 1
+            self.pause += elapsed
+            self.max_pause = max(self.max_pause, elapsed)
+            self._start = None
+
+
+async def _exchanges(datagram: bytes, count: int, live: int, recycle: bool):
+    source = ("127.0.0.1", 5683)
+    window = collections.deque()
+    for _ in range(count):
+        request = await Serializer.deserialize(datagram, source=source)
+        transaction = Transaction(request=request, timestamp=0)
+        response = Response()
+        response.type = defines.Type.ACK
+        response.code = defines.Code.CONTENT
+        response.mid = request.mid
+        response.token = request.token
+        response.destination = source
+        response.content_type = defines.ContentType.TEXT_PLAIN
+        response.payload = "21.5"
+        transaction.response = response
+        await Serializer.serialize(response, destination=source)
+        window.append(transaction)
+        if len(window) > live:
+            expired = window.popleft()
+            if recycle:
+                pool.release_transaction(expired)
+
+
+def _run(datagram: bytes, count: int, live: int, pooled: bool) -> dict:
+    if pooled:
+        pool.enable()
+    timer = _GCTimer()
+    gc.collect()
+    gc.callbacks.append(timer)
+    try:
+        start = time.perf_counter()
+        asyncio.run(_exchanges(datagram, count, live, pooled))
+        elapsed = time.perf_counter() - start
+        allocated = sum(s["allocated"] for s in pool.stats().values()) if pooled else None
+    finally:
+        gc.callbacks.remove(timer)
+        pool.disable()
+    return {"exchanges_per_second": count / elapsed, "gc_collections": timer.collections,
+            "gc_pause_total": timer.pause, "gc_pause_max": timer.max_pause, "pooled_allocations": allocated}
+
+
+def run(count: int = 50000, live: int = defines.TRANSACTION_LIST_MAX_SIZE) -> dict:
+    """
+    Run the same server exchanges with and without pooling. The last exchanges are kept alive, as the message layer
+    does, and the older ones are recycled when pooling is enabled.
+
+    :param count: the number of exchanges
+    :param live: the number of exchanges kept alive
+    :return: a dict with the results of both runs
+    """
+    request = Request()
+    request.type = defines.Type.CON
+    request.code = defines.Code.GET
+    request.mid = 1
+    request.token = b"\x01\x02\x03\x04"
+    request.uri_path = "sensors/temperature"
+    request.accept = defines.ContentType.TEXT_PLAIN
+    datagram = asyncio.run(Serializer.serialize(request, destination=("127.0.0.1", 5683))).raw
+    return {"exchanges": count, "live": live, "plain": _run(datagram, count, live, False),
+            "pooled": _run(datagram, count, live, True)}
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Allocation and GC cost with and without object pooling")
+    parser.add_argument("-n", "--exchanges", type=int, default=50000)
+    parser.add_argument("-l", "--live", type=int, default=defines.TRANSACTION_LIST_MAX_SIZE)
+    args = parser.parse_args()
+    result = run(args.exchanges, args.live)
+    for name in ("plain", "pooled"):
+        r = result[name]
+        print("{0}: {1:.0f} exchanges/s, {2} GC runs, {3:.1f} ms total pause, {4:.2f} ms max pause".format(
+            name, r["exchanges_per_second"], r["gc_collections"], r["gc_pause_total"] * 1000,
+            r["gc_pause_max"] * 1000))
+    print("pooled: {0} objects allocated for {1} exchanges".format(result["pooled"]["pooled_allocations"],
+                                                                  result["exchanges"]))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.messages.request import Request
+from aiocoapthon.resources.rd import ResourceDirectory
+from aiocoapthon.server.coap_server import CoAPServer
+from aiocoapthon.transport.simulated import SimulatedNetwork
+from aiocoapthon.utilities import defines
+
+__author__ = 'Giacomo Tanganelli'
+
+_LINKS = '</sensors/temp>;rt="temperature-c";if="sensor",</sensors/light>;rt="light-lux";if="sensor",' \
+         '</actuators/led>;rt="light";if="actuator",</config>;ct=40'
+
+# lookup -> (interface, filters), the last one is not indexed and checks every link
+_LOOKUPS = (("ep", "ep", [("ep", "node{0}")]),
+            ("rt", "res", [("rt", "temperature-c"), ("d", "floor{1}")]),
+            ("rt_prefix", "res", [("rt", "light*"), ("ep", "node{0}")]),
+            ("unindexed", "res", [("ct", "40"), ("et", "sensor{0}")]))
+
+
+def _registration(i: int) -> Request:
+    request = Request()
+    request.code = defines.Code.POST
+    request.source = ("10.0.{0}.{1}".format(i // 250, i % 250 + 1), 5683)
+    request.uri_query = "ep=node{0}&d=floor{1}&et=sensor{0}".format(i, i % 10)
+    request.content_type = defines.ContentType.application_link_format
+    request.payload = _LINKS
+    return request
+
+
+async def _measure(registrations: int, lookups: int) -> dict:
+    network = SimulatedNetwork()
+    server = CoAPServer("10.0.0.1", 5683, transport=network.endpoint(("10.0.0.1", 5683)))
+    directory = ResourceDirectory(server)
+    requests = [_registration(i) for i in range(registrations)]
+    start = time.perf_counter()
+    for request in requests:
+        directory.register(request)
+    register = (time.perf_counter() - start) / registrations
+    ret = {"registrations": registrations, "lookups": lookups, "register_us": register * 1e6}
+    for name, kind, filters in _LOOKUPS:
+        lookup = directory.lookup_endpoints if kind == "ep" else directory.lookup_resources
+        start = time.perf_counter()
+        for i in range(lookups):
+            n = i * 7919 % registrations
+            lookup([(k, v.format(n, n % 10)) for k, v in filters])
+        ret["lookup_" + name + "_us"] = (time.perf_counter() - start) / lookups * 1e6
+    directory.close()
+    server.stop()
+    return ret
+
+
+def run(registrations: int = 10000, lookups: int = 200) -> dict:
+    """
+    Measure the registrations and the lookups of a Resource Directory, with filters served by the indexes and one
+    that is not.
+
+    :param registrations: the endpoints registered, with 4 links each
+    :param lookups: the number of lookups of each kind
+    :return: a dict with microseconds per operation
+    """
+    return asyncio.run(_measure(registrations, lookups))
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Resource Directory benchmark")
+    parser.add_argument("-r", "--registrations", type=int, default=10000)
+    parser.add_argument("-n", "--lookups", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.registrations, args.lookups), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import json
+import time
+
+from aiocoapthon.messages.request import Request
+from aiocoapthon.messages.response import Response
+from aiocoapthon.utilities import defines
+from aiocoapthon.utilities.serializer import Serializer
+
+__author__ = 'Giacomo Tanganelli'
+
+_ADDRESS = ("127.0.0.1", 5683)
+
+
+def _request() -> Request:
+    request = Request()
+    request.type = defines.Type.CON
+    request.code = defines.Code.GET
+    request.mid = 1
+    request.token = b"\x01\x02\x03\x04"
+    request.uri_path = "sensors/temperature"
+    request.uri_query = "unit=celsius"
+    request.accept = defines.ContentType.TEXT_PLAIN
+    return request
+
+
+def _response() -> Response:
+    response = Response()
+    response.type = defines.Type.ACK
+    response.code = defines.Code.CONTENT
+    response.mid = 1
+    response.token = b"\x01\x02\x03\x04"
+    response.content_type = defines.ContentType.TEXT_PLAIN
+    response.max_age = 30
+    response.payload = "21.5"
+    return response
+
+
+async def _measure(count: int) -> dict:
+    ret = {}
+    for name, message in (("request", _request()), ("response", _response())):
+        datagram = (await Serializer.serialize(message, destination=_ADDRESS)).raw
+        start = time.perf_counter()
+        for _ in range(count):
+            await Serializer.serialize(message, destination=_ADDRESS)
+        serialize = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            await Serializer.deserialize(datagram, source=_ADDRESS)
+        deserialize = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            Serializer.parse_header(datagram)
+        header = (time.perf_counter() - start) / count
+        ret[name] = {"bytes": len(datagram), "serialize_us": serialize * 1e6, "deserialize_us": deserialize * 1e6,
+                     "parse_header_us": header * 1e6}
+    return ret
+
+
+def run(count: int = 20000) -> dict:
+    """
+    Measure the time to serialize and deserialize a typical request and response.
+
+    :param count: the number of iterations of each operation
+    :return: a dict message -> microseconds per operation
+    """
+    ret = asyncio.run(_measure(count))
+    ret["iterations"] = count
+    return ret
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description="Serializer and deserializer microbenchmarks")
+    parser.add_argument("-n", "--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations), indent=2))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -1,12 +1,21 @@
 #!/usr/bin/env python3.6
 from aiocoapthon.tests.plugtest_block import PlugtestBlockClass
 from aiocoapthon.tests.plugtest_block_client import PlugtestBlockClientClass
+from aiocoapthon.tests.plugtest_content_formats import PlugtestContentFormatsClass
 from aiocoapthon.tests.plugtest_core import PlugtestCoreClass
 from aiocoapthon.tests.plugtest_core_client import PlugtestCoreClientClass
+from aiocoapthon.tests.plugtest_dtls import PlugtestDTLSClass
 from aiocoapthon.tests.plugtest_link import PlugtestLinkClass
 from aiocoapthon.tests.plugtest_link_client import PlugtestLinkClientClass
+from aiocoapthon.tests.plugtest_messaging import PlugtestMessagingClass
+from aiocoapthon.tests.plugtest_observability import PlugtestObservabilityClass
 from aiocoapthon.tests.plugtest_observe import PlugtestObserveClass
 from aiocoapthon.tests.plugtest_observe_client import PlugtestObserveClientClass
+from aiocoapthon.tests.plugtest_oscore import PlugtestOSCOREClass
+from aiocoapthon.tests.plugtest_persistence import PlugtestPersistenceClass
+from aiocoapthon.tests.plugtest_rd import PlugtestRDClass
+from aiocoapthon.tests.plugtest_simulated import PlugtestSimulatedClass
+from aiocoapthon.tests.plugtest_tcp import PlugtestTCPClass
 
 __author__ = 'Giacomo Tanganelli'
 
@@ -28,3 +37,21 @@ if __name__ == '__main__':  # pragma: no cover
     tests.main()
     tests = PlugtestObserveClientClass()
     tests.main()
+    tests = PlugtestMessagingClass()
+    tests.main()
+    tests = PlugtestObservabilityClass()
+    tests.main()
+    tests = PlugtestSimulatedClass()
+    tests.main()
+    tests = PlugtestTCPClass()
+    tests.main()
+    tests = PlugtestDTLSClass()
+    tests.main()
+    tests = PlugtestOSCOREClass()
+    tests.main()
+    tests = PlugtestContentFormatsClass()
+    tests.main()
+    tests = PlugtestRDClass()
+    tests.main()
+    tests = PlugtestPersistenceClass()
+    tests.main()